@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -25,6 +26,22 @@ class Settings:
     EMAIL_PASSWORD: str = os.getenv("EMAIL_PASSWORD", "")
     EMAIL_FROM_NAME: str = os.getenv("EMAIL_FROM_NAME", "PersonalCFO")
     
+    # Background jobs
+    OVERDUE_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("OVERDUE_SWEEP_INTERVAL_SECONDS", "900"))
+    EMAIL_WORKERS: int = int(os.getenv("EMAIL_WORKERS", "4"))
+    EMAIL_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+    EMAIL_RETRY_BASE_SECONDS: int = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+    EMAIL_RATE_PER_SECOND: float = float(os.getenv("EMAIL_RATE_PER_SECOND", "5"))  # per API process; 0 = unlimited
+    
+    # Rendered invoice PDFs
+    PDF_CACHE_DIR: str = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "personalcfo-pdf-cache"))
+    PDF_CACHE_MAX_MB: int = int(os.getenv("PDF_CACHE_MAX_MB", "256"))
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))  # 0 = render in a thread
+    PDF_STREAM_MIN_ITEMS: int = int(os.getenv("PDF_STREAM_MIN_ITEMS", "200"))  # lay out line items a page at a time
+    
+    # Agent SQL analysis (per-user DuckDB snapshots)
+    SQL_SNAPSHOT_CACHE_MB: int = int(os.getenv("SQL_SNAPSHOT_CACHE_MB", "256"))
+    
     # CORS Configuration
     ALLOWED_ORIGINS: list = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
     
@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from .config import settings
 import logging
@@ -6,25 +6,25 @@ import logging
 logger = logging.getLogger(__name__)
 
 class Database:
-    """MongoDB database connection manager"""
+    """MongoDB database connection manager (async, backed by Motor)"""
     
     def __init__(self):
         self.client = None
         self.db = None
     
-    def connect(self):
+    async def connect(self):
         """Connect to MongoDB Atlas"""
         try:
             logger.info("Connecting to MongoDB Atlas...")
             
             # Create MongoDB client
-            self.client = MongoClient(
+            self.client = AsyncIOMotorClient(
                 settings.MONGODB_URI,
                 serverSelectionTimeoutMS=5000  # 5 second timeout
             )
             
             # Test the connection
-            self.client.admin.command('ping')
+            await self.client.admin.command('ping')
             
             # Get database
             self.db = self.client[settings.DATABASE_NAME]
@@ -32,7 +32,7 @@ class Database:
             logger.info(f"✅ Connected to MongoDB database: {settings.DATABASE_NAME}")
             
             # Log available collections
-            collections = self.db.list_collection_names()
+            collections = await self.db.list_collection_names()
             logger.info(f"Available collections: {collections}")
             
             return self.db
@@ -89,6 +89,16 @@ class Database:
     def expenses(self):
         """Get expenses collection"""
         return self.get_collection("expenses")
+    
+    @property
+    def user_stats(self):
+        """Get user_stats collection (per-user summary counters)"""
+        return self.get_collection("user_stats")
+    
+    @property
+    def email_outbox(self):
+        """Get email_outbox collection (queued invoice and reminder emails)"""
+        return self.get_collection("email_outbox")
 
 # Global database instance
 db = Database()
@@ -0,0 +1,59 @@
+"""
+Date parsing for stored date fields.
+
+Invoice dates are stored as BSON datetimes (UTC) so they can be compared and
+indexed. Values arrive as ISO strings from the frontend ("2026-02-16" or
+"2026-02-16T00:00:00.000Z") and in looser formats from the AI agent.
+"""
+
+from datetime import date, datetime, timezone
+from typing import Any, Optional
+
+# Formats accepted on top of ISO 8601 (mostly seen in agent output)
+_FALLBACK_FORMATS = (
+    "%m/%d/%Y",
+    "%B %d, %Y",
+    "%b %d, %Y",
+    "%d %B %Y",
+    "%d %b %Y",
+)
+
+
+def parse_date(value: Any) -> Optional[datetime]:
+    """
+    Parse a date/datetime value into a naive UTC datetime (None for blanks).
+    Raises ValueError if the value can't be understood.
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    elif isinstance(value, str):
+        text = value.strip()
+        try:
+            parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            for fmt in _FALLBACK_FORMATS:
+                try:
+                    parsed = datetime.strptime(text, fmt)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"Unrecognised date: {value!r}")
+    else:
+        raise ValueError(f"Unrecognised date: {value!r}")
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_date_lenient(value: Any) -> Optional[datetime]:
+    """parse_date(), but None instead of an error for values it can't parse"""
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
@@ -0,0 +1,294 @@
+"""
+Persistent email outbox.
+
+Routes don't talk to SMTP any more: they insert an entry into the
+``email_outbox`` collection and return. A pool of EMAIL_WORKERS background
+workers claims entries one at a time (an atomic find_one_and_update, so
+several API processes can share the outbox), builds the message from the
+current invoice, user and client documents and sends it.
+
+Sends are spaced to at most EMAIL_RATE_PER_SECOND per API process, shared
+by that process's workers, so a bulk reminder campaign doesn't trip the
+mail provider's limits. The limit is not coordinated between processes:
+with several, set it to the provider's limit divided by their number.
+
+A failed send is retried with exponential backoff until EMAIL_MAX_ATTEMPTS;
+after that the entry is marked ``failed``. An entry whose worker died
+mid-send is picked up again once its lease expires. A reminder whose
+invoice is no longer ``sent`` or ``overdue`` by the time it goes out (paid,
+voided, back to draft) is marked ``skipped``. Entry status:
+``pending`` -> ``sending`` -> ``sent`` | ``failed`` | ``skipped``.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from .config import settings
+from .email_service import send_invoice_email, send_payment_reminder
+from .pdf_renderer import render_invoice_pdf
+
+logger = logging.getLogger(__name__)
+
+EMAIL_KINDS = ("invoice", "reminder")
+# Invoices a payment reminder may still be sent for
+REMINDER_STATUSES = ("sent", "overdue")
+# How long a worker may hold an entry before another worker may retry it
+LEASE_SECONDS = 300
+# How often idle workers look for due retries
+POLL_SECONDS = 5
+MAX_RETRY_DELAY_SECONDS = 3600
+
+_wakeup: Optional[asyncio.Event] = None
+_workers: List[asyncio.Task] = []
+_limiter: Optional["RateLimiter"] = None
+
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1/rate seconds apart (rate 0 = no limit)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        delay = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _entry(kind: str, invoice_id: ObjectId, to: str, now: datetime, **extra) -> Dict[str, Any]:
+    if kind not in EMAIL_KINDS:
+        raise ValueError(f"Unknown email kind: {kind}")
+    return {
+        "kind": kind,
+        "invoiceId": invoice_id,
+        "to": to,
+        "status": "pending",
+        "attempts": 0,
+        "nextAttemptAt": now,
+        "createdAt": now,
+        **extra,
+    }
+
+
+def _wake_workers() -> None:
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def enqueue_email(db, kind: str, invoice_id: ObjectId, to: str) -> ObjectId:
+    """Queue an invoice or reminder email for ``invoice_id``; returns the outbox entry id"""
+    result = await db.email_outbox.insert_one(_entry(kind, invoice_id, to, datetime.utcnow()))
+    _wake_workers()
+    return result.inserted_id
+
+
+async def enqueue_emails(db, kind: str, recipients: List[Tuple[ObjectId, str]], **extra) -> List[ObjectId]:
+    """Queue one email per ``(invoice_id, to)`` with a single insert; ``extra`` is stored on each entry"""
+    if not recipients:
+        return []
+    now = datetime.utcnow()
+    result = await db.email_outbox.insert_many(
+        [_entry(kind, invoice_id, to, now, **extra) for invoice_id, to in recipients]
+    )
+    _wake_workers()
+    return result.inserted_ids
+
+
+async def _invoice_email_args(invoice: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any]) -> Dict[str, Any]:
+    # Prepare invoice data for email
+    invoice_data = {
+        "invoiceNumber": invoice.get("invoiceNumber", ""),
+        "dueDate": invoice.get("dueDate"),
+        "lineItems": invoice.get("lineItems", []),
+        "total": invoice.get("total", 0),
+        "clientName": client.get("name", ""),
+        "to": {
+            "name": client.get("name", ""),
+            "email": client.get("email", ""),
+            "address": client.get("address", "")
+        }
+    }
+
+    # Prepare business info
+    business_info = {
+        "businessName": user.get("businessName", ""),
+        "email": user.get("businessEmail", ""),
+        "phone": user.get("businessPhone", ""),
+        "address": user.get("businessAddress", "")
+    }
+
+    # Generate PDF for email attachment
+    pdf_bytes = None
+    try:
+        pdf_bytes = await render_invoice_pdf(invoice, user, client)
+    except Exception as e:
+        logger.warning(f"Failed to generate PDF: {e}")
+        # Continue without PDF attachment
+
+    return {"invoice_data": invoice_data, "business_info": business_info, "pdf_bytes": pdf_bytes}
+
+
+def _reminder_args(invoice: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any]) -> Dict[str, Any]:
+    # Prepare invoice data for reminder
+    invoice_data = {
+        "invoiceNumber": invoice.get("invoiceNumber", ""),
+        "dueDate": invoice.get("dueDate"),
+        "total": invoice.get("total", 0),
+        "clientName": client.get("name", ""),
+        "to": {
+            "name": client.get("name", ""),
+            "email": client.get("email", "")
+        }
+    }
+
+    # Prepare business info
+    business_info = {
+        "businessName": user.get("businessName", ""),
+        "email": user.get("businessEmail", "")
+    }
+    return {"invoice_data": invoice_data, "business_info": business_info}
+
+
+async def deliver(db, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Build and send the email for one outbox entry. Returns the send result."""
+    invoice = await db.invoices.find_one({"_id": entry["invoiceId"]})
+    if not invoice:
+        return {"success": False, "error": "Invoice not found", "permanent": True}
+    user = await db.users.find_one({"_id": invoice.get("userId")}) if invoice.get("userId") else None
+    client = await db.clients.find_one({"_id": invoice.get("clientId")}) if invoice.get("clientId") else None
+    if not user or not client:
+        return {"success": False, "error": "User or client not found for this invoice", "permanent": True}
+    # Retries can hold a reminder for hours; don't chase an invoice that was paid meanwhile
+    if entry["kind"] == "reminder" and invoice.get("status") not in REMINDER_STATUSES:
+        return {
+            "success": False,
+            "error": f"Invoice is {invoice.get('status') or 'without a status'}; reminder skipped",
+            "skipped": True,
+        }
+
+    # The PDF renders in the process pool and SMTP blocks; keep both off the event loop
+    if entry["kind"] == "invoice":
+        args = await _invoice_email_args(invoice, user, client)
+        return await asyncio.to_thread(send_invoice_email, client_email=entry["to"], **args)
+    return await asyncio.to_thread(send_payment_reminder, client_email=entry["to"], **_reminder_args(invoice, user, client))
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter after ``attempts`` failed attempts"""
+    delay = settings.EMAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    return min(delay, MAX_RETRY_DELAY_SECONDS) * random.uniform(0.8, 1.2)
+
+
+async def _claim(db) -> Optional[Dict[str, Any]]:
+    """Atomically take the next due entry (or one whose worker's lease ran out)"""
+    now = datetime.utcnow()
+    return await db.email_outbox.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "nextAttemptAt": {"$lte": now}},
+            {"status": "sending", "leaseExpiresAt": {"$lt": now}},
+        ]},
+        {
+            "$set": {"status": "sending", "leaseExpiresAt": now + timedelta(seconds=LEASE_SECONDS)},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("nextAttemptAt", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _finish(db, entry: Dict[str, Any], result: Dict[str, Any]) -> None:
+    now = datetime.utcnow()
+    if result.get("success"):
+        update = {
+            "$set": {"status": "sent", "sentAt": now, "timing": result.get("timing")},
+            "$unset": {"leaseExpiresAt": "", "lastError": ""},
+        }
+    elif result.get("skipped"):
+        update = {"$set": {"status": "skipped", "lastError": result.get("error")}, "$unset": {"leaseExpiresAt": ""}}
+        logger.info(f"Skipped {entry['kind']} email {entry['_id']}: {result.get('error')}")
+    elif result.get("permanent") or entry["attempts"] >= settings.EMAIL_MAX_ATTEMPTS:
+        update = {"$set": {"status": "failed", "lastError": result.get("error")}, "$unset": {"leaseExpiresAt": ""}}
+        logger.error(f"❌ Giving up on {entry['kind']} email {entry['_id']}: {result.get('error')}")
+    else:
+        retry_at = now + timedelta(seconds=retry_delay(entry["attempts"]))
+        update = {
+            "$set": {"status": "pending", "nextAttemptAt": retry_at, "lastError": result.get("error")},
+            "$unset": {"leaseExpiresAt": ""},
+        }
+        logger.warning(f"{entry['kind']} email {entry['_id']} failed ({result.get('error')}), retrying at {retry_at}")
+    await db.email_outbox.update_one({"_id": entry["_id"]}, update)
+
+
+async def process_next(db) -> bool:
+    """Deliver one due entry, if there is one. Returns False when the outbox is idle."""
+    entry = await _claim(db)
+    if entry is None:
+        return False
+    if _limiter is not None:
+        await _limiter.wait()
+    try:
+        result = await deliver(db, entry)
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            # The worker itself is stopping; the entry is retried once its lease runs out
+            raise
+        # Something the send waited on was cancelled, not this worker: retry later
+        result = {"success": False, "error": "Cancelled"}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    await _finish(db, entry, result)
+    return True
+
+
+async def _worker(db) -> None:
+    while True:
+        # Cleared before looking, so an entry enqueued while this pass runs
+        # still wakes the worker instead of waiting out the poll interval
+        _wakeup.clear()
+        try:
+            if await process_next(db):
+                continue
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            # Not a stop request: keep the worker alive
+            logger.error("❌ Email worker error: an awaited operation was cancelled")
+        except Exception as e:
+            logger.error(f"❌ Email worker error: {e}")
+        # Idle: sleep until something is enqueued or a retry may be due
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_email_workers(db, count: Optional[int] = None) -> None:
+    """Start the outbox worker pool (call from app startup)"""
+    global _wakeup, _limiter
+    if _workers:
+        return
+    _wakeup = asyncio.Event()
+    _limiter = RateLimiter(settings.EMAIL_RATE_PER_SECOND)
+    count = count or settings.EMAIL_WORKERS
+    for _ in range(count):
+        _workers.append(asyncio.create_task(_worker(db)))
+    logger.info(f"Email outbox: {count} worker(s) started")
+
+
+async def stop_email_workers() -> None:
+    """Cancel the worker pool (call from app shutdown); claimed entries are retried after their lease"""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
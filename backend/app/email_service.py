@@ -6,12 +6,14 @@ Handles sending invoices via email with PDF attachments
 import os
 import smtplib
 import ssl
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
-from datetime import datetime
-import base64
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+
+from .email_templates import render_invoice_email, render_reminder_email
 
 # Email configuration from environment
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
@@ -19,196 +21,163 @@ EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")  # For Gmail, use App Password
 EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", "PersonalCFO")
+# Set to "false" for a local SMTP server (e.g. aiosmtpd) without STARTTLS/login
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() != "false"
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", "30"))
+# Open SMTP connections kept for reuse, and how long one may sit unused
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "4"))
+EMAIL_IDLE_SECONDS = float(os.getenv("EMAIL_IDLE_SECONDS", "60"))
 
 
-def get_invoice_email_html(invoice_data: Dict[str, Any], business_info: Dict[str, Any]) -> str:
-    """Generate a beautiful HTML email template for the invoice"""
-    
-    items_html = ""
-    for item in invoice_data.get("lineItems", []):
-        item_total = float(item.get("amount", 0))
-        items_html += f"""
-        <tr>
-            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; font-size: 14px;">{item.get('description', '')}</td>
-            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: center; font-size: 14px;">{item.get('quantity', 1)}</td>
-            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: right; font-size: 14px;">${float(item.get('rate', 0)):.2f}</td>
-            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: right; font-size: 14px; font-weight: 600;">${item_total:.2f}</td>
-        </tr>
-        """
-    
-    due_date = invoice_data.get("dueDate", "")
-    if due_date:
-        try:
-            if isinstance(due_date, str):
-                due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00')).strftime("%B %d, %Y")
-            elif isinstance(due_date, datetime):
-                due_date = due_date.strftime("%B %d, %Y")
-        except:
-            due_date = str(due_date)
-    
-    client_name = invoice_data.get("clientName") or invoice_data.get("to", {}).get("name") or "Valued Customer"
-    invoice_number = invoice_data.get("invoiceNumber", "")
-    total_amount = float(invoice_data.get("total", 0))
-    business_name = business_info.get("businessName", "Your Business")
-    business_email = business_info.get("email", "")
-    
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    </head>
-    <body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #f3f4f6;">
-        <div style="max-width: 600px; margin: 0 auto; padding: 40px 20px;">
-            <!-- Header -->
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 16px 16px 0 0; padding: 32px; text-align: center;">
-                <h1 style="color: white; margin: 0; font-size: 28px; font-weight: 700;">Invoice #{invoice_number}</h1>
-                <p style="color: rgba(255,255,255,0.9); margin: 8px 0 0 0; font-size: 16px;">from {business_name}</p>
-            </div>
-            
-            <!-- Main Content -->
-            <div style="background: white; padding: 32px; border-radius: 0 0 16px 16px; box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1);">
-                <!-- Greeting -->
-                <p style="font-size: 16px; color: #374151; margin: 0 0 24px 0;">
-                    Dear <strong>{client_name}</strong>,
-                </p>
-                <p style="font-size: 14px; color: #6b7280; margin: 0 0 32px 0; line-height: 1.6;">
-                    Please find your invoice details below. We appreciate your business and look forward to serving you again.
-                </p>
-                
-                <!-- Invoice Summary Box -->
-                <div style="background: #f9fafb; border-radius: 12px; padding: 24px; margin-bottom: 32px;">
-                    <div style="display: flex; justify-content: space-between; margin-bottom: 16px;">
-                        <div>
-                            <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Invoice Number</p>
-                            <p style="margin: 4px 0 0 0; font-size: 18px; font-weight: 600; color: #111827;">#{invoice_number}</p>
-                        </div>
-                        <div style="text-align: right;">
-                            <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Amount Due</p>
-                            <p style="margin: 4px 0 0 0; font-size: 24px; font-weight: 700; color: #667eea;">${total_amount:.2f}</p>
-                        </div>
-                    </div>
-                    <div style="border-top: 1px solid #e5e7eb; padding-top: 16px; margin-top: 16px;">
-                        <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Due Date</p>
-                        <p style="margin: 4px 0 0 0; font-size: 16px; font-weight: 500; color: #111827;">{due_date}</p>
-                    </div>
-                </div>
-                
-                <!-- Items Table -->
-                <table style="width: 100%; border-collapse: collapse; margin-bottom: 24px;">
-                    <thead>
-                        <tr style="background: #f3f4f6;">
-                            <th style="padding: 12px; text-align: left; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Description</th>
-                            <th style="padding: 12px; text-align: center; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Qty</th>
-                            <th style="padding: 12px; text-align: right; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Rate</th>
-                            <th style="padding: 12px; text-align: right; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Total</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {items_html}
-                    </tbody>
-                    <tfoot>
-                        <tr>
-                            <td colspan="3" style="padding: 16px 12px; text-align: right; font-size: 16px; font-weight: 600; color: #374151;">Total Amount:</td>
-                            <td style="padding: 16px 12px; text-align: right; font-size: 20px; font-weight: 700; color: #667eea;">${total_amount:.2f}</td>
-                        </tr>
-                    </tfoot>
-                </table>
-                
-                <!-- Payment Info -->
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; padding: 24px; text-align: center; margin-top: 32px;">
-                    <p style="margin: 0; font-size: 14px; color: rgba(255,255,255,0.9);">Payment is due by</p>
-                    <p style="margin: 8px 0 0 0; font-size: 20px; font-weight: 700; color: white;">{due_date}</p>
-                </div>
-                
-                <!-- Footer -->
-                <div style="margin-top: 32px; padding-top: 24px; border-top: 1px solid #e5e7eb; text-align: center;">
-                    <p style="margin: 0; font-size: 14px; color: #6b7280;">
-                        Thank you for your business!
-                    </p>
-                    <p style="margin: 8px 0 0 0; font-size: 12px; color: #9ca3af;">
-                        {business_name} • {business_email}
-                    </p>
-                </div>
-            </div>
-            
-            <!-- Email Footer -->
-            <div style="text-align: center; padding: 24px;">
-                <p style="margin: 0; font-size: 12px; color: #9ca3af;">
-                    This invoice was sent via PersonalCFO
-                </p>
-            </div>
-        </div>
-    </body>
-    </html>
+# Refusals of one message (recipient, sender or content) that leave the session usable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def email_configured() -> bool:
+    """A sender address, plus a password unless talking to a plain local server"""
+    return bool(EMAIL_USER and (EMAIL_PASSWORD or not EMAIL_USE_TLS))
+
+
+class SMTPPool:
+    """
+    Keeps up to ``size`` logged-in SMTP connections open so consecutive sends
+    skip the connect/EHLO/STARTTLS/LOGIN handshake. Connections idle for more
+    than ``idle_seconds`` are closed instead of reused, and a reused connection
+    the server has dropped is replaced once before the send is given up on.
+    A connection whose message was refused (unknown recipient, rejected
+    content) is reset and kept; any other error closes it.
+    Thread-safe: sends run in worker threads.
     """
 
+    def __init__(self, size: int, idle_seconds: float):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._stats = {"connections": 0, "reconnects": 0, "sends": 0, "reused": 0, "send_ms": 0.0}
 
-def get_invoice_email_plain(invoice_data: Dict[str, Any], business_info: Dict[str, Any]) -> str:
-    """Generate plain text version of the email"""
-    
-    items_text = ""
-    for item in invoice_data.get("lineItems", []):
-        item_total = float(item.get("amount", 0))
-        items_text += f"  • {item.get('description', '')} (x{item.get('quantity', 1)}) - ${item_total:.2f}\n"
-    
-    due_date = invoice_data.get("dueDate", "")
-    if due_date:
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=EMAIL_TIMEOUT)
         try:
-            if isinstance(due_date, str):
-                due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00')).strftime("%B %d, %Y")
-            elif isinstance(due_date, datetime):
-                due_date = due_date.strftime("%B %d, %Y")
-        except:
-            due_date = str(due_date)
-    
-    client_name = invoice_data.get("clientName") or invoice_data.get("to", {}).get("name") or "Valued Customer"
-    invoice_number = invoice_data.get("invoiceNumber", "")
-    total_amount = float(invoice_data.get("total", 0))
-    business_name = business_info.get("businessName", "Your Business")
-    business_email = business_info.get("email", "")
-    
-    return f"""
-INVOICE #{invoice_number}
-from {business_name}
+            server.ehlo()
+            if EMAIL_USE_TLS:
+                server.starttls(context=ssl.create_default_context())
+                server.ehlo()
+            if EMAIL_PASSWORD:
+                server.login(EMAIL_USER, EMAIL_PASSWORD)
+        except Exception:
+            _close_quietly(server)
+            raise
+        with self._lock:
+            self._stats["connections"] += 1
+        return server
 
-=====================================
+    def _checkout(self) -> Tuple[smtplib.SMTP, bool]:
+        """An open connection, and whether it was reused"""
+        stale = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self.idle_seconds:
+                    conn = candidate
+                    break
+                stale.append(candidate)
+        for old in stale:
+            _close_quietly(old)
+        if conn is not None:
+            return conn, True
+        return self._connect(), False
 
-Dear {client_name},
+    def _checkin(self, conn: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def _reset(self, conn: smtplib.SMTP) -> None:
+        """RSET a connection after a refused message and return it to the pool"""
+        try:
+            conn.rset()
+        except (smtplib.SMTPException, OSError):
+            _close_quietly(conn)
+            return
+        self._checkin(conn)
 
-Please find your invoice details below.
+    def send(self, msg, client_email: str) -> Dict[str, Any]:
+        """Send one message; returns its timing (milliseconds)"""
+        message = msg.as_string()
+        with self._slots:
+            started = time.perf_counter()
+            conn, reused = self._checkout()
+            connected = time.perf_counter()
+            try:
+                try:
+                    conn.sendmail(EMAIL_USER, client_email, message)
+                except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                    if not reused:
+                        raise
+                    # The server dropped the idle connection; retry once on a fresh one
+                    _close_quietly(conn)
+                    with self._lock:
+                        self._stats["reconnects"] += 1
+                    conn, reused = self._connect(), False
+                    connected = time.perf_counter()
+                    conn.sendmail(EMAIL_USER, client_email, message)
+            except MESSAGE_ERRORS:
+                # The server refused this message, not the session: reset the
+                # transaction and keep the connection for the next send
+                self._reset(conn)
+                raise
+            except BaseException:
+                _close_quietly(conn)
+                raise
+            finished = time.perf_counter()
+            self._checkin(conn)
 
-INVOICE DETAILS
----------------
-Invoice Number: #{invoice_number}
-Amount Due: ${total_amount:.2f}
-Due Date: {due_date}
+        timing = {
+            "reused": reused,
+            "connectMs": round((connected - started) * 1000, 2),
+            "sendMs": round((finished - connected) * 1000, 2),
+            "totalMs": round((finished - started) * 1000, 2),
+        }
+        with self._lock:
+            self._stats["sends"] += 1
+            self._stats["reused"] += int(reused)
+            self._stats["send_ms"] += timing["totalMs"]
+        return timing
 
-ITEMS
------
-{items_text}
-TOTAL: ${total_amount:.2f}
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the health endpoint"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+        stats["avg_send_ms"] = round(stats.pop("send_ms") / stats["sends"], 2) if stats["sends"] else None
+        stats["size"] = self.size
+        return stats
 
-=====================================
+    def close(self) -> None:
+        """QUIT every idle connection (call on shutdown)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close_quietly(conn)
 
-Payment is due by {due_date}
 
-Thank you for your business!
+def _close_quietly(conn: smtplib.SMTP) -> None:
+    try:
+        conn.quit()
+    except Exception:
+        conn.close()
 
-{business_name}
-{business_email}
 
----
-This invoice was sent via PersonalCFO
-    """
+smtp_pool = SMTPPool(EMAIL_POOL_SIZE, EMAIL_IDLE_SECONDS)
 
 
 def send_invoice_email(
     invoice_data: Dict[str, Any],
     business_info: Dict[str, Any],
     client_email: str,
-    pdf_base64: Optional[str] = None
+    pdf_bytes: Optional[bytes] = None
 ) -> Dict[str, Any]:
     """
     Send invoice email to client
@@ -217,23 +186,25 @@ def send_invoice_email(
         invoice_data: Invoice data object
         business_info: Business information
         client_email: Recipient email address
-        pdf_base64: Optional base64 encoded PDF attachment
+        pdf_bytes: Optional PDF attachment
     
     Returns:
         Dict with success status and message or error
     """
     try:
         # Check email configuration
-        if not EMAIL_USER or not EMAIL_PASSWORD:
+        if not email_configured():
             return {
                 "success": False,
-                "error": "Email not configured. Please set EMAIL_USER and EMAIL_PASSWORD in backend/.env"
+                "error": "Email not configured. Please set EMAIL_USER and EMAIL_PASSWORD in backend/.env",
+                "permanent": True
             }
         
         if not client_email:
             return {
                 "success": False,
-                "error": "No client email provided"
+                "error": "No client email provided",
+                "permanent": True
             }
         
         # Create email message
@@ -247,8 +218,7 @@ def send_invoice_email(
         msg["Reply-To"] = business_info.get("email", EMAIL_USER)
         
         # Add plain text and HTML versions
-        plain_text = get_invoice_email_plain(invoice_data, business_info)
-        html_content = get_invoice_email_html(invoice_data, business_info)
+        plain_text, html_content = render_invoice_email(invoice_data, business_info)
         
         part1 = MIMEText(plain_text, "plain")
         part2 = MIMEText(html_content, "html")
@@ -257,10 +227,9 @@ def send_invoice_email(
         msg.attach(part2)
         
         # Attach PDF if provided
-        if pdf_base64:
+        if pdf_bytes:
             try:
-                pdf_data = base64.b64decode(pdf_base64)
-                pdf_attachment = MIMEApplication(pdf_data, _subtype="pdf")
+                pdf_attachment = MIMEApplication(pdf_bytes, _subtype="pdf")
                 pdf_attachment.add_header(
                     "Content-Disposition", 
                     "attachment", 
@@ -270,21 +239,15 @@ def send_invoice_email(
             except Exception as e:
                 print(f"Warning: Could not attach PDF: {e}")
         
-        # Send email
-        context = ssl.create_default_context()
+        # Send email over a pooled connection
+        timing = smtp_pool.send(msg, client_email)
         
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-            server.ehlo()
-            server.starttls(context=context)
-            server.ehlo()
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            server.sendmail(EMAIL_USER, client_email, msg.as_string())
-        
-        print(f"[SUCCESS] Invoice #{invoice_number} sent to {client_email}")
+        print(f"[SUCCESS] Invoice #{invoice_number} sent to {client_email} in {timing['totalMs']}ms")
         
         return {
             "success": True,
-            "message": f"Invoice sent successfully to {client_email}"
+            "message": f"Invoice sent successfully to {client_email}",
+            "timing": timing
         }
         
     except smtplib.SMTPAuthenticationError:
@@ -315,16 +278,18 @@ def send_payment_reminder(
     Send payment reminder email for overdue invoice
     """
     try:
-        if not EMAIL_USER or not EMAIL_PASSWORD:
+        if not email_configured():
             return {
                 "success": False,
-                "error": "Email not configured"
+                "error": "Email not configured",
+                "permanent": True
             }
         
         if not client_email:
             return {
                 "success": False,
-                "error": "No client email provided"
+                "error": "No client email provided",
+                "permanent": True
             }
         
         # Create reminder email
@@ -335,83 +300,19 @@ def send_payment_reminder(
         msg["From"] = f"{EMAIL_FROM_NAME} <{EMAIL_USER}>"
         msg["To"] = client_email
         
-        due_date = invoice_data.get("dueDate", "")
-        if due_date:
-            try:
-                if isinstance(due_date, str):
-                    due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00')).strftime("%B %d, %Y")
-                elif isinstance(due_date, datetime):
-                    due_date = due_date.strftime("%B %d, %Y")
-            except:
-                due_date = str(due_date)
-        
-        client_name = invoice_data.get("clientName") or invoice_data.get("to", {}).get("name") or "Customer"
-        total_amount = float(invoice_data.get("total", 0))
-        business_name = business_info.get("businessName", "")
-        
-        plain_text = f"""
-Payment Reminder
-
-Dear {client_name},
-
-This is a friendly reminder that Invoice #{invoice_number} for ${total_amount:.2f} was due on {due_date}.
-
-Please arrange payment at your earliest convenience.
-
-Thank you,
-{business_name}
-        """
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background-color: #f3f4f6; margin: 0; padding: 40px 20px;">
-            <div style="max-width: 500px; margin: 0 auto; background: white; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1);">
-                <div style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%); padding: 24px; text-align: center;">
-                    <h1 style="color: white; margin: 0; font-size: 20px;">⏰ Payment Reminder</h1>
-                </div>
-                <div style="padding: 32px;">
-                    <p style="color: #374151; font-size: 14px; line-height: 1.6;">
-                        Dear <strong>{client_name}</strong>,
-                    </p>
-                    <p style="color: #6b7280; font-size: 14px; line-height: 1.6;">
-                        This is a friendly reminder that your invoice is pending payment.
-                    </p>
-                    <div style="background: #fef3c7; border-radius: 12px; padding: 20px; margin: 24px 0; text-align: center;">
-                        <p style="margin: 0; font-size: 12px; color: #92400e;">Invoice #{invoice_number}</p>
-                        <p style="margin: 8px 0 0 0; font-size: 28px; font-weight: 700; color: #d97706;">${total_amount:.2f}</p>
-                        <p style="margin: 8px 0 0 0; font-size: 14px; color: #92400e;">Due: {due_date}</p>
-                    </div>
-                    <p style="color: #6b7280; font-size: 14px; line-height: 1.6;">
-                        Please arrange payment at your earliest convenience.
-                    </p>
-                    <p style="color: #374151; font-size: 14px; margin-top: 24px;">
-                        Thank you,<br>
-                        <strong>{business_name}</strong>
-                    </p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        plain_text, html_content = render_reminder_email(invoice_data, business_info)
         
         msg.attach(MIMEText(plain_text, "plain"))
         msg.attach(MIMEText(html_content, "html"))
         
-        context = ssl.create_default_context()
-        
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-            server.ehlo()
-            server.starttls(context=context)
-            server.ehlo()
-            server.login(EMAIL_USER, EMAIL_PASSWORD)
-            server.sendmail(EMAIL_USER, client_email, msg.as_string())
+        timing = smtp_pool.send(msg, client_email)
         
-        print(f"[SUCCESS] Payment reminder sent for Invoice #{invoice_number} to {client_email}")
+        print(f"[SUCCESS] Payment reminder sent for Invoice #{invoice_number} to {client_email} in {timing['totalMs']}ms")
         
         return {
             "success": True,
-            "message": "Reminder sent successfully"
+            "message": "Reminder sent successfully",
+            "timing": timing
         }
         
     except Exception as e:
@@ -0,0 +1,292 @@
+"""
+Email templates for invoices and payment reminders.
+
+The templates are written in ``string.Template`` syntax (``$name``), which
+leaves the CSS in the HTML readable, and split once at import into literal
+text and placeholders, so rendering is a single join. The view data
+(formatted due date, names, total) is computed once per email and shared by
+the HTML and plain-text parts. Line-item rows, rendered thousands of times
+for a large invoice, are plain f-string functions whose output is collected
+in a list and joined once.
+"""
+
+from datetime import datetime
+from string import Template
+from typing import Any, Dict, List, Tuple
+
+
+class EmailTemplate:
+    """
+    A ``string.Template`` source split into literal text and placeholders
+    at construction; render() fills the placeholders and joins the parts
+    """
+
+    def __init__(self, source: str):
+        # Literal text in even slots, placeholder names in odd ones
+        self._parts: List[str] = []
+        text = ""
+        position = 0
+        for match in Template.pattern.finditer(source):
+            text += source[position:match.start()]
+            if match.group("escaped") is not None:
+                text += "$"
+            else:
+                name = match.group("named") or match.group("braced")
+                if name is None:
+                    raise ValueError(f"Invalid placeholder in email template at {match.start()}")
+                self._parts += [text, name]
+                text = ""
+            position = match.end()
+        self._parts.append(text + source[position:])
+        self._fields = list(enumerate(self._parts))[1::2]
+
+    def render(self, values: Dict[str, Any]) -> str:
+        parts = self._parts.copy()
+        for index, name in self._fields:
+            parts[index] = str(values[name])
+        return "".join(parts)
+
+
+def format_due_date(due_date: Any) -> str:
+    """Due date as e.g. 'March 01, 2026' (unparseable values are shown as-is)"""
+    if not due_date:
+        return due_date or ""
+    try:
+        if isinstance(due_date, str):
+            return datetime.fromisoformat(due_date.replace('Z', '+00:00')).strftime("%B %d, %Y")
+        if isinstance(due_date, datetime):
+            return due_date.strftime("%B %d, %Y")
+    except ValueError:
+        pass
+    return str(due_date)
+
+
+def email_view(
+    invoice_data: Dict[str, Any],
+    business_info: Dict[str, Any],
+    client_default: str = "Valued Customer",
+    business_default: str = "Your Business"
+) -> Dict[str, Any]:
+    """Values shared by the HTML and plain-text parts of one email"""
+    return {
+        "invoice_number": invoice_data.get("invoiceNumber", ""),
+        "client_name": invoice_data.get("clientName") or invoice_data.get("to", {}).get("name") or client_default,
+        "total": f"{float(invoice_data.get('total', 0)):.2f}",
+        "due_date": format_due_date(invoice_data.get("dueDate", "")),
+        "business_name": business_info.get("businessName", business_default),
+        "business_email": business_info.get("email", ""),
+    }
+
+
+# ----- invoice -----
+
+def invoice_row_html(description: Any, quantity: Any, rate: str, amount: str) -> str:
+    return f"""
+        <tr>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; font-size: 14px;">{description}</td>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: center; font-size: 14px;">{quantity}</td>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: right; font-size: 14px;">${rate}</td>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: right; font-size: 14px; font-weight: 600;">${amount}</td>
+        </tr>
+        """
+
+
+def invoice_row_plain(description: Any, quantity: Any, amount: str) -> str:
+    return f"  • {description} (x{quantity}) - ${amount}\n"
+
+
+INVOICE_HTML = EmailTemplate("""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    </head>
+    <body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #f3f4f6;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 40px 20px;">
+            <!-- Header -->
+            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 16px 16px 0 0; padding: 32px; text-align: center;">
+                <h1 style="color: white; margin: 0; font-size: 28px; font-weight: 700;">Invoice #${invoice_number}</h1>
+                <p style="color: rgba(255,255,255,0.9); margin: 8px 0 0 0; font-size: 16px;">from ${business_name}</p>
+            </div>
+            
+            <!-- Main Content -->
+            <div style="background: white; padding: 32px; border-radius: 0 0 16px 16px; box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1);">
+                <!-- Greeting -->
+                <p style="font-size: 16px; color: #374151; margin: 0 0 24px 0;">
+                    Dear <strong>${client_name}</strong>,
+                </p>
+                <p style="font-size: 14px; color: #6b7280; margin: 0 0 32px 0; line-height: 1.6;">
+                    Please find your invoice details below. We appreciate your business and look forward to serving you again.
+                </p>
+                
+                <!-- Invoice Summary Box -->
+                <div style="background: #f9fafb; border-radius: 12px; padding: 24px; margin-bottom: 32px;">
+                    <div style="display: flex; justify-content: space-between; margin-bottom: 16px;">
+                        <div>
+                            <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Invoice Number</p>
+                            <p style="margin: 4px 0 0 0; font-size: 18px; font-weight: 600; color: #111827;">#${invoice_number}</p>
+                        </div>
+                        <div style="text-align: right;">
+                            <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Amount Due</p>
+                            <p style="margin: 4px 0 0 0; font-size: 24px; font-weight: 700; color: #667eea;">$$${total}</p>
+                        </div>
+                    </div>
+                    <div style="border-top: 1px solid #e5e7eb; padding-top: 16px; margin-top: 16px;">
+                        <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Due Date</p>
+                        <p style="margin: 4px 0 0 0; font-size: 16px; font-weight: 500; color: #111827;">${due_date}</p>
+                    </div>
+                </div>
+                
+                <!-- Items Table -->
+                <table style="width: 100%; border-collapse: collapse; margin-bottom: 24px;">
+                    <thead>
+                        <tr style="background: #f3f4f6;">
+                            <th style="padding: 12px; text-align: left; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Description</th>
+                            <th style="padding: 12px; text-align: center; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Qty</th>
+                            <th style="padding: 12px; text-align: right; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Rate</th>
+                            <th style="padding: 12px; text-align: right; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Total</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        ${items}
+                    </tbody>
+                    <tfoot>
+                        <tr>
+                            <td colspan="3" style="padding: 16px 12px; text-align: right; font-size: 16px; font-weight: 600; color: #374151;">Total Amount:</td>
+                            <td style="padding: 16px 12px; text-align: right; font-size: 20px; font-weight: 700; color: #667eea;">$$${total}</td>
+                        </tr>
+                    </tfoot>
+                </table>
+                
+                <!-- Payment Info -->
+                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; padding: 24px; text-align: center; margin-top: 32px;">
+                    <p style="margin: 0; font-size: 14px; color: rgba(255,255,255,0.9);">Payment is due by</p>
+                    <p style="margin: 8px 0 0 0; font-size: 20px; font-weight: 700; color: white;">${due_date}</p>
+                </div>
+                
+                <!-- Footer -->
+                <div style="margin-top: 32px; padding-top: 24px; border-top: 1px solid #e5e7eb; text-align: center;">
+                    <p style="margin: 0; font-size: 14px; color: #6b7280;">
+                        Thank you for your business!
+                    </p>
+                    <p style="margin: 8px 0 0 0; font-size: 12px; color: #9ca3af;">
+                        ${business_name} • ${business_email}
+                    </p>
+                </div>
+            </div>
+            
+            <!-- Email Footer -->
+            <div style="text-align: center; padding: 24px;">
+                <p style="margin: 0; font-size: 12px; color: #9ca3af;">
+                    This invoice was sent via PersonalCFO
+                </p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """)
+
+INVOICE_PLAIN = EmailTemplate("""
+INVOICE #${invoice_number}
+from ${business_name}
+
+=====================================
+
+Dear ${client_name},
+
+Please find your invoice details below.
+
+INVOICE DETAILS
+---------------
+Invoice Number: #${invoice_number}
+Amount Due: $$${total}
+Due Date: ${due_date}
+
+ITEMS
+-----
+${items}
+TOTAL: $$${total}
+
+=====================================
+
+Payment is due by ${due_date}
+
+Thank you for your business!
+
+${business_name}
+${business_email}
+
+---
+This invoice was sent via PersonalCFO
+    """)
+
+# ----- payment reminder -----
+
+REMINDER_HTML = EmailTemplate("""
+        <!DOCTYPE html>
+        <html>
+        <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background-color: #f3f4f6; margin: 0; padding: 40px 20px;">
+            <div style="max-width: 500px; margin: 0 auto; background: white; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1);">
+                <div style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%); padding: 24px; text-align: center;">
+                    <h1 style="color: white; margin: 0; font-size: 20px;">⏰ Payment Reminder</h1>
+                </div>
+                <div style="padding: 32px;">
+                    <p style="color: #374151; font-size: 14px; line-height: 1.6;">
+                        Dear <strong>${client_name}</strong>,
+                    </p>
+                    <p style="color: #6b7280; font-size: 14px; line-height: 1.6;">
+                        This is a friendly reminder that your invoice is pending payment.
+                    </p>
+                    <div style="background: #fef3c7; border-radius: 12px; padding: 20px; margin: 24px 0; text-align: center;">
+                        <p style="margin: 0; font-size: 12px; color: #92400e;">Invoice #${invoice_number}</p>
+                        <p style="margin: 8px 0 0 0; font-size: 28px; font-weight: 700; color: #d97706;">$$${total}</p>
+                        <p style="margin: 8px 0 0 0; font-size: 14px; color: #92400e;">Due: ${due_date}</p>
+                    </div>
+                    <p style="color: #6b7280; font-size: 14px; line-height: 1.6;">
+                        Please arrange payment at your earliest convenience.
+                    </p>
+                    <p style="color: #374151; font-size: 14px; margin-top: 24px;">
+                        Thank you,<br>
+                        <strong>${business_name}</strong>
+                    </p>
+                </div>
+            </div>
+        </body>
+        </html>
+        """)
+
+REMINDER_PLAIN = EmailTemplate("""
+Payment Reminder
+
+Dear ${client_name},
+
+This is a friendly reminder that Invoice #${invoice_number} for $$${total} was due on ${due_date}.
+
+Please arrange payment at your earliest convenience.
+
+Thank you,
+${business_name}
+        """)
+
+
+def render_invoice_email(invoice_data: Dict[str, Any], business_info: Dict[str, Any]) -> Tuple[str, str]:
+    """(plain text, HTML) bodies of an invoice email"""
+    view = email_view(invoice_data, business_info)
+    html_rows = []
+    text_rows = []
+    for item in invoice_data.get("lineItems", []):
+        description = item.get("description", "")
+        quantity = item.get("quantity", 1)
+        amount = f"{float(item.get('amount', 0)):.2f}"
+        html_rows.append(invoice_row_html(description, quantity, f"{float(item.get('rate', 0)):.2f}", amount))
+        text_rows.append(invoice_row_plain(description, quantity, amount))
+    plain = INVOICE_PLAIN.render({**view, "items": "".join(text_rows)})
+    html = INVOICE_HTML.render({**view, "items": "".join(html_rows)})
+    return plain, html
+
+
+def render_reminder_email(invoice_data: Dict[str, Any], business_info: Dict[str, Any]) -> Tuple[str, str]:
+    """(plain text, HTML) bodies of a payment reminder"""
+    view = email_view(invoice_data, business_info, client_default="Customer", business_default="")
+    return REMINDER_PLAIN.render(view), REMINDER_HTML.render(view)
@@ -0,0 +1,106 @@
+"""
+Bulk invoice PDF export as a streamed ZIP.
+
+The invoices are loaded with one query and their clients with one ``$in``
+query. PDFs are rendered through the PDF renderer (pool + cache) a few at a
+time, and every PDF is written into the archive and sent to the client as
+soon as it is ready, so entries arrive in completion order. The archive is
+written to a sink that is drained after each entry: only the PDFs currently
+being rendered are ever held in memory, never the archive.
+
+PDFs are already compressed, so entries are stored rather than deflated,
+which also keeps the event loop free of compression work.
+"""
+
+import asyncio
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from .config import settings
+from .pdf_cache import PDF_CLIENT_FIELDS, PDF_INVOICE_FIELDS
+from .pdf_renderer import invoice_pdf_filename, render_invoice_pdf
+
+
+class _ZipSink:
+    """Write-only file object for ZipFile that hands out what was written so far"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _rendered_pdfs(
+    invoices: List[Dict[str, Any]],
+    user: Dict[str, Any],
+    clients: Dict[Any, Dict[str, Any]]
+) -> AsyncIterator[Tuple[Dict[str, Any], Any]]:
+    """(invoice, PDF bytes or the exception) as renders finish, a bounded number at a time"""
+    window = max(settings.PDF_WORKERS, 1) * 2
+    remaining = iter(invoices)
+    running: Dict[asyncio.Task, Dict[str, Any]] = {}
+
+    def start_next() -> None:
+        for invoice in remaining:
+            client = clients.get(invoice.get("clientId"), {})
+            running[asyncio.ensure_future(render_invoice_pdf(invoice, user, client))] = invoice
+            return
+
+    try:
+        for _ in range(window):
+            start_next()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                invoice = running.pop(task)
+                start_next()
+                if task.cancelled():
+                    # e.g. the renderer shut down mid-export; report it like any other failure
+                    yield invoice, asyncio.CancelledError("rendering was cancelled")
+                else:
+                    yield invoice, (task.exception() or task.result())
+    finally:
+        # Client went away mid-download: stop rendering
+        for task in running:
+            task.cancel()
+
+
+async def stream_invoice_zip(db, user: Dict[str, Any], query: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """ZIP archive of the PDFs of every invoice matching ``query``, streamed chunk by chunk"""
+    projection = {field: 1 for field in (*PDF_INVOICE_FIELDS, "clientId")}
+    invoices = await db.invoices.find(query, projection).sort("issueDate", 1).to_list(length=None)
+
+    client_ids = list({invoice["clientId"] for invoice in invoices if invoice.get("clientId")})
+    clients = {
+        client["_id"]: client
+        async for client in db.clients.find({"_id": {"$in": client_ids}}, {field: 1 for field in PDF_CLIENT_FIELDS})
+    } if client_ids else {}
+
+    sink = _ZipSink()
+    names = set()
+    failures = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        async for invoice, pdf in _rendered_pdfs(invoices, user, clients):
+            if isinstance(pdf, BaseException):
+                failures.append(f"{invoice.get('invoiceNumber') or invoice['_id']}: {pdf}")
+                continue
+            name = invoice_pdf_filename(invoice)
+            if name in names:
+                name = f"{name[:-len('.pdf')]}-{invoice['_id']}.pdf"
+            names.add(name)
+            archive.writestr(name, pdf)
+            yield sink.drain()
+        if failures:
+            archive.writestr("export-errors.txt", "Could not render:\n" + "\n".join(failures) + "\n")
+    # Closing the archive wrote the central directory
+    yield sink.drain()
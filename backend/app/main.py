@@ -4,6 +4,13 @@ import logging
 
 from .database import db
 from .config import settings
+from .migrations import run_migrations, index_usage
+from .overdue import start_overdue_sweeper, stop_overdue_sweeper
+from .email_outbox import start_email_workers, stop_email_workers
+from .email_service import smtp_pool
+from .pdf_cache import pdf_cache
+from .pdf_renderer import start_pdf_renderer, stop_pdf_renderer, renderer_stats
+from .sql_snapshots import sql_snapshots
 from .routes import users_router, clients_router, jobs_router, invoices_router, expenses_router, agent_router
 
 # Configure logging
@@ -37,7 +44,7 @@ app.add_middleware(
 # Startup event - connect to database
 @app.on_event("startup")
 async def startup_event():
-    """Connect to MongoDB on startup"""
+    """Connect to MongoDB and bring indexes/schema up to date on startup"""
     try:
         logger.info("🚀 Starting up My Personal CFO API...")
         
@@ -45,7 +52,15 @@ async def startup_event():
         settings.validate()
         
         # Connect to database
-        db.connect()
+        await db.connect()
+        
+        # Create indexes and apply pending migrations
+        await run_migrations(db)
+        
+        # Render PDFs, deliver queued emails and mark overdue invoices in the background
+        start_pdf_renderer()
+        start_email_workers(db)
+        start_overdue_sweeper(db)
         
         logger.info("✅ API ready to accept requests!")
         
@@ -58,6 +73,10 @@ async def startup_event():
 async def shutdown_event():
     """Close MongoDB connection on shutdown"""
     logger.info("Shutting down...")
+    await stop_overdue_sweeper()
+    await stop_email_workers()
+    stop_pdf_renderer()
+    smtp_pool.close()
     db.close()
 
 # Include routers
@@ -80,11 +99,11 @@ def read_root():
 
 # Health check endpoint
 @app.get("/health")
-def health_check():
+async def health_check():
     """Check if API and database are working"""
     try:
         # Try to ping database
-        db.client.admin.command('ping')
+        await db.client.admin.command('ping')
         return {
             "status": "healthy",
             "database": "connected",
@@ -95,4 +114,28 @@ def health_check():
             "status": "unhealthy",
             "database": "disconnected",
             "error": str(e)
-        }
\ No newline at end of file
+        }
+
+# SMTP pool endpoint
+@app.get("/health/email")
+def email_report():
+    """SMTP connection pool counters (connections opened, reuse, average send time)"""
+    return smtp_pool.stats()
+
+# PDF cache endpoint
+@app.get("/health/pdf")
+def pdf_report():
+    """PDF render pool (queue length, wait and render times) and cache counters"""
+    return {"renderer": renderer_stats(), "cache": pdf_cache.stats()}
+
+# Agent SQL snapshot cache endpoint
+@app.get("/health/sql")
+def sql_report():
+    """Per-user DuckDB snapshot cache counters (hits, reloads, evictions, memory)"""
+    return sql_snapshots.stats()
+
+# Index report endpoint
+@app.get("/health/indexes")
+def index_report():
+    """List the indexes each endpoint relies on"""
+    return index_usage()
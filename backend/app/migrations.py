@@ -0,0 +1,384 @@
+"""
+Index bootstrap and schema migrations.
+
+Indexes are declared once in INDEXES, together with the endpoints that rely
+on them, and ensured on every startup (creating an index that already exists
+is a no-op). Data migrations are versioned and recorded in the
+``schema_migrations`` collection so each one runs exactly once per database.
+Migrations must be idempotent: if the API is stopped half-way through one it
+is run again on the next startup. Long data rewrites use backfill(), which
+works in _id-ordered batches and checkpoints its position so a restarted
+migration resumes where it stopped instead of starting over.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
+
+from .object_ids import REFERENCE_FIELDS, coerce_reference
+from .user_stats import rebuild_user_stats
+from .dates import parse_date
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+BACKFILL_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """An index on one collection and the endpoints whose queries it serves"""
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    used_by: Tuple[str, ...]
+    unique: bool = False
+    partial_filter: Optional[Dict[str, Any]] = None
+
+    @property
+    def name(self) -> str:
+        """Same name MongoDB would generate, e.g. ``userId_1_status_1``"""
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+    def to_model(self) -> IndexModel:
+        options: Dict[str, Any] = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.partial_filter:
+            options["partialFilterExpression"] = self.partial_filter
+        return IndexModel(list(self.keys), **options)
+
+
+INDEXES: List[IndexSpec] = [
+    # ----- users -----
+    # Partial so that legacy users without an auth0_id don't collide on null
+    IndexSpec(
+        "users", (("auth0_id", ASCENDING),),
+        unique=True,
+        partial_filter={"auth0_id": {"$type": "string"}},
+        used_by=(
+            "POST /users/sync",
+            "GET /users/profile",
+            "PUT /users/profile",
+            "POST /users/",
+            "GET /users/by-auth0/{auth0_id}",
+            "POST /agent/chat",
+        ),
+    ),
+
+    # ----- clients -----
+    # List endpoints page on (filter..., _id) - see app/pagination.py
+    IndexSpec(
+        "clients", (("userId", ASCENDING), ("_id", ASCENDING)),
+        used_by=(
+            "GET /clients/",
+            "GET /users/{user_id}/clients",
+            "GET /users/{user_id}/summary",
+            "POST /agent/chat",
+        ),
+    ),
+    IndexSpec(
+        "clients", (("userId", ASCENDING), ("archived", ASCENDING), ("_id", ASCENDING)),
+        used_by=("GET /clients/",),
+    ),
+
+    # ----- jobs -----
+    IndexSpec(
+        "jobs", (("userId", ASCENDING), ("_id", ASCENDING)),
+        used_by=(
+            "GET /jobs/",
+            "GET /users/{user_id}/jobs",
+            "GET /users/{user_id}/summary",
+            "POST /agent/chat",
+        ),
+    ),
+    IndexSpec(
+        "jobs", (("userId", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)),
+        used_by=(
+            "GET /jobs/",
+            "GET /users/{user_id}/jobs",
+            "GET /users/{user_id}/summary",
+        ),
+    ),
+    IndexSpec(
+        "jobs", (("clientId", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)),
+        used_by=(
+            "GET /jobs/",
+            "GET /clients/{client_id}/jobs",
+            "GET /clients/{client_id}/summary",
+            "GET /users/{user_id}/clients",
+        ),
+    ),
+
+    # ----- invoices -----
+    IndexSpec(
+        "invoices", (("userId", ASCENDING), ("_id", ASCENDING)),
+        used_by=(
+            "GET /invoices/",
+            "GET /users/{user_id}/invoices",
+            "GET /users/{user_id}/summary",
+            "POST /agent/chat",
+        ),
+    ),
+    IndexSpec(
+        "invoices", (("userId", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)),
+        used_by=(
+            "GET /invoices/",
+            "GET /users/{user_id}/invoices",
+            "GET /users/{user_id}/summary",
+        ),
+    ),
+    IndexSpec(
+        "invoices", (("clientId", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)),
+        used_by=(
+            "GET /invoices/",
+            "GET /clients/{client_id}/invoices",
+            "GET /clients/{client_id}/summary",
+            "GET /users/{user_id}/clients",
+        ),
+    ),
+    IndexSpec(
+        "invoices", (("userId", ASCENDING), ("issueDate", ASCENDING)),
+        used_by=("GET /users/{user_id}/invoices/export.zip",),
+    ),
+    IndexSpec(
+        "invoices", (("status", ASCENDING), ("dueDate", ASCENDING)),
+        used_by=("overdue sweeper",),
+    ),
+    IndexSpec(
+        "invoices", (("overdueFollowUp", ASCENDING),),
+        partial_filter={"overdueFollowUp": True},
+        used_by=("overdue sweeper",),
+    ),
+
+    # ----- expenses -----
+    IndexSpec(
+        "expenses", (("userId", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)),
+        used_by=(
+            "GET /expenses/",
+            "GET /expenses/summary/by-user/{user_id}",
+            "POST /agent/chat",
+        ),
+    ),
+    IndexSpec(
+        "expenses", (("jobId", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)),
+        used_by=("GET /expenses/",),
+    ),
+
+    # ----- email_outbox -----
+    IndexSpec(
+        "email_outbox", (("status", ASCENDING), ("nextAttemptAt", ASCENDING)),
+        used_by=("email outbox workers",),
+    ),
+    IndexSpec(
+        "email_outbox", (("invoiceId", ASCENDING), ("createdAt", DESCENDING)),
+        used_by=("GET /invoices/{invoice_id}/emails", "POST /invoices/reminders/bulk"),
+    ),
+    IndexSpec(
+        "email_outbox", (("campaignId", ASCENDING),),
+        partial_filter={"campaignId": {"$exists": True}},
+        used_by=("GET /invoices/reminders/bulk/{campaign_id}",),
+    ),
+]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A one-off data migration, applied in version order"""
+    version: int
+    description: str
+    apply: Callable[[Any], Awaitable[None]]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Register a coroutine ``fn(db)`` as a versioned migration"""
+    def decorator(fn: Callable[[Any], Awaitable[None]]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version: {version}")
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return decorator
+
+
+def index_usage() -> Dict[str, List[str]]:
+    """Map each endpoint to the indexes (``collection.name``) it relies on"""
+    usage: Dict[str, List[str]] = {}
+    for spec in INDEXES:
+        for endpoint in spec.used_by:
+            usage.setdefault(endpoint, []).append(f"{spec.collection}.{spec.name}")
+    return dict(sorted(usage.items()))
+
+
+async def ensure_indexes(db) -> None:
+    """Create every declared index that doesn't exist yet"""
+    by_collection: Dict[str, List[IndexSpec]] = {}
+    for spec in INDEXES:
+        by_collection.setdefault(spec.collection, []).append(spec)
+
+    for collection_name, specs in by_collection.items():
+        collection = db.get_collection(collection_name)
+        for spec in specs:
+            try:
+                await collection.create_indexes([spec.to_model()])
+            except OperationFailure as e:
+                # A conflicting or unbuildable index (e.g. duplicate auth0_id values)
+                # must not take the whole API down - log it and keep going
+                logger.error(f"❌ Could not create index {collection_name}.{spec.name}: {e}")
+        logger.info(f"Indexes ensured on {collection_name}: {[s.name for s in specs]}")
+
+
+async def backfill(
+    db,
+    version: int,
+    collection_name: str,
+    query: Dict[str, Any],
+    transform: Callable[[Dict[str, Any]], Dict[str, Any]],
+    batch_size: int = BACKFILL_BATCH_SIZE
+) -> int:
+    """
+    Rewrite every document matching ``query`` in _id order.
+
+    ``transform(doc)`` returns the fields to $set (empty to leave the document
+    alone). Progress is checkpointed on the migration's schema_migrations entry
+    after every batch. Returns the number of documents modified.
+    """
+    collection = db.get_collection(collection_name)
+    progress = db.get_collection(MIGRATIONS_COLLECTION)
+    checkpoint_field = f"checkpoints.{collection_name}"
+
+    state = await progress.find_one({"_id": version}, {checkpoint_field: 1})
+    last_id = ((state or {}).get("checkpoints") or {}).get(collection_name)
+
+    modified = 0
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query["_id"] = {"$gt": last_id}
+        batch = await collection.find(batch_query).sort("_id", ASCENDING).limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+
+        updates = []
+        for doc in batch:
+            changes = transform(doc)
+            if changes:
+                updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+        if updates:
+            result = await collection.bulk_write(updates, ordered=False)
+            modified += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        await progress.update_one(
+            {"_id": version},
+            {"$set": {checkpoint_field: last_id}},
+            upsert=True
+        )
+
+    logger.info(f"Backfill {version} rewrote {modified} document(s) in {collection_name}")
+    return modified
+
+
+async def run_migrations(db) -> None:
+    """Ensure indexes, then apply every pending migration in version order"""
+    await ensure_indexes(db)
+
+    applied_collection = db.get_collection(MIGRATIONS_COLLECTION)
+    applied = {
+        doc["_id"]
+        for doc in await applied_collection.find(
+            {"appliedAt": {"$exists": True}}, {"_id": 1}
+        ).to_list(length=None)
+    }
+
+    for m in sorted(MIGRATIONS, key=lambda m: m.version):
+        if m.version in applied:
+            continue
+        logger.info(f"Applying migration {m.version}: {m.description}")
+        await m.apply(db)
+        await applied_collection.update_one(
+            {"_id": m.version},
+            {"$set": {"description": m.description, "appliedAt": datetime.utcnow()}},
+            upsert=True
+        )
+
+    current = max([m.version for m in MIGRATIONS], default=0)
+    logger.info(f"✅ Database schema at version {current}")
+
+
+# ===== MIGRATIONS =====
+
+@migration(1, "Store reference fields (userId, clientId, jobId, invoiceId) as ObjectId")
+async def _references_to_object_id(db):
+    for collection_name, fields in REFERENCE_FIELDS.items():
+        def transform(doc, fields=fields):
+            changes = {}
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                canonical = coerce_reference(value)
+                if canonical is not value:
+                    changes[field] = canonical
+                else:
+                    logger.warning(f"{collection_name} {doc['_id']}: {field}={value!r} is not an ObjectId, left as-is")
+            return changes
+
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        await backfill(db, 1, collection_name, query, transform)
+
+
+@migration(2, "Drop indexes superseded by the keyset pagination indexes")
+async def _drop_pre_pagination_indexes(db):
+    superseded = {
+        "clients": ["userId_1_archived_1"],
+        "jobs": ["userId_1_status_1", "clientId_1_status_1"],
+        "invoices": ["userId_1_status_1", "clientId_1_status_1"],
+        "expenses": ["userId_1_date_-1", "jobId_1_date_-1"],
+    }
+    for collection_name, names in superseded.items():
+        existing = await db.get_collection(collection_name).index_information()
+        for name in names:
+            if name in existing:
+                await db.get_collection(collection_name).drop_index(name)
+                logger.info(f"Dropped index {collection_name}.{name}")
+
+
+@migration(3, "Build the user_stats summary document for every user")
+async def _build_user_stats(db):
+    built = 0
+    async for user in db.users.find({}, {"_id": 1}):
+        await rebuild_user_stats(db, user["_id"])
+        built += 1
+    logger.info(f"Built user_stats for {built} user(s)")
+
+
+@migration(4, "Store invoice issueDate/dueDate as datetimes")
+async def _invoice_dates_to_datetime(db):
+    def transform(doc):
+        changes = {}
+        for field in ("issueDate", "dueDate"):
+            value = doc.get(field)
+            if not isinstance(value, str):
+                continue
+            try:
+                changes[field] = parse_date(value)
+            except ValueError:
+                logger.warning(f"invoices {doc['_id']}: {field}={value!r} is not a date, left as-is")
+        return changes
+
+    query = {"$or": [{"issueDate": {"$type": "string"}}, {"dueDate": {"$type": "string"}}]}
+    await backfill(db, 4, "invoices", query, transform)
+
+
+@migration(5, "Drop the markedOverdueAt index (the sweeper now finds its invoices by overdueFollowUp)")
+async def _drop_marked_overdue_index(db):
+    existing = await db.invoices.index_information()
+    if "markedOverdueAt_1" in existing:
+        await db.invoices.drop_index("markedOverdueAt_1")
+        logger.info("Dropped index invoices.markedOverdueAt_1")
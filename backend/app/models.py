@@ -1,9 +1,11 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 from pydantic_core import core_schema
 from typing import Optional, List, Any, Union
 from datetime import datetime
 from bson import ObjectId
 
+from .dates import parse_date
+
 # Custom type for MongoDB ObjectId (Pydantic v2 compatible)
 class PyObjectId(str):
     @classmethod
@@ -202,6 +204,12 @@ class InvoiceBase(BaseModel):
         extra='allow'                 # Don't crash on extra AI data
     )
 
+    @field_validator("issueDate", "dueDate", mode="before")
+    @classmethod
+    def parse_dates(cls, v):
+        """Store dates as datetimes so they can be range-queried"""
+        return parse_date(v)
+
 class InvoiceCreate(InvoiceBase):
     # No mandatory fields here either
     pass
@@ -301,6 +309,16 @@ class Expense(ExpenseBase):
         }
 
 
+# ===== REMINDER CAMPAIGN MODELS =====
+
+class BulkReminderRequest(BaseModel):
+    """Which of a user's invoices to send payment reminders for"""
+    userId: str
+    invoiceIds: Optional[List[str]] = None  # Limit to these invoices
+    status: str = "overdue"
+    minDaysOverdue: int = Field(default=0, ge=0)  # Only invoices due at least this many days ago
+
+
 # ===== RESPONSE MODELS =====
 
 class MessageResponse(BaseModel):
@@ -0,0 +1,69 @@
+"""
+Canonical storage of document references.
+
+Every foreign key (userId, clientId, jobId, invoiceId) is stored as an
+ObjectId, never as its hex string, so relationship queries are a single
+indexed equality match.
+"""
+
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+# Reference fields stored on each collection
+REFERENCE_FIELDS = {
+    "clients": ("userId",),
+    "jobs": ("userId", "clientId", "invoiceId"),
+    "invoices": ("userId", "clientId", "jobId"),
+    "expenses": ("userId", "jobId"),
+}
+
+# Label used in error messages, e.g. "Invalid client ID format"
+_LABELS = {
+    "userId": "user",
+    "clientId": "client",
+    "jobId": "job",
+    "invoiceId": "invoice",
+}
+
+
+def to_object_id(value: Any, label: str) -> ObjectId:
+    """Parse an ObjectId from a path/query/body value or raise a 400"""
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid {label} ID format"
+    )
+
+
+def coerce_reference(value: Any) -> Optional[ObjectId]:
+    """
+    Canonical form of a stored reference: ObjectId, or None for blank values.
+    Returns the value unchanged if it can't be converted.
+    """
+    if value is None or isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str):
+        if not value.strip():
+            return None
+        if ObjectId.is_valid(value):
+            return ObjectId(value)
+    return value
+
+
+def normalize_references(data: Dict[str, Any], collection: str) -> Dict[str, Any]:
+    """
+    Convert the reference fields present in ``data`` to ObjectId in place.
+    Blank strings become None; anything else that isn't a valid ObjectId is a 400.
+    """
+    for field in REFERENCE_FIELDS[collection]:
+        if field not in data:
+            continue
+        value = coerce_reference(data[field])
+        if value is not None and not isinstance(value, ObjectId):
+            to_object_id(value, _LABELS[field])  # raises
+        data[field] = value
+    return data
@@ -0,0 +1,117 @@
+"""
+Background overdue-invoice sweeper.
+
+Every OVERDUE_SWEEP_INTERVAL_SECONDS (and once at startup) all ``sent``
+invoices whose due date is before today (UTC) are flipped to ``overdue``
+with a single indexed ``update_many``, which stamps them with
+``markedOverdueAt`` and an ``overdueFollowUp`` flag. The sweep then claims
+the flagged invoices one at a time (an atomic find_one_and_update that
+takes a FOLLOW_UP_LEASE_SECONDS lease, since every API process runs a
+sweeper), updates the owner's stats, queues a payment reminder in the email
+outbox (so a slow SMTP server never holds up a sweep) and clears the flag.
+An invoice whose sweep died half-way is picked up by a later sweep once its
+lease runs out; at worst it gets its stats change and reminder twice.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from .config import settings
+from .email_outbox import enqueue_email
+from .user_stats import record_change
+
+logger = logging.getLogger(__name__)
+
+# How long a sweep may hold an invoice's follow-up before another sweep may retry it
+FOLLOW_UP_LEASE_SECONDS = 300
+
+_tasks = []
+
+
+def overdue_query(today: datetime) -> Dict[str, Any]:
+    """Sent invoices due before ``today`` (midnight UTC, naive)"""
+    return {"status": "sent", "dueDate": {"$lt": today}}
+
+
+async def _claim_follow_up(db) -> Optional[Dict[str, Any]]:
+    """Atomically take a flagged invoice that no other sweep is working on"""
+    now = datetime.utcnow()
+    return await db.invoices.find_one_and_update(
+        {"overdueFollowUp": True, "followUpLeaseUntil": {"$not": {"$gt": now}}},
+        {"$set": {"followUpLeaseUntil": now + timedelta(seconds=FOLLOW_UP_LEASE_SECONDS)}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _follow_up(db, invoice: Dict[str, Any]) -> None:
+    # Queue a reminder if it's still unpaid and the client has an email address
+    if invoice.get("status") == "overdue" and invoice.get("clientId"):
+        client = await db.clients.find_one({"_id": invoice["clientId"]}, {"email": 1})
+        if client and client.get("email"):
+            await enqueue_email(db, "reminder", invoice["_id"], client["email"])
+    # The invoice may have been edited since it was marked; the sweep's own
+    # change was sent -> overdue, later edits counted themselves
+    await record_change(db, "invoices", {**invoice, "status": "sent"}, {**invoice, "status": "overdue"})
+    await db.invoices.update_one(
+        {"_id": invoice["_id"]},
+        {"$unset": {"overdueFollowUp": "", "followUpLeaseUntil": ""}}
+    )
+
+
+async def sweep_overdue_invoices(db, now: Optional[datetime] = None) -> int:
+    """Mark every overdue invoice and queue its reminder. Returns the number marked."""
+    now = now or datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    stamp = now.replace(tzinfo=None)
+
+    result = await db.invoices.update_many(
+        overdue_query(today),
+        {"$set": {"status": "overdue", "markedOverdueAt": stamp, "overdueFollowUp": True}}
+    )
+    if result.modified_count:
+        logger.info(f"Marked {result.modified_count} invoice(s) overdue")
+
+    # Includes invoices an earlier sweep marked but didn't finish with
+    while True:
+        invoice = await _claim_follow_up(db)
+        if invoice is None:
+            break
+        try:
+            await _follow_up(db, invoice)
+        except BaseException:
+            # Let the next sweep retry it without waiting for the lease
+            await db.invoices.update_one({"_id": invoice["_id"]}, {"$unset": {"followUpLeaseUntil": ""}})
+            raise
+
+    return result.modified_count
+
+
+async def _sweep_loop(db, interval: int) -> None:
+    while True:
+        try:
+            await sweep_overdue_invoices(db)
+        except Exception as e:
+            # A failed sweep is retried on the next tick
+            logger.error(f"❌ Overdue sweep failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_overdue_sweeper(db, interval: Optional[int] = None) -> None:
+    """Start the sweep loop (call from app startup)"""
+    if _tasks:
+        return
+    interval = interval or settings.OVERDUE_SWEEP_INTERVAL_SECONDS
+    _tasks.append(asyncio.create_task(_sweep_loop(db, interval)))
+    logger.info(f"Overdue sweeper running every {interval}s")
+
+
+async def stop_overdue_sweeper() -> None:
+    """Cancel the background tasks (call from app shutdown)"""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -0,0 +1,130 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by ``(sortKey, _id)`` and the cursor is an opaque token
+holding the last document's sort key and _id. The next page is fetched with a
+range query on that pair instead of ``skip()``, so every page costs the same
+as the first one and stays consistent while documents are being inserted.
+List endpoints keep returning a plain JSON array; the token for the next page
+is sent in the ``X-Next-Cursor`` response header (absent on the last page).
+"""
+
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from bson.errors import InvalidBSON
+from fastapi import HTTPException, status
+from pymongo import ASCENDING, DESCENDING
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(doc: Dict[str, Any], sort_field: Optional[str] = None) -> str:
+    """Build the opaque token pointing just after ``doc``"""
+    payload = {"id": doc["_id"]}
+    if sort_field:
+        payload["v"] = doc.get(sort_field)
+    raw = json_util.dumps(payload).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """Parse a token produced by encode_cursor(), or raise a 400"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict) or "id" not in payload:
+            raise ValueError("missing _id")
+        return payload
+    except (ValueError, TypeError, binascii.Error, InvalidBSON):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def sort_spec(sort_field: Optional[str], direction: int) -> List[Tuple[str, int]]:
+    """Sort order for a page; _id breaks ties so the order is total"""
+    if sort_field:
+        return [(sort_field, direction), ("_id", direction)]
+    return [("_id", direction)]
+
+
+def keyset_filter(cursor: Dict[str, Any], sort_field: Optional[str], direction: int) -> Dict[str, Any]:
+    """Query matching documents strictly after the cursor in (sortKey, _id) order"""
+    op = "$gt" if direction == ASCENDING else "$lt"
+    last_id = cursor["id"]
+    if not sort_field:
+        return {"_id": {op: last_id}}
+
+    value = cursor.get("v")
+    same_key = {sort_field: value, "_id": {op: last_id}}
+    # null/missing sort keys come first in ascending order and last in descending
+    # order, and a range operator never matches them - handle them explicitly
+    if value is None:
+        if direction == ASCENDING:
+            return {"$or": [{sort_field: {"$ne": None}}, same_key]}
+        return same_key
+    branches = [{sort_field: {op: value}}, same_key]
+    if direction == DESCENDING:
+        branches.append({sort_field: None})
+    return {"$or": branches}
+
+
+def keyset_query(
+    query: Dict[str, Any],
+    cursor: Optional[str],
+    sort_field: Optional[str] = None,
+    direction: int = ASCENDING
+) -> Dict[str, Any]:
+    """Restrict ``query`` to the documents after ``cursor`` (if any)"""
+    if not cursor:
+        return query
+    return {"$and": [query, keyset_filter(decode_cursor(cursor), sort_field, direction)]}
+
+
+async def paginate(
+    collection,
+    query: Dict[str, Any],
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    sort_field: Optional[str] = None,
+    direction: int = ASCENDING,
+    projection: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of ``query``. Returns ``(documents, next_cursor)``.
+
+    ``skip`` is still honoured for old clients but ignored once a cursor is given.
+    """
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        )
+
+    if cursor:
+        query = keyset_query(query, cursor, sort_field, direction)
+        skip = 0
+
+    find = collection.find(query, projection).sort(sort_spec(sort_field, direction))
+    if skip:
+        find = find.skip(skip)
+    # One extra document tells us whether there is a next page
+    docs = await find.limit(limit + 1).to_list(length=None)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
+
+def cursor_headers(next_cursor: Optional[str]) -> Dict[str, str]:
+    """Response headers carrying the next-page token, if there is one"""
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
@@ -0,0 +1,135 @@
+"""
+Content-addressed cache of rendered invoice PDFs.
+
+A PDF depends only on a handful of invoice, user and client fields, so its
+cache key is the sha256 of those fields (plus a renderer version). Files are
+stored on local disk as ``{invoice id}-{key}.pdf``: a changed invoice, user
+or client simply hashes to a new key, and every version of one invoice can
+be dropped by its id prefix when the invoice is updated or deleted.
+
+The cache is bounded to PDF_CACHE_MAX_MB; the least recently used files are
+evicted first. Rendering itself lives in pdf_renderer.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .config import settings
+from .serialization import dumps
+
+# Bump when the PDF layout changes so old renders are not served
+RENDERER_VERSION = 1
+
+# Fields create_pdf_document reads from each document
+PDF_INVOICE_FIELDS = (
+    "invoiceNumber", "issueDate", "dueDate", "status", "total",
+    "lineItems", "invoiceTitle", "invoiceDescription",
+)
+PDF_USER_FIELDS = ("businessName", "businessAddress", "businessPhone", "businessEmail")
+PDF_CLIENT_FIELDS = ("name", "email", "address")
+
+
+def pdf_cache_key(invoice: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any]) -> str:
+    """sha256 of everything that affects the rendered PDF"""
+    content = {
+        "v": RENDERER_VERSION,
+        "invoice": {field: invoice.get(field) for field in PDF_INVOICE_FIELDS},
+        "user": {field: user.get(field) for field in PDF_USER_FIELDS},
+        "client": {field: client.get(field) for field in PDF_CLIENT_FIELDS},
+    }
+    return hashlib.sha256(dumps(content, sort_keys=True)).hexdigest()
+
+
+class PDFCache:
+    """Size-bounded LRU of PDF files in one directory (thread-safe)"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Optional["OrderedDict[str, int]"] = None  # file name -> size, oldest first
+        self._size = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _load(self) -> "OrderedDict[str, int]":
+        """Index the files already on disk (oldest first) on first use"""
+        if self._entries is None:
+            os.makedirs(self.directory, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, stat.st_size))
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+            self._size = sum(self._entries.values())
+        return self._entries
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _remove(self, name: str) -> None:
+        self._size -= self._entries.pop(name, 0)
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def get(self, invoice_id: Any, key: str) -> Optional[bytes]:
+        """The cached PDF, or None"""
+        name = f"{invoice_id}-{key}.pdf"
+        with self._lock:
+            entries = self._load()
+            if name not in entries:
+                self._stats["misses"] += 1
+                return None
+            try:
+                with open(self._path(name), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # Removed behind our back (e.g. by another process)
+                self._size -= entries.pop(name)
+                self._stats["misses"] += 1
+                return None
+            entries.move_to_end(name)
+            self._stats["hits"] += 1
+        return data
+
+    def put(self, invoice_id: Any, key: str, data: bytes) -> None:
+        """Store a PDF, evicting the least recently used files to stay under max_bytes"""
+        name = f"{invoice_id}-{key}.pdf"
+        with self._lock:
+            entries = self._load()
+            # Write to a temp file and rename so readers never see a partial PDF
+            tmp_path = self._path(f".{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(name))
+            self._size += len(data) - entries.pop(name, 0)
+            entries[name] = len(data)
+            while self._size > self.max_bytes and len(entries) > 1:
+                oldest = next(iter(entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, invoice_id: Any) -> int:
+        """Drop every cached version of an invoice. Returns the number of files removed."""
+        prefix = f"{invoice_id}-"
+        with self._lock:
+            entries = self._load()
+            stale = [name for name in entries if name.startswith(prefix)]
+            for name in stale:
+                self._remove(name)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the health endpoint"""
+        with self._lock:
+            entries = self._load()
+            return {**self._stats, "files": len(entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+pdf_cache = PDFCache(settings.PDF_CACHE_DIR, settings.PDF_CACHE_MAX_MB * 1024 * 1024)
+
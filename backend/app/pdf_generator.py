@@ -2,195 +2,217 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether
+    SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, KeepTogether, Flowable
 )
+from reportlab.platypus import paragraph as rl_paragraph
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_RIGHT, TA_CENTER
 from reportlab.pdfbase.pdfmetrics import stringWidth
 from io import BytesIO
-import base64
-from typing import Dict, Any
+from typing import Dict, Any, BinaryIO, NamedTuple, Optional
 from datetime import datetime
+from functools import lru_cache
 
+from .config import settings
 
-def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any]) -> BytesIO:
+PAGE_MARGIN = 0.75 * inch
+CONTENT_WIDTH = letter[0] - 2 * PAGE_MARGIN
+
+# Keep your original proportions (fits nicely visually)
+ITEMS_COL_WIDTHS = [2.8 * inch, 0.8 * inch, 1.2 * inch, 1.7 * inch]
+
+# Rows the streaming line-items table lays out at first; later pages start
+# from the previous page's row count
+STREAM_WINDOW_ROWS = 8
+
+# ---------- Colors ----------
+COLOR_PRIMARY = '#667eea'
+color_text = colors.HexColor('#333333')
+color_light = colors.HexColor('#666666')
+color_grid = colors.HexColor('#eeeeee')
+color_row = colors.HexColor('#f5f5f5')
+
+# ---------- Font metrics ----------
+# Text widths only depend on (text, font, size), and invoices repeat the same
+# words, amounts and labels over and over: measure each once per process.
+measure_text = lru_cache(maxsize=16384)(stringWidth)
+
+
+def install_paragraph_width_cache() -> bool:
     """
-    Fix for "smushed/overlapping subtotal/total labels":
-    - NEVER place subtotal rows inside the 4-column line-items table.
-    - ReportLab does NOT clip overflow text in table cells, so long labels will paint into adjacent cells.
-    - Instead, render subtotals/totals as separate right-aligned 2-column mini-tables.
+    Route reportlab's Paragraph line breaking through measure_text.
+
+    Paragraph measures every word via the stringWidth global of
+    reportlab.platypus.paragraph (from module-level helpers, so a subclass
+    can't redirect it); this swaps that one global. It's the only reportlab
+    patch in the app, kept in step with the version pinned in requirements.txt
+    (tests/test_pdf_generator.py fails if the module stops using the global).
+    Leaves the module alone if it no longer looks like the pinned one.
     """
-    buffer = BytesIO()
+    current = getattr(rl_paragraph, "stringWidth", None)
+    if current is measure_text:
+        return True
+    if current is not stringWidth:
+        return False
+    rl_paragraph.stringWidth = measure_text
+    return True
+
+
+install_paragraph_width_cache()
+
+
+class Branding(NamedTuple):
+    """The parts of a user's profile that show up in the PDF header"""
+    business_name: str
+    business_address: Optional[str]
+    business_phone: Optional[str]
+    business_email: Optional[str]
+    primary_color: str = COLOR_PRIMARY
+
+    @classmethod
+    def from_user(cls, user: Dict[str, Any]) -> "Branding":
+        return cls(
+            user.get('businessName', 'Invoice'),
+            user.get('businessAddress'),
+            user.get('businessPhone'),
+            user.get('businessEmail'),
+        )
 
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=0.75 * inch,
-        leftMargin=0.75 * inch,
-        topMargin=0.75 * inch,
-        bottomMargin=0.75 * inch
-    )
 
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # ---------- Colors ----------
-    color_primary = colors.HexColor('#667eea')
-    color_text = colors.HexColor('#333333')
-    color_light = colors.HexColor('#666666')
-    color_grid = colors.HexColor('#eeeeee')
-
-    # ---------- Styles ----------
-    style_title = ParagraphStyle(
-        'Title', parent=styles['Heading1'],
-        fontSize=20, textColor=color_text, spaceAfter=2
-    )
-    style_normal = ParagraphStyle(
-        'Normal', parent=styles['Normal'],
-        fontSize=10, textColor=color_text, leading=14
-    )
-    style_right_meta = ParagraphStyle(
-        'RightMeta', parent=style_normal,
-        alignment=TA_RIGHT, fontSize=10
-    )
-    style_label_small = ParagraphStyle(
-        'LabelSmall', parent=style_normal,
-        textColor=color_light, fontSize=9
-    )
-    style_section = ParagraphStyle(
-        'Section', parent=styles['Heading2'],
-        fontSize=11, textColor=color_primary,
-        spaceBefore=12, spaceAfter=6, fontName='Helvetica-Bold'
-    )
+class InvoiceLayout:
+    """
+    Styles, table styles and header text for one branding.
+    Built once (see get_invoice_layout) and shared by every render for that
+    branding, so a render only creates the invoice's own flowables.
+    Everything here is read-only during a build.
+    """
 
-    # Money styles
-    style_money = ParagraphStyle(
-        'Money', parent=style_normal, alignment=TA_RIGHT, fontSize=9, leading=12
-    )
-    style_money_bold = ParagraphStyle(
-        'MoneyBold', parent=style_money, fontName='Helvetica-Bold'
-    )
+    def __init__(self, branding: Branding):
+        styles = getSampleStyleSheet()
+        self.branding = branding
+        self.primary_hex = branding.primary_color
+        self.color_primary = color_primary = colors.HexColor(branding.primary_color)
 
-    # Mini-table styles (subtotals / totals)
-    style_pair_label = ParagraphStyle(
-        'PairLabel', parent=style_normal,
-        alignment=TA_RIGHT, fontSize=10, leading=14,
-        textColor=color_text, fontName='Helvetica-Bold'
-    )
-    style_pair_value = ParagraphStyle(
-        'PairValue', parent=style_normal,
-        alignment=TA_RIGHT, fontSize=10, leading=14,
-        textColor=color_text, fontName='Helvetica-Bold'
-    )
-    style_total_label = ParagraphStyle(
-        'TotalLabel', parent=style_normal,
-        alignment=TA_RIGHT, fontSize=14, leading=16,
-        textColor=color_primary, fontName='Helvetica-Bold'
-    )
-    style_total_value = ParagraphStyle(
-        'TotalValue', parent=style_normal,
-        alignment=TA_RIGHT, fontSize=14, leading=16,
-        textColor=color_primary, fontName='Helvetica-Bold'
-    )
+        # ---------- Styles ----------
+        self.style_title = ParagraphStyle(
+            'Title', parent=styles['Heading1'],
+            fontSize=20, textColor=color_text, spaceAfter=2
+        )
+        self.style_normal = style_normal = ParagraphStyle(
+            'Normal', parent=styles['Normal'],
+            fontSize=10, textColor=color_text, leading=14
+        )
+        self.style_right_meta = ParagraphStyle(
+            'RightMeta', parent=style_normal,
+            alignment=TA_RIGHT, fontSize=10
+        )
+        self.style_label_small = ParagraphStyle(
+            'LabelSmall', parent=style_normal,
+            textColor=color_light, fontSize=9
+        )
+        self.style_section = ParagraphStyle(
+            'Section', parent=styles['Heading2'],
+            fontSize=11, textColor=color_primary,
+            spaceBefore=12, spaceAfter=6, fontName='Helvetica-Bold'
+        )
 
-    # ---------- Helpers ----------
-    def safe_float(x) -> float:
-        try:
-            return float(x or 0)
-        except Exception:
-            return 0.0
+        # Money styles
+        self.style_money = ParagraphStyle(
+            'Money', parent=style_normal, alignment=TA_RIGHT, fontSize=9, leading=12
+        )
+        self.style_money_bold = ParagraphStyle(
+            'MoneyBold', parent=self.style_money, fontName='Helvetica-Bold'
+        )
 
-    def format_currency(value) -> str:
-        try:
-            return f"${float(value):,.2f}"
-        except (ValueError, TypeError):
-            return "$0.00"
+        # Mini-table styles (subtotals / totals)
+        self.style_pair_label = ParagraphStyle(
+            'PairLabel', parent=style_normal,
+            alignment=TA_RIGHT, fontSize=10, leading=14,
+            textColor=color_text, fontName='Helvetica-Bold'
+        )
+        self.style_pair_value = ParagraphStyle(
+            'PairValue', parent=style_normal,
+            alignment=TA_RIGHT, fontSize=10, leading=14,
+            textColor=color_text, fontName='Helvetica-Bold'
+        )
+        self.style_total_label = ParagraphStyle(
+            'TotalLabel', parent=style_normal,
+            alignment=TA_RIGHT, fontSize=14, leading=16,
+            textColor=color_primary, fontName='Helvetica-Bold'
+        )
+        self.style_total_value = ParagraphStyle(
+            'TotalValue', parent=style_normal,
+            alignment=TA_RIGHT, fontSize=14, leading=16,
+            textColor=color_primary, fontName='Helvetica-Bold'
+        )
 
-    def format_qty(qty) -> str:
-        try:
-            q = float(qty)
-            return str(int(q)) if q.is_integer() else str(q)
-        except Exception:
-            return "0"
-
-    def format_date(date_val) -> str:
-        if not date_val:
-            return ""
-        if isinstance(date_val, str):
-            try:
-                dt = datetime.fromisoformat(date_val.replace('Z', '+00:00'))
-                # keep your screenshot style: 1/18/2026
-                return f"{dt.month}/{dt.day}/{dt.year}"
-            except Exception:
-                return date_val
-        return str(date_val)
-
-    def compute_pair_col_widths(
-        max_label_text: str,
-        value_strings: list[str],
-        font_label: str,
-        size_label: float,
-        font_value: str,
-        size_value: float,
-        min_label_w: float = 2.0 * inch,
-        min_value_w: float = 1.2 * inch,
-        pad_pts: float = 10.0,
-        max_total_w: float | None = None
-    ):
-        """
-        Compute (label_w, value_w) for a right-aligned 2-col mini-table.
-        We size the value column to the widest currency string + padding,
-        and guarantee a minimum label width so labels don't wrap/overlap.
-        """
-        if max_total_w is None:
-            max_total_w = doc.width  # in points
-
-        # width in points - add extra safety margin for bold fonts and rendering
-        widest_value = 0.0
-        for s in (value_strings or ["$0.00"]):
-            # Add 10% safety margin for bold fonts and rendering variations
-            text_width = stringWidth(s, font_value, size_value)
-            widest_value = max(widest_value, text_width * 1.1)
-        
-        # Ensure value column has enough space with generous padding
-        needed_value_w = widest_value + 2 * pad_pts + 20  # extra 20pt safety margin
-        value_w = max(min_value_w, needed_value_w)
-
-        # label needs at least min_label_w; also consider actual label text width
-        # Add safety margin for bold fonts
-        label_text_w = stringWidth(max_label_text, font_label, size_label) * 1.1 + 2 * pad_pts + 15
-        label_w = max(min_label_w, label_text_w)
+        # Footer
+        self.style_footer = ParagraphStyle(
+            'Footer', parent=style_normal,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Oblique',
+            textColor=color_light
+        )
+        self.style_footer2 = ParagraphStyle(
+            'Footer2', parent=style_normal,
+            alignment=TA_CENTER,
+            fontSize=9,
+            textColor=color_light
+        )
 
-        total_w = label_w + value_w
-        if total_w > max_total_w:
-            # if too wide, squeeze label first (keep value width) but never below absolute minimum
-            # Use a more conservative absolute minimum to prevent overlap
-            absolute_min_label = stringWidth(max_label_text, font_label, size_label) * 1.15 + 15
-            overflow = total_w - max_total_w
-            label_w = max(max(min_label_w, absolute_min_label), label_w - overflow)
-            total_w = label_w + value_w
-
-        # if still too wide, squeeze value (rare unless doc width is tiny)
-        # But ensure value never gets too small to display the currency properly
-        if total_w > max_total_w:
-            overflow = total_w - max_total_w
-            # Ensure value column can still fit the widest currency string
-            min_value_absolute = widest_value + 15  # minimum to fit text + small margin
-            value_w = max(max(min_value_w, min_value_absolute), value_w - overflow)
-
-        return label_w, value_w
-
-    def add_pair_table(rows, label_w, value_w, line_above=False, total_row_index=None):
+        # ---------- Header (business side) ----------
+        self.business_lines = [(branding.business_name, self.style_title)] + [
+            (line, style_normal)
+            for line in (branding.business_address, branding.business_phone, branding.business_email)
+            if line
+        ]
+        self.header_style = TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ])
+
+        # ---------- Line-items table ----------
+        self.items_style = TableStyle([
+            # Header
+            ('BACKGROUND', (0, 0), (-1, 0), color_primary),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('TOPPADDING', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+
+            # Body
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('TOPPADDING', (0, 1), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
+            ('BACKGROUND', (0, 1), (-1, -1), color_row),
+
+            # Align
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+
+            # Grid
+            ('GRID', (0, 0), (-1, -1), 0.5, color_grid),
+
+            # Inner padding
+            ('LEFTPADDING', (0, 0), (-1, -1), 12),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+        ])
+
+        # Section subtotal tables have no lines; grand totals have a line above
+        # the first and the TOTAL row (whose index depends on whether there is tax)
+        self.subtotal_style = self._pair_style()
+        self.totals_styles = {index: self._pair_style(True, index) for index in (1, 2)}
+
+    def _pair_style(self, line_above: bool = False, total_row_index: Optional[int] = None) -> TableStyle:
         """
-        rows: list of tuples (label_paragraph, value_paragraph)
+        Style of a right-aligned 2-col mini-table.
         total_row_index: if provided, apply 'TOTAL' styling line/padding to that row
         """
-        t = Table(
-            [[lbl, val] for (lbl, val) in rows],
-            colWidths=[label_w, value_w],
-            hAlign='RIGHT'
-        )
-
         ts = [
             ('VALIGN', (0, 0), (-1, -1), 'TOP'),
             ('LEFTPADDING', (0, 0), (-1, -1), 0),
@@ -201,19 +223,275 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
         ]
 
         if line_above:
-            ts.append(('LINEABOVE', (0, 0), (-1, 0), 1, color_primary))
+            ts.append(('LINEABOVE', (0, 0), (-1, 0), 1, self.color_primary))
             ts.append(('TOPPADDING', (0, 0), (-1, 0), 10))
 
         if total_row_index is not None:
-            ts.append(('LINEABOVE', (0, total_row_index), (-1, total_row_index), 1, color_primary))
+            ts.append(('LINEABOVE', (0, total_row_index), (-1, total_row_index), 1, self.color_primary))
             ts.append(('TOPPADDING', (0, total_row_index), (-1, total_row_index), 10))
 
-        t.setStyle(TableStyle(ts))
+        return TableStyle(ts)
+
+
+@lru_cache(maxsize=256)
+def get_invoice_layout(branding: Branding) -> InvoiceLayout:
+    """The (cached) layout for a branding"""
+    return InvoiceLayout(branding)
+
+
+# ---------- Helpers ----------
+def safe_float(x) -> float:
+    try:
+        return float(x or 0)
+    except Exception:
+        return 0.0
+
+
+def format_currency(value) -> str:
+    try:
+        return f"${float(value):,.2f}"
+    except (ValueError, TypeError):
+        return "$0.00"
+
+
+def format_qty(qty) -> str:
+    try:
+        q = float(qty)
+        return str(int(q)) if q.is_integer() else str(q)
+    except Exception:
+        return "0"
+
+
+def format_date(date_val) -> str:
+    if not date_val:
+        return ""
+    if isinstance(date_val, str):
+        try:
+            dt = datetime.fromisoformat(date_val.replace('Z', '+00:00'))
+            # keep your screenshot style: 1/18/2026
+            return f"{dt.month}/{dt.day}/{dt.year}"
+        except Exception:
+            return date_val
+    if isinstance(date_val, datetime):
+        return f"{date_val.month}/{date_val.day}/{date_val.year}"
+    return str(date_val)
+
+
+@lru_cache(maxsize=1024)
+def compute_pair_col_widths(
+    max_label_text: str,
+    value_strings: tuple[str, ...],
+    font_label: str,
+    size_label: float,
+    font_value: str,
+    size_value: float,
+    min_label_w: float = 2.0 * inch,
+    min_value_w: float = 1.2 * inch,
+    pad_pts: float = 10.0,
+    max_total_w: float = CONTENT_WIDTH
+):
+    """
+    Compute (label_w, value_w) for a right-aligned 2-col mini-table.
+    We size the value column to the widest currency string + padding,
+    and guarantee a minimum label width so labels don't wrap/overlap.
+    """
+    # width in points - add extra safety margin for bold fonts and rendering
+    widest_value = 0.0
+    for s in (value_strings or ("$0.00",)):
+        # Add 10% safety margin for bold fonts and rendering variations
+        text_width = measure_text(s, font_value, size_value)
+        widest_value = max(widest_value, text_width * 1.1)
+
+    # Ensure value column has enough space with generous padding
+    needed_value_w = widest_value + 2 * pad_pts + 20  # extra 20pt safety margin
+    value_w = max(min_value_w, needed_value_w)
+
+    # label needs at least min_label_w; also consider actual label text width
+    # Add safety margin for bold fonts
+    label_text_w = measure_text(max_label_text, font_label, size_label) * 1.1 + 2 * pad_pts + 15
+    label_w = max(min_label_w, label_text_w)
+
+    total_w = label_w + value_w
+    if total_w > max_total_w:
+        # if too wide, squeeze label first (keep value width) but never below absolute minimum
+        # Use a more conservative absolute minimum to prevent overlap
+        absolute_min_label = measure_text(max_label_text, font_label, size_label) * 1.15 + 15
+        overflow = total_w - max_total_w
+        label_w = max(max(min_label_w, absolute_min_label), label_w - overflow)
+        total_w = label_w + value_w
+
+    # if still too wide, squeeze value (rare unless doc width is tiny)
+    # But ensure value never gets too small to display the currency properly
+    if total_w > max_total_w:
+        overflow = total_w - max_total_w
+        # Ensure value column can still fit the widest currency string
+        min_value_absolute = widest_value + 15  # minimum to fit text + small margin
+        value_w = max(max(min_value_w, min_value_absolute), value_w - overflow)
+
+    return label_w, value_w
+
+
+def items_table(items: list[Dict[str, Any]], layout: InvoiceLayout) -> Table:
+    """The 4-column line-items table (header row + one row per item)"""
+    data = [['Description', 'Quantity', 'Rate', 'Amount']]
+    for it in items:
+        qty = safe_float(it.get('quantity', 0))
+        rate = safe_float(it.get('rate', 0))
+        amt = qty * rate
+
+        data.append([
+            Paragraph(it.get('description', '') or '', layout.style_normal),
+            format_qty(qty),
+            Paragraph(format_currency(rate), layout.style_money),
+            Paragraph(format_currency(amt), layout.style_money),
+        ])
+
+    t = Table(data, colWidths=ITEMS_COL_WIDTHS, repeatRows=1)
+    t.setStyle(layout.items_style)
+    return t
+
+
+class LineItemsTable(Flowable):
+    """
+    Line-items table for the streaming mode.
+    Only the rows of the page being laid out become Paragraphs and a Table;
+    the rest stay plain line-item dicts until their page comes up. It splits
+    at the same row as items_table() would, so the pages come out identical.
+    """
+
+    def __init__(
+        self,
+        items: list[Dict[str, Any]],
+        layout: InvoiceLayout,
+        start: int = 0,
+        continued_from: Optional[Table] = None,
+        window: int = STREAM_WINDOW_ROWS
+    ):
+        super().__init__()
+        self.items = items
+        self.layout = layout
+        self.start = start
+        self.window = window
+        self._table: Optional[Table] = None
+        self._wrapped = None  # ((availWidth, availHeight), (width, height)) of the last wrap
+        # A split Table rewrites its grid and background commands for the part
+        # that continues on the next page; keep those (not the rows) so every
+        # window draws its lines exactly like the one big table would
+        self._continued = None
+        if continued_from is not None:
+            self._continued = (
+                len(continued_from._cellvalues) - 1,
+                continued_from._linecmds,
+                continued_from._bkgrndcmds,
+            )
+
+    def _window(self, rows: int) -> Table:
+        t = items_table(self.items[self.start:self.start + rows], self.layout)
+        if self._continued is not None:
+            old_last, linecmds, bkgrndcmds = self._continued
+            last = len(t._cellvalues) - 1
+
+            def resized(cmd):
+                (sc, sr), (ec, er) = cmd[1:3]
+                sr = last if sr == old_last else sr
+                er = last if er == old_last else er
+                return (cmd[0], (sc, sr), (ec, er)) + tuple(cmd[3:])
+
+            t._linecmds = [resized(cmd) for cmd in linecmds]
+            t._bkgrndcmds = [resized(cmd) for cmd in bkgrndcmds]
+        return t
+
+    def wrap(self, availWidth, availHeight):
+        # The frame wraps, then splits (which needs a wrap) for the same space:
+        # Table heights aren't memoized, so don't lay the window out twice
+        if self._wrapped is not None and self._wrapped[0] == (availWidth, availHeight):
+            return self._wrapped[1]
+        while True:
+            if self._table is None:
+                self._table = self._window(self.window)
+            width, height = self._table.wrap(availWidth, availHeight)
+            # Grow the window until at least two rows overflow the page (or it holds
+            # every remaining row): the split point is then the full table's, and the
+            # part carried over has a last row distinct from its first
+            if height - sum(self._table._rowHeights[-2:]) > availHeight or self.start + self.window >= len(self.items):
+                # Table.split measures every row again; pin the heights we just measured
+                # (Table.split does the same for the parts it returns)
+                self._table._argH = self._table._rowHeights
+                self._wrapped = ((availWidth, availHeight), (width, height))
+                return width, height
+            self.window *= 2
+            self._table = None
+
+    def split(self, availWidth, availHeight):
+        self.wrap(availWidth, availHeight)
+        parts = self._table.split(availWidth, availHeight)
+        if len(parts) < 2:
+            return parts
+        first, rest = parts
+        done = len(first._cellvalues) - 1  # minus the header row
+        rest = LineItemsTable(self.items, self.layout, self.start + done, continued_from=rest, window=done + 3)
+        return [first, rest]
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self._table.drawOn(canvas, x, y, _sW)
+
+
+def create_pdf_document(
+    invoice_data: Dict[str, Any],
+    user: Dict[str, Any],
+    client: Dict[str, Any],
+    output: Optional[BinaryIO] = None,
+    streaming: Optional[bool] = None
+) -> BinaryIO:
+    """
+    Render an invoice into ``output`` (a new BytesIO by default, or e.g. a
+    SpooledTemporaryFile or response stream) and returned, rewound if it is
+    seekable.
+
+    streaming: lay the line items out a page at a time instead of building
+    every row up front, which keeps memory flat for huge invoices. Defaults to
+    on for invoices with PDF_STREAM_MIN_ITEMS line items or more. The output
+    is the same either way.
+
+    Fix for "smushed/overlapping subtotal/total labels":
+    - NEVER place subtotal rows inside the 4-column line-items table.
+    - ReportLab does NOT clip overflow text in table cells, so long labels will paint into adjacent cells.
+    - Instead, render subtotals/totals as separate right-aligned 2-column mini-tables.
+    """
+    buffer = BytesIO() if output is None else output
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=PAGE_MARGIN,
+        leftMargin=PAGE_MARGIN,
+        topMargin=PAGE_MARGIN,
+        bottomMargin=PAGE_MARGIN
+    )
+
+    elements = []
+    layout = get_invoice_layout(Branding.from_user(user))
+    style_normal = layout.style_normal
+    style_right_meta = layout.style_right_meta
+    style_label_small = layout.style_label_small
+    style_pair_label = layout.style_pair_label
+    style_pair_value = layout.style_pair_value
+
+    def add_pair_table(rows, label_w, value_w, style):
+        """rows: list of tuples (label_paragraph, value_paragraph)"""
+        t = Table(
+            [[lbl, val] for (lbl, val) in rows],
+            colWidths=[label_w, value_w],
+            hAlign='RIGHT'
+        )
+        t.setStyle(style)
         elements.append(KeepTogether(t))
 
     # ---------- Normalize invoice ----------
     invoice = invoice_data.get('invoice', invoice_data)
     line_items = invoice.get('lineItems', []) or []
+    if streaming is None:
+        streaming = len(line_items) >= settings.PDF_STREAM_MIN_ITEMS
 
     # Split items (same heuristic as yours)
     services = [
@@ -242,18 +520,8 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
         tax = subtotal * 0.10  # demo tax
         final_total = subtotal + tax
 
-    # ---------- Column widths for items table ----------
-    # Keep your original proportions (fits nicely visually)
-    col_widths_items = [2.8 * inch, 0.8 * inch, 1.2 * inch, 1.7 * inch]
-
     # ---------- Header ----------
-    biz_info = [Paragraph(user.get('businessName', 'Invoice'), style_title)]
-    if user.get('businessAddress'):
-        biz_info.append(Paragraph(user['businessAddress'], style_normal))
-    if user.get('businessPhone'):
-        biz_info.append(Paragraph(user['businessPhone'], style_normal))
-    if user.get('businessEmail'):
-        biz_info.append(Paragraph(user['businessEmail'], style_normal))
+    biz_info = [Paragraph(text, style) for text, style in layout.business_lines]
 
     inv_info = []
     inv_num = invoice.get('invoiceNumber', 'N/A')
@@ -263,15 +531,11 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
     inv_info.append(Paragraph(f"Due Date: {format_date(invoice.get('dueDate'))}", style_right_meta))
 
     status = (invoice.get('status', 'draft') or 'draft').upper()
-    status_color_hex = "#ff0000" if status == "OVERDUE" else "#667eea"
+    status_color_hex = "#ff0000" if status == "OVERDUE" else layout.primary_hex
     inv_info.append(Paragraph(f'Status: <font color="{status_color_hex}"><b>{status}</b></font>', style_right_meta))
 
     header_table = Table([[biz_info, inv_info]], colWidths=[4 * inch, doc.width - 4 * inch])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    header_table.setStyle(layout.header_style)
     elements.append(header_table)
     elements.append(Spacer(1, 0.4 * inch))
 
@@ -299,54 +563,9 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
         if not items:
             return
 
-        elements.append(Paragraph(title, style_section))
-
-        data = [['Description', 'Quantity', 'Rate', 'Amount']]
-        for it in items:
-            qty = safe_float(it.get('quantity', 0))
-            rate = safe_float(it.get('rate', 0))
-            amt = qty * rate
-
-            data.append([
-                Paragraph(it.get('description', '') or '', style_normal),
-                format_qty(qty),
-                Paragraph(format_currency(rate), style_money),
-                Paragraph(format_currency(amt), style_money),
-            ])
-
-        t = Table(data, colWidths=col_widths_items, repeatRows=1)
-
-        t.setStyle(TableStyle([
-            # Header
-            ('BACKGROUND', (0, 0), (-1, 0), color_primary),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('TOPPADDING', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-
-            # Body
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f5f5f5')),
+        elements.append(Paragraph(title, layout.style_section))
 
-            # Align
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'CENTER'),
-            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-
-            # Grid
-            ('GRID', (0, 0), (-1, -1), 0.5, color_grid),
-
-            # Inner padding
-            ('LEFTPADDING', (0, 0), (-1, -1), 12),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-        ]))
-
-        elements.append(t)
+        elements.append(LineItemsTable(items, layout) if streaming else items_table(items, layout))
         elements.append(Spacer(1, 0.15 * inch))
 
         # ---- SECTION SUBTOTAL (separate 2-col table, right-aligned) ----
@@ -355,7 +574,7 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
 
         label_w, value_w = compute_pair_col_widths(
             max_label_text=label_text,
-            value_strings=[value_text],
+            value_strings=(value_text,),
             font_label='Helvetica-Bold', size_label=10,
             font_value='Helvetica-Bold', size_value=10,
             min_label_w=2.5 * inch,  # Increased to accommodate longer labels
@@ -369,7 +588,7 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
             rows=[(Paragraph(label_text, style_pair_label), Paragraph(value_text, style_pair_value))],
             label_w=label_w,
             value_w=value_w,
-            line_above=False
+            style=layout.subtotal_style
         )
 
         elements.append(Spacer(1, 0.25 * inch))
@@ -385,10 +604,10 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
     ]
     if tax > 0:
         total_rows.append(("Tax:", format_currency(tax), style_pair_label, style_pair_value))
-    total_rows.append(("TOTAL:", format_currency(final_total), style_total_label, style_total_value))
+    total_rows.append(("TOTAL:", format_currency(final_total), layout.style_total_label, layout.style_total_value))
 
     # widths based on the widest total currency string, with a compact right-aligned block
-    value_strings = [r[1] for r in total_rows]
+    value_strings = tuple(r[1] for r in total_rows)
     label_w, value_w = compute_pair_col_widths(
         max_label_text="TOTAL:",  # Use "TOTAL:" as it's the longest label
         value_strings=value_strings,
@@ -411,36 +630,28 @@ def create_pdf_document(invoice_data: Dict[str, Any], user: Dict[str, Any], clie
         rows=rows_for_table,
         label_w=label_w,
         value_w=value_w,
-        line_above=True,
-        total_row_index=total_row_index
+        style=layout.totals_styles[total_row_index]
     )
 
     # ---------- Footer ----------
     elements.append(Spacer(1, 0.5 * inch))
-    elements.append(Paragraph(
-        "Thank you for your business!",
-        ParagraphStyle(
-            'Footer', parent=style_normal,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Oblique',
-            textColor=color_light
-        )
-    ))
-    elements.append(Paragraph(
-        "Generated by BAb the Builder",
-        ParagraphStyle(
-            'Footer2', parent=style_normal,
-            alignment=TA_CENTER,
-            fontSize=9,
-            textColor=color_light
-        )
-    ))
+    elements.append(Paragraph("Thank you for your business!", layout.style_footer))
+    elements.append(Paragraph("Generated by BAb the Builder", layout.style_footer2))
 
     doc.build(elements)
-    buffer.seek(0)
+    # A response stream or archive sink can't be rewound (and needn't be)
+    seekable = getattr(buffer, "seekable", None)
+    if output is None or (seekable is not None and seekable()):
+        buffer.seek(0)
     return buffer
 
 
-def generate_pdf_base64(invoice_data: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any]) -> str:
-    pdf_buffer = create_pdf_document(invoice_data, user, client)
-    return base64.b64encode(pdf_buffer.read()).decode('utf-8')
+def create_pdf_bytes(
+    invoice: Dict[str, Any],
+    user: Dict[str, Any],
+    client: Dict[str, Any],
+    streaming: Optional[bool] = None
+) -> bytes:
+    """Render an invoice PDF to bytes (top-level so it can run in a worker process)"""
+    return create_pdf_document({"invoice": invoice}, user, client, streaming=streaming).getvalue()
+
@@ -0,0 +1,163 @@
+"""
+Invoice PDF rendering off the event loop.
+
+ReportLab is CPU-bound pure Python, so renders run in a process pool of
+PDF_WORKERS processes (a thread would still hold the GIL and stall every
+other request). At most PDF_WORKERS renders are handed to the pool at once;
+further requests wait their turn here, which is what the queue metrics in
+GET /health/pdf measure. Identical concurrent requests share one render,
+which runs to completion even if the request that started it goes away, and
+finished PDFs go through pdf_cache, so a repeat send never renders at all.
+
+With PDF_WORKERS=0 renders run in a thread instead (handy in development).
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from .config import settings
+from .pdf_cache import pdf_cache, pdf_cache_key
+from .pdf_generator import create_pdf_bytes
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_workers = 0
+_slots: Optional[asyncio.Semaphore] = None
+_inflight: Dict[str, asyncio.Task] = {}
+_stats = {
+    "rendered": 0,
+    "failed": 0,
+    "shared": 0,
+    "queued": 0,
+    "rendering": 0,
+    "max_queued": 0,
+    "wait_ms": 0.0,
+    "render_ms": 0.0,
+}
+
+
+def start_pdf_renderer(workers: Optional[int] = None) -> None:
+    """Start the render process pool (call from app startup)"""
+    global _executor, _slots, _workers
+    if _slots is not None:
+        return
+    workers = settings.PDF_WORKERS if workers is None else workers
+    _workers = workers
+    if workers > 0:
+        # spawn, not fork: the parent runs threads (Motor, SMTP sends) that fork would copy mid-flight
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    _slots = asyncio.Semaphore(max(workers, 1))
+    logger.info(f"PDF renderer: {workers or 'no'} worker process(es)")
+
+
+def stop_pdf_renderer() -> None:
+    """Shut the process pool down (call from app shutdown)"""
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _slots = None
+
+
+async def _render(invoice: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any]) -> bytes:
+    if _slots is None:
+        start_pdf_renderer()
+
+    queued_at = time.perf_counter()
+    _stats["queued"] += 1
+    _stats["max_queued"] = max(_stats["max_queued"], _stats["queued"])
+    try:
+        await _slots.acquire()
+    finally:
+        _stats["queued"] -= 1
+
+    started = time.perf_counter()
+    _stats["wait_ms"] += (started - queued_at) * 1000
+    _stats["rendering"] += 1
+    try:
+        if _executor is not None:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(_executor, create_pdf_bytes, invoice, user, client)
+        else:
+            data = await asyncio.to_thread(create_pdf_bytes, invoice, user, client)
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["rendering"] -= 1
+        _slots.release()
+
+    _stats["rendered"] += 1
+    _stats["render_ms"] += (time.perf_counter() - started) * 1000
+    return data
+
+
+async def _render_and_cache(
+    invoice: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any], key: str
+) -> bytes:
+    data = await _render(invoice, user, client)
+    invoice_id = invoice.get("_id", "unsaved")
+    try:
+        await asyncio.to_thread(pdf_cache.put, invoice_id, key, data)
+    except OSError as e:
+        # A full or read-only disk only costs us the cache
+        logger.warning(f"Could not cache PDF for invoice {invoice_id}: {e}")
+    return data
+
+
+def _render_done(key: str, task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        # Every caller may have gone away; don't let the task log "exception never retrieved"
+        task.exception()
+
+
+async def render_invoice_pdf(invoice: Dict[str, Any], user: Dict[str, Any], client: Dict[str, Any]) -> bytes:
+    """The invoice's PDF: from the cache, or rendered in the pool and cached"""
+    key = pdf_cache_key(invoice, user, client)
+
+    data = await asyncio.to_thread(pdf_cache.get, invoice.get("_id", "unsaved"), key)
+    if data is not None:
+        return data
+
+    # The render is a task of its own that every caller waits on (the one that
+    # started it included), so a caller that is cancelled stops waiting without
+    # cancelling the render for the others
+    task = _inflight.get(key)
+    if task is not None:
+        _stats["shared"] += 1
+    else:
+        task = asyncio.ensure_future(_render_and_cache(invoice, user, client, key))
+        _inflight[key] = task
+        task.add_done_callback(functools.partial(_render_done, key))
+    return await asyncio.shield(task)
+
+
+def invoice_pdf_filename(invoice: Dict[str, Any]) -> str:
+    """e.g. Invoice-1042.pdf, kept to plain ASCII whatever the invoice number contains"""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", f"Invoice-{invoice.get('invoiceNumber') or invoice.get('_id')}.pdf")
+
+
+def renderer_stats() -> Dict[str, Any]:
+    """Queue and timing counters for the health endpoint"""
+    done = _stats["rendered"]
+    started = done + _stats["failed"] + _stats["rendering"]
+    return {
+        "workers": _workers,
+        "rendered": done,
+        "failed": _stats["failed"],
+        "shared": _stats["shared"],
+        "queued": _stats["queued"],
+        "rendering": _stats["rendering"],
+        "max_queued": _stats["max_queued"],
+        "avg_wait_ms": round(_stats["wait_ms"] / started, 2) if started else None,
+        "avg_render_ms": round(_stats["render_ms"] / done, 2) if done else None,
+    }
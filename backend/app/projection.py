@@ -0,0 +1,57 @@
+"""
+Sparse fieldsets: ``?fields=invoiceNumber,status,total``.
+
+The requested fields are checked against the response model and turned into
+a MongoDB projection, so only those fields are read from the database,
+serialized and sent. ``_id`` and the list's sort key are always included
+(the client needs the first, the next-page cursor is built from both).
+"""
+
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+
+@lru_cache(maxsize=None)
+def _field_keys(model: Type[BaseModel]) -> Dict[str, str]:
+    """Map every accepted field name (attribute name or alias) to its document key"""
+    keys: Dict[str, str] = {}
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        keys[name] = key
+        keys[key] = key
+    return keys
+
+
+def select_fields(
+    fields: Optional[str],
+    model: Type[BaseModel],
+    sort_field: Optional[str] = None
+) -> Optional[FrozenSet[str]]:
+    """Parse a ``fields`` query parameter into the document keys to return (None = all)"""
+    if not fields:
+        return None
+
+    known = _field_keys(model)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in known]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s) for {model.__name__}: {', '.join(unknown)}"
+        )
+
+    selected = {known[name] for name in requested}
+    selected.add("_id")
+    if sort_field:
+        selected.add(sort_field)
+    return frozenset(selected)
+
+
+def to_projection(selected: Optional[FrozenSet[str]]) -> Optional[Dict[str, int]]:
+    """MongoDB projection for the keys returned by select_fields()"""
+    if selected is None:
+        return None
+    return {key: 1 for key in sorted(selected)}
@@ -0,0 +1,54 @@
+"""
+Batched lookups for the relationship endpoints.
+
+Instead of one find_one per document to pull in e.g. the client's name, all
+referenced documents are fetched with a single ``$in`` query per related
+collection and joined in memory. Per-document counts of related documents
+are likewise computed with one ``$group`` per collection.
+"""
+
+from typing import Any, Dict, List
+
+from .object_ids import coerce_reference
+
+
+async def attach_related(
+    docs: List[Dict[str, Any]],
+    ref_field: str,
+    collection,
+    fields: Dict[str, str]
+) -> List[Dict[str, Any]]:
+    """
+    For every document whose ``ref_field`` points to an existing document in
+    ``collection``, copy ``fields`` ({target key: related field}) from it.
+    Documents without a match are left untouched. Updates ``docs`` in place.
+    Legacy references stored as hex strings match like ObjectIds.
+    """
+    refs = [coerce_reference(doc.get(ref_field)) for doc in docs]
+    ids = {ref for ref in refs if ref}
+    if not ids:
+        return docs
+
+    projection = {source: 1 for source in fields.values()}
+    related = {
+        other["_id"]: other
+        async for other in collection.find({"_id": {"$in": list(ids)}}, projection)
+    }
+
+    for doc, ref in zip(docs, refs):
+        other = related.get(ref) if ref else None
+        if other:
+            for key, source in fields.items():
+                doc[key] = other.get(source)
+    return docs
+
+
+async def count_by(collection, field: str, ids: List[Any]) -> Dict[Any, int]:
+    """Number of documents in ``collection`` per value of ``field``, for ``ids`` only"""
+    if not ids:
+        return {}
+    pipeline = [
+        {"$match": {field: {"$in": ids}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+    ]
+    return {row["_id"]: row["count"] async for row in collection.aggregate(pipeline)}
@@ -1,8 +1,7 @@
+import asyncio
 import os
 from app.routes.invoices import create_invoice
 from app.routes.jobs import create_job
-import duckdb
-import pandas as pd
 import requests
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from pydantic import BaseModel
@@ -10,6 +9,8 @@ from app.api.dependencies import verify_token
 from app.database import get_database
 from bson import ObjectId
 from app.models import InvoiceCreate, JobCreate
+from app.dates import parse_date_lenient
+from app.sql_snapshots import is_read_only, sql_snapshots
 from datetime import datetime
 import time
 import json
@@ -19,43 +20,26 @@ router = APIRouter(prefix="/agent", tags=["agent"])
 
 # This 'tricks' older libraries into finding what they ne
 
-def run_sql_analysis(user_id: str, sql_query: str):
+async def run_sql_analysis(user_id: str, sql_query: str):
     """
     Executes a SQL query on the user's data using DuckDB.
+    The user's tables come from a cached snapshot that is reloaded only when
+    their data changed (see sql_snapshots).
     """
 
     db = get_database()
-    user_id = db.users.find_one({"auth0_id": user_id})["_id"]
-    user_id = ObjectId(user_id)
-    clients = list(db.clients.find({"userId": user_id}))
-    expenses = list(db.expenses.find({"userId": user_id}))
-    invoices = list(db.invoices.find({"userId": user_id}))
-    jobs = list(db.jobs.find({"userId": user_id}))
-    profile = db.users.find_one({"_id": user_id})
-
-
-    df_clients = pd.DataFrame(clients)
-    df_expenses = pd.DataFrame(expenses)
-    df_invoices = pd.DataFrame(invoices)
-    df_jobs = pd.DataFrame(jobs)
-    df_profile = pd.DataFrame([profile])
-
-    con = duckdb.connect(database=':memory:')
-    
-    con.register('clients', df_clients)
-    con.register('expenses', df_expenses)
-    con.register('invoices', df_invoices)
-    con.register('jobs', df_jobs)
-    con.register('profile', df_profile)
+    profile = await db.users.find_one({"auth0_id": user_id})
+    user_id = ObjectId(profile["_id"])
+
+    # The snapshot is reused by later queries, so it must never be modified
+    if not is_read_only(sql_query):
+        return "Safety Violation: Only read-only SELECT queries are allowed."
 
     try:
-        if "drop" in sql_query.lower() or "delete" in sql_query.lower():
-            return "Safety Violation: Cannot delete data."
-            
-        result = con.execute(sql_query).df()
-        data_as_list = result.to_dict(orient='records')
-        return data_as_list
-        
+        snapshot = await sql_snapshots.get(db, user_id)
+        # DuckDB blocks; keep it off the event loop
+        return await asyncio.to_thread(snapshot.query, sql_query, profile)
+
     except Exception as e:
         return f"SQL Error: {str(e)}"
 
@@ -106,7 +90,7 @@ class AgentRequest(BaseModel):
 async def chat_with_gumloop_orchestrator(req: AgentRequest, token: dict = Depends(verify_token)):
     user_id = token.get("sub")
     db = get_database()
-    user_id_db = db.users.find_one({"auth0_id": user_id})["_id"]
+    user_id_db = (await db.users.find_one({"auth0_id": user_id}))["_id"]
     user_id_db = str(user_id_db)
     # 1. Send user message to Gumloop
     gumloop_response = trigger_gumloop_agent(req.message)
@@ -121,7 +105,7 @@ async def chat_with_gumloop_orchestrator(req: AgentRequest, token: dict = Depend
         sql_query = response.get("query")
         
         # Run it locally on your DuckDB/Mongo
-        data_result = run_sql_analysis(user_id, sql_query)
+        data_result = await run_sql_analysis(user_id, sql_query)
         # Send the data back to Gumloop for the final "interpretation"
         final_answer = trigger_gumloop_agent(f"USE THE APP NAVIGATION ROUTE FOR THIS: {req.message} was asked which generated this query: {sql_query} which had this result: {data_result}")
         response = json.loads(final_answer)
@@ -131,8 +115,8 @@ async def chat_with_gumloop_orchestrator(req: AgentRequest, token: dict = Depend
                                     invoiceDescription=response.get("invoiceDescription"), 
                                     status="draft",
                                     total=response.get("total"),
-                                    dueDate=response.get("dueDate"),
-                                    issueDate=response.get("issueDate"),
+                                    dueDate=parse_date_lenient(response.get("dueDate")),
+                                    issueDate=parse_date_lenient(response.get("issueDate")),
                                     lineItems=response.get("lineItems"),
                                     userId=ObjectId(user_id_db))
         await create_invoice(invoice=new_invoice)
@@ -1,47 +1,32 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
 from typing import List, Dict, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 
 from ..models import Client, ClientCreate, ClientUpdate, MessageResponse
 from ..database import get_database
+from ..user_stats import record_change
+from ..object_ids import to_object_id, normalize_references
+from ..pagination import paginate, cursor_headers
+from ..streaming import stream_find, wants_stream
+from ..projection import select_fields, to_projection
+from ..serialization import document_response
+from ..relations import attach_related
+from ..summaries import status_totals, count, amount
 
 router = APIRouter(prefix="/clients", tags=["clients"])
 
-def convert_objectid_to_str(doc):
-    """Convert ObjectId fields to strings for JSON serialization"""
-    if doc is None:
-        return None
-    if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = convert_objectid_to_str(value)
-            elif isinstance(value, list):
-                result[key] = [convert_objectid_to_str(item) for item in value]
-            else:
-                result[key] = value
-        return result
-    return doc
-
 @router.post("/", response_model=Client, status_code=status.HTTP_201_CREATED)
 async def create_client(client: ClientCreate):
     """Create a new client"""
     db = get_database()
     
     # Validate user ID format
-    if not ObjectId.is_valid(client.userId):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user ID format"
-        )
+    user_id = to_object_id(client.userId, "user")
     
-    # Verify user exists (MongoDB will handle ObjectId conversion)
-    user = db.users.find_one({"_id": ObjectId(client.userId)})
+    # Verify user exists
+    user = await db.users.find_one({"_id": user_id})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -50,32 +35,32 @@ async def create_client(client: ClientCreate):
     
     # Insert client
     client_dict = client.model_dump(exclude_unset=True)
-    # Convert userId to ObjectId
-    if client_dict.get("userId"):
-        client_dict["userId"] = ObjectId(client_dict["userId"])
-    result = db.clients.insert_one(client_dict)
-    
-    # Return created client - convert ObjectId fields to strings for response
-    created_client = db.clients.find_one({"_id": result.inserted_id})
-    if created_client:
-        created_client = convert_objectid_to_str(created_client)
-    return created_client
+    # Store references as ObjectId
+    normalize_references(client_dict, "clients")
+    result = await db.clients.insert_one(client_dict)
+    await record_change(db, "clients", after=client_dict)
+    
+    # Return created client
+    created_client = await db.clients.find_one({"_id": result.inserted_id})
+    return document_response(created_client, Client, status_code=status.HTTP_201_CREATED)
 
 @router.get("/", response_model=List[Client])
-async def get_clients(user_id: str = None, archived: bool = None, skip: int = 0, limit: int = 100):
-    """Get all clients, optionally filtered by user_id and archived status"""
+async def get_clients(
+    request: Request,
+    user_id: str = None,
+    archived: bool = None,
+    cursor: str = None,
+    skip: int = 0,
+    limit: int = 100,
+    stream: bool = False,
+    fields: str = None
+):
+    """Get all clients, optionally filtered by user_id and archived status (cursor-paginated)"""
     db = get_database()
     
     query = {}
     if user_id:
-        # Convert user_id string to ObjectId for query
-        if ObjectId.is_valid(user_id):
-            query["userId"] = ObjectId(user_id)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
+        query["userId"] = to_object_id(user_id, "user")
     
     # Filter by archived status if provided
     # If archived is None, return all clients (no filter)
@@ -91,13 +76,15 @@ async def get_clients(user_id: str = None, archived: bool = None, skip: int = 0,
                 {"archived": {"$exists": False}}
             ]
     
-    clients = list(db.clients.find(query).skip(skip).limit(limit))
-    # Convert ObjectId fields to strings for response
-    clients = [convert_objectid_to_str(client) for client in clients]
-    return clients
+    selected = select_fields(fields, Client)
+    if wants_stream(request, stream):
+        return stream_find(request, db.clients, query, cursor=cursor, model=Client, fields=selected)
+    
+    clients, next_cursor = await paginate(db.clients, query, limit=limit, cursor=cursor, skip=skip, projection=to_projection(selected))
+    return document_response(clients, Client, headers=cursor_headers(next_cursor), fields=selected)
 
 @router.get("/{client_id}", response_model=Client)
-async def get_client(client_id: str):
+async def get_client(client_id: str, fields: str = None):
     """Get a specific client by ID"""
     db = get_database()
     
@@ -107,16 +94,15 @@ async def get_client(client_id: str):
             detail="Invalid client ID format"
         )
     
-    client = db.clients.find_one({"_id": ObjectId(client_id)})
+    selected = select_fields(fields, Client)
+    client = await db.clients.find_one({"_id": ObjectId(client_id)}, to_projection(selected))
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Client not found"
         )
     
-    # Convert ObjectId fields to strings for response
-    client = convert_objectid_to_str(client)
-    return client
+    return document_response(client, Client, fields=selected)
 
 @router.put("/{client_id}", response_model=Client)
 async def update_client(client_id: str, client_update: ClientUpdate):
@@ -137,31 +123,27 @@ async def update_client(client_id: str, client_update: ClientUpdate):
             detail="No fields to update"
         )
     
-    # Convert userId to ObjectId if present in update data
-    if update_data.get("userId"):
-        if ObjectId.is_valid(update_data["userId"]):
-            update_data["userId"] = ObjectId(update_data["userId"])
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
+    # Store references as ObjectId
+    normalize_references(update_data, "clients")
     
-    result = db.clients.update_one(
+    # The previous version is needed to adjust the owner's summary stats
+    previous_client = await db.clients.find_one_and_update(
         {"_id": ObjectId(client_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous_client is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Client not found"
         )
     
-    updated_client = db.clients.find_one({"_id": ObjectId(client_id)})
-    if updated_client:
-        updated_client = convert_objectid_to_str(updated_client)
-    return updated_client
+    # The write replaced whole top-level fields, so the new version follows from the old
+    # one; re-reading it could pick up a concurrent write and miscount the stats
+    updated_client = {**previous_client, **update_data}
+    await record_change(db, "clients", previous_client, updated_client)
+    return document_response(updated_client, Client)
 
 @router.delete("/{client_id}", response_model=MessageResponse)
 async def delete_client(client_id: str):
@@ -174,14 +156,16 @@ async def delete_client(client_id: str):
             detail="Invalid client ID format"
         )
     
-    result = db.clients.delete_one({"_id": ObjectId(client_id)})
+    deleted_client = await db.clients.find_one_and_delete({"_id": ObjectId(client_id)})
     
-    if result.deleted_count == 0:
+    if deleted_client is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Client not found"
         )
     
+    await record_change(db, "clients", before=deleted_client)
+    
     return {"message": f"Client {client_id} deleted successfully"}
 
 # ===== RELATIONSHIP ENDPOINTS =====
@@ -198,7 +182,7 @@ async def get_client_jobs(client_id: str, status_filter: str = None):
         )
     
     # Verify client exists
-    client = db.clients.find_one({"_id": ObjectId(client_id)})
+    client = await db.clients.find_one({"_id": ObjectId(client_id)})
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -206,23 +190,20 @@ async def get_client_jobs(client_id: str, status_filter: str = None):
         )
     
     # Build query
-    query = {"clientId": client_id}
+    query = {"clientId": client["_id"]}
     if status_filter:
         query["status"] = status_filter
     
     # Get jobs
-    jobs = list(db.jobs.find(query))
+    jobs = await db.jobs.find(query).to_list(length=None)
     
     # Add invoice info if exists
-    for job in jobs:
-        if job.get("invoiceId"):
-            # invoiceId is already ObjectId, use it directly
-            invoice = db.invoices.find_one({"_id": job["invoiceId"]})
-            if invoice:
-                job["invoiceNumber"] = invoice.get("invoiceNumber")
-                job["invoiceStatus"] = invoice.get("status")
-    
-    return jobs
+    await attach_related(jobs, "invoiceId", db.invoices, {
+        "invoiceNumber": "invoiceNumber",
+        "invoiceStatus": "status"
+    })
+    
+    return document_response(jobs)
 
 @router.get("/{client_id}/invoices", response_model=List[Dict[str, Any]])
 async def get_client_invoices(client_id: str, status_filter: str = None):
@@ -236,7 +217,7 @@ async def get_client_invoices(client_id: str, status_filter: str = None):
         )
     
     # Verify client exists
-    client = db.clients.find_one({"_id": ObjectId(client_id)})
+    client = await db.clients.find_one({"_id": ObjectId(client_id)})
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -244,21 +225,19 @@ async def get_client_invoices(client_id: str, status_filter: str = None):
         )
     
     # Build query
-    query = {"clientId": client_id}
+    query = {"clientId": client["_id"]}
     if status_filter:
         query["status"] = status_filter
     
     # Get invoices and add job info
-    invoices = list(db.invoices.find(query))
+    invoices = await db.invoices.find(query).to_list(length=None)
     
-    for invoice in invoices:
-        if invoice.get("jobId"):
-            job = db.jobs.find_one({"_id": ObjectId(invoice["jobId"])})
-            if job:
-                invoice["jobTitle"] = job.get("title")
-                invoice["jobLocation"] = job.get("location")
+    await attach_related(invoices, "jobId", db.jobs, {
+        "jobTitle": "title",
+        "jobLocation": "location"
+    })
     
-    return invoices
+    return document_response(invoices)
 
 @router.get("/{client_id}/summary")
 async def get_client_summary(client_id: str):
@@ -272,7 +251,7 @@ async def get_client_summary(client_id: str):
         )
     
     # Get client
-    client = db.clients.find_one({"_id": ObjectId(client_id)})
+    client = await db.clients.find_one({"_id": ObjectId(client_id)})
     if not client:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -282,27 +261,16 @@ async def get_client_summary(client_id: str):
     # Get user info
     user_info = None
     if client.get("userId"):
-        user = db.users.find_one({"_id": ObjectId(client["userId"])})
+        user = await db.users.find_one({"_id": client["userId"]})
         if user:
             user_info = {
                 "businessName": user.get("businessName"),
                 "businessEmail": user.get("businessEmail")
             }
     
-    # Count related documents
-    job_count = db.jobs.count_documents({"clientId": client_id})
-    invoice_count = db.invoices.count_documents({"clientId": client_id})
-    
-    # Get job status breakdown
-    jobs_pending = db.jobs.count_documents({"clientId": client_id, "status": "pending"})
-    jobs_in_progress = db.jobs.count_documents({"clientId": client_id, "status": "in_progress"})
-    jobs_completed = db.jobs.count_documents({"clientId": client_id, "status": "completed"})
-    
-    # Calculate total billed
-    client_invoices = list(db.invoices.find({"clientId": client_id}))
-    total_billed = sum(inv.get("total", 0) for inv in client_invoices)
-    total_paid = sum(inv.get("total", 0) for inv in client_invoices if inv.get("status") == "paid")
-    total_outstanding = sum(inv.get("total", 0) for inv in client_invoices if inv.get("status") in ["sent", "overdue"])
+    # Count jobs and invoices by status and sum invoice totals in one aggregation
+    totals = await status_totals(db, {"clientId": client["_id"]}, ["jobs", "invoices"])
+    jobs, invoices = totals["jobs"], totals["invoices"]
     
     return {
         "client": {
@@ -313,18 +281,18 @@ async def get_client_summary(client_id: str):
         },
         "user": user_info,
         "counts": {
-            "jobs": job_count,
-            "invoices": invoice_count
+            "jobs": count(jobs),
+            "invoices": count(invoices)
         },
         "jobs": {
-            "pending": jobs_pending,
-            "inProgress": jobs_in_progress,
-            "completed": jobs_completed
+            "pending": count(jobs, "pending"),
+            "inProgress": count(jobs, "in_progress"),
+            "completed": count(jobs, "completed")
         },
         "financials": {
-            "totalBilled": total_billed,
-            "totalPaid": total_paid,
-            "outstanding": total_outstanding
+            "totalBilled": amount(invoices),
+            "totalPaid": amount(invoices, "paid"),
+            "outstanding": amount(invoices, "sent", "overdue")
         }
     }
 
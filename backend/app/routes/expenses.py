@@ -1,92 +1,75 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
 from typing import List
 from bson import ObjectId
+from pymongo import DESCENDING, ReturnDocument
 from datetime import datetime
 
 from ..models import Expense, ExpenseCreate, ExpenseUpdate, MessageResponse
 from ..database import get_database
+from ..user_stats import record_change, get_user_stats, stat
+from ..object_ids import to_object_id, normalize_references
+from ..pagination import paginate, cursor_headers
+from ..streaming import stream_find, wants_stream
+from ..projection import select_fields, to_projection
+from ..serialization import document_response
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
-def serialize_expense(expense_doc):
-    """Convert ObjectId fields to strings for JSON response"""
-    if expense_doc is None:
-        return None
-    
-    # Convert ObjectId fields to strings
-    if "_id" in expense_doc and isinstance(expense_doc["_id"], ObjectId):
-        expense_doc["_id"] = str(expense_doc["_id"])
-    if "userId" in expense_doc and isinstance(expense_doc["userId"], ObjectId):
-        expense_doc["userId"] = str(expense_doc["userId"])
-    if "jobId" in expense_doc and isinstance(expense_doc["jobId"], ObjectId):
-        expense_doc["jobId"] = str(expense_doc["jobId"])
-    
-    return expense_doc
-
 @router.post("/", response_model=Expense, status_code=status.HTTP_201_CREATED)
 async def create_expense(expense: ExpenseCreate):
     """Create a new expense (from receipt scan)"""
     db = get_database()
     
-    # Validate user ID
-    if not ObjectId.is_valid(expense.userId):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user ID format"
-        )
-    
-    # Validate job ID if provided
-    if expense.jobId and not ObjectId.is_valid(expense.jobId):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid job ID format"
-        )
-    
     # Prepare expense data
     expense_dict = expense.model_dump(exclude_unset=True)
     expense_dict["createdAt"] = datetime.utcnow()
     
-    # Convert userId to ObjectId for storage
-    expense_dict["userId"] = ObjectId(expense.userId)
-    
-    # Convert jobId to ObjectId if provided
-    if expense.jobId:
-        expense_dict["jobId"] = ObjectId(expense.jobId)
+    # Validate and convert userId/jobId to ObjectId for storage
+    expense_dict["userId"] = to_object_id(expense.userId, "user")
+    normalize_references(expense_dict, "expenses")
     
     # Insert expense
-    result = db.expenses.insert_one(expense_dict)
+    result = await db.expenses.insert_one(expense_dict)
+    await record_change(db, "expenses", after=expense_dict)
     
     # Return created expense
-    created_expense = db.expenses.find_one({"_id": result.inserted_id})
-    return serialize_expense(created_expense)
+    created_expense = await db.expenses.find_one({"_id": result.inserted_id})
+    return document_response(created_expense, Expense, status_code=status.HTTP_201_CREATED)
 
 @router.get("/", response_model=List[Expense])
 async def get_expenses(
+    request: Request,
     user_id: str = None,
     job_id: str = None,
+    cursor: str = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    stream: bool = False,
+    fields: str = None
 ):
-    """Get all expenses with optional filters"""
+    """Get all expenses with optional filters, newest first (cursor-paginated)"""
     db = get_database()
     
     query = {}
     if user_id:
-        if ObjectId.is_valid(user_id):
-            query["userId"] = ObjectId(user_id)
-        else:
-            query["userId"] = user_id
+        query["userId"] = to_object_id(user_id, "user")
     if job_id:
-        if ObjectId.is_valid(job_id):
-            query["jobId"] = ObjectId(job_id)
-        else:
-            query["jobId"] = job_id
+        query["jobId"] = to_object_id(job_id, "job")
+    
+    selected = select_fields(fields, Expense, "date")
+    if wants_stream(request, stream):
+        return stream_find(request, db.expenses, query, cursor=cursor, sort_field="date", direction=DESCENDING, model=Expense, fields=selected)
     
-    expenses = list(db.expenses.find(query).sort("date", -1).skip(skip).limit(limit))
-    return [serialize_expense(exp) for exp in expenses]
+    expenses, next_cursor = await paginate(
+        db.expenses, query,
+        limit=limit, cursor=cursor, skip=skip,
+        sort_field="date", direction=DESCENDING,
+        projection=to_projection(selected)
+    )
+    return document_response(expenses, Expense, headers=cursor_headers(next_cursor), fields=selected)
 
 @router.get("/{expense_id}", response_model=Expense)
-async def get_expense(expense_id: str):
+async def get_expense(expense_id: str, fields: str = None):
     """Get a specific expense by ID"""
     db = get_database()
     
@@ -96,14 +79,15 @@ async def get_expense(expense_id: str):
             detail="Invalid expense ID format"
         )
     
-    expense = db.expenses.find_one({"_id": ObjectId(expense_id)})
+    selected = select_fields(fields, Expense)
+    expense = await db.expenses.find_one({"_id": ObjectId(expense_id)}, to_projection(selected))
     if not expense:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Expense not found"
         )
     
-    return serialize_expense(expense)
+    return document_response(expense, Expense, fields=selected)
 
 @router.put("/{expense_id}", response_model=Expense)
 async def update_expense(expense_id: str, expense_update: ExpenseUpdate):
@@ -125,24 +109,26 @@ async def update_expense(expense_id: str, expense_update: ExpenseUpdate):
         )
     
     # Convert IDs to ObjectId if present
-    if "userId" in update_data and update_data["userId"]:
-        update_data["userId"] = ObjectId(update_data["userId"])
-    if "jobId" in update_data and update_data["jobId"]:
-        update_data["jobId"] = ObjectId(update_data["jobId"])
+    normalize_references(update_data, "expenses")
     
-    result = db.expenses.update_one(
+    # The previous version is needed to adjust the owner's summary stats
+    previous_expense = await db.expenses.find_one_and_update(
         {"_id": ObjectId(expense_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous_expense is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Expense not found"
         )
     
-    updated_expense = db.expenses.find_one({"_id": ObjectId(expense_id)})
-    return serialize_expense(updated_expense)
+    # The write replaced whole top-level fields, so the new version follows from the old
+    # one; re-reading it could pick up a concurrent write and miscount the stats
+    updated_expense = {**previous_expense, **update_data}
+    await record_change(db, "expenses", previous_expense, updated_expense)
+    return document_response(updated_expense, Expense)
 
 @router.delete("/{expense_id}", response_model=MessageResponse)
 async def delete_expense(expense_id: str):
@@ -155,21 +141,23 @@ async def delete_expense(expense_id: str):
             detail="Invalid expense ID format"
         )
     
-    result = db.expenses.delete_one({"_id": ObjectId(expense_id)})
+    deleted_expense = await db.expenses.find_one_and_delete({"_id": ObjectId(expense_id)})
     
-    if result.deleted_count == 0:
+    if deleted_expense is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Expense not found"
         )
     
+    await record_change(db, "expenses", before=deleted_expense)
+    
     return {"message": f"Expense {expense_id} deleted successfully"}
 
 # ===== SUMMARY ENDPOINTS =====
 
 @router.get("/summary/by-user/{user_id}")
-async def get_expense_summary(user_id: str):
-    """Get expense summary for a user"""
+async def get_expense_summary(user_id: str, include_expenses: bool = True):
+    """Get expense summary for a user (pass include_expenses=false for the totals only)"""
     db = get_database()
     
     if not ObjectId.is_valid(user_id):
@@ -178,17 +166,16 @@ async def get_expense_summary(user_id: str):
             detail="Invalid user ID format"
         )
     
-    # Get all expenses for user
-    expenses = list(db.expenses.find({"userId": ObjectId(user_id)}))
+    # Totals are maintained incrementally in user_stats
+    stats = await get_user_stats(db, ObjectId(user_id))
     
-    total_expenses = sum(exp.get("totalAmount", 0) for exp in expenses)
-    total_tax = sum(exp.get("taxAmount", 0) for exp in expenses)
-    expense_count = len(expenses)
-    
-    return {
+    summary = {
         "userId": user_id,
-        "totalExpenses": total_expenses,
-        "totalTax": total_tax,
-        "expenseCount": expense_count,
-        "expenses": [serialize_expense(exp) for exp in expenses]
+        "totalExpenses": stat(stats, "expenses.total"),
+        "totalTax": stat(stats, "expenses.tax"),
+        "expenseCount": stat(stats, "expenses.count")
     }
+    if include_expenses:
+        summary["expenses"] = await db.expenses.find({"userId": ObjectId(user_id)}).to_list(length=None)
+    
+    return document_response(summary)
@@ -1,135 +1,26 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, Response, status
 from typing import List, Dict, Any
 from bson import ObjectId
-from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
 
-from ..models import Invoice, InvoiceCreate, InvoiceUpdate, MessageResponse
+from ..models import Invoice, InvoiceCreate, InvoiceUpdate, MessageResponse, BulkReminderRequest
 from ..database import get_database
-from ..email_service import send_invoice_email, send_payment_reminder
-from ..pdf_generator import generate_pdf_base64
+from ..user_stats import record_change
+from ..object_ids import to_object_id, normalize_references
+from ..pagination import paginate, cursor_headers
+from ..streaming import stream_find, wants_stream
+from ..projection import select_fields, to_projection
+from ..serialization import document_response
+from ..email_outbox import enqueue_email, enqueue_emails
+from ..relations import attach_related
+from ..pdf_cache import pdf_cache, pdf_cache_key, PDF_INVOICE_FIELDS, PDF_USER_FIELDS, PDF_CLIENT_FIELDS
+from ..pdf_renderer import render_invoice_pdf, invoice_pdf_filename
 
 router = APIRouter(prefix="/invoices", tags=["invoices"])
 
-def check_and_update_overdue_invoices(user_id: str = None):
-    """Check for sent invoices with past due dates and update them to overdue"""
-    db = get_database()
-    
-    # Build query for sent invoices
-    query = {"status": "sent"}
-    if user_id:
-        # Convert user_id string to ObjectId for query
-        if ObjectId.is_valid(user_id):
-            query["userId"] = ObjectId(user_id)
-    
-    # Get all sent invoices
-    sent_invoices = list(db.invoices.find(query))
-    
-    # Get current date (UTC)
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    updated_count = 0
-    for invoice in sent_invoices:
-        if invoice.get("dueDate"):
-            try:
-                # Parse due date
-                due_date = invoice["dueDate"]
-                if isinstance(due_date, str):
-                    try:
-                        # Try parsing ISO format with timezone
-                        due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-                    except:
-                        # Fallback: try parsing without timezone and add UTC
-                        due_date = datetime.fromisoformat(due_date)
-                        due_date = due_date.replace(tzinfo=timezone.utc)
-                elif isinstance(due_date, datetime):
-                    # Ensure timezone-aware
-                    if due_date.tzinfo is None:
-                        due_date = due_date.replace(tzinfo=timezone.utc)
-                else:
-                    continue  # Skip if we can't parse
-                
-                # Normalize to start of day for comparison
-                due_date = due_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                
-                # If due date is in the past, update status to overdue
-                if due_date < today:
-                    was_sent = invoice.get("status") == "sent"
-                    
-                    db.invoices.update_one(
-                        {"_id": invoice["_id"]},
-                        {"$set": {"status": "overdue"}}
-                    )
-                    updated_count += 1
-                    
-                    # Send payment reminder if invoice was just marked as overdue
-                    if was_sent:
-                        try:
-                            # Get user (sender) details
-                            user = None
-                            if invoice.get("userId"):
-                                user = db.users.find_one({"_id": ObjectId(invoice["userId"])})
-                            
-                            # Get client (recipient) details
-                            client = None
-                            if invoice.get("clientId"):
-                                client = db.clients.find_one({"_id": ObjectId(invoice["clientId"])})
-                            
-                            if user and client and client.get("email"):
-                                # Prepare invoice data for reminder
-                                invoice_data = {
-                                    "invoiceNumber": invoice.get("invoiceNumber", ""),
-                                    "dueDate": invoice.get("dueDate"),
-                                    "total": invoice.get("total", 0),
-                                    "clientName": client.get("name", ""),
-                                    "to": {
-                                        "name": client.get("name", ""),
-                                        "email": client.get("email", "")
-                                    }
-                                }
-                                
-                                # Prepare business info
-                                business_info = {
-                                    "businessName": user.get("businessName", ""),
-                                    "email": user.get("businessEmail", "")
-                                }
-                                
-                                # Send reminder email
-                                reminder_result = send_payment_reminder(
-                                    invoice_data=invoice_data,
-                                    business_info=business_info,
-                                    client_email=client.get("email")
-                                )
-                                
-                                if not reminder_result.get("success"):
-                                    print(f"[WARNING] Failed to send payment reminder: {reminder_result.get('error')}")
-                        except Exception as e:
-                            print(f"[ERROR] Exception while sending payment reminder: {e}")
-            except Exception as e:
-                # Log error but continue processing other invoices
-                print(f"Error processing invoice {invoice.get('_id')} for overdue check: {e}")
-                continue
-    
-    return updated_count
-
-def convert_objectid_to_str(doc):
-    """Convert ObjectId fields to strings for JSON serialization"""
-    if doc is None:
-        return None
-    if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = convert_objectid_to_str(value)
-            elif isinstance(value, list):
-                result[key] = [convert_objectid_to_str(item) for item in value]
-            else:
-                result[key] = value
-        return result
-    return doc
+# Most invoices one reminder campaign may cover
+MAX_BULK_REMINDERS = 500
 
 @router.post("/", response_model=Invoice, status_code=status.HTTP_201_CREATED)
 async def create_invoice(invoice: InvoiceCreate):
@@ -137,14 +28,10 @@ async def create_invoice(invoice: InvoiceCreate):
     db = get_database()
     
     # Validate user ID format
-    if not ObjectId.is_valid(invoice.userId):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user ID format"
-        )
+    user_id_obj = to_object_id(invoice.userId, "user")
     
-    # Validate user exists (MongoDB will handle ObjectId conversion)
-    user = db.users.find_one({"_id": ObjectId(invoice.userId)})
+    # Validate user exists
+    user = await db.users.find_one({"_id": user_id_obj})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -153,33 +40,25 @@ async def create_invoice(invoice: InvoiceCreate):
     
     # Validate and get client ID
     client_id_obj = None
-    if invoice.clientId and invoice.clientId.strip():
-        if not ObjectId.is_valid(invoice.clientId):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid client ID format"
-            )
+    if invoice.clientId and str(invoice.clientId).strip():
+        client_id_obj = to_object_id(invoice.clientId, "client")
         
         # Verify client exists and auto-link to user if not already linked
-        client = db.clients.find_one({"_id": ObjectId(invoice.clientId)})
+        client = await db.clients.find_one({"_id": client_id_obj})
         if not client:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Client not found"
             )
         
-        client_id_obj = ObjectId(invoice.clientId)
-        
         # Ensure client is linked to the invoice creator's userId
         # If client has a different userId, update it to match the invoice creator
-        client_user_id = client.get("userId")
-        invoice_user_id_obj = ObjectId(invoice.userId)
-        
-        if not client_user_id or ObjectId(client_user_id) != invoice_user_id_obj:
-            db.clients.update_one(
-                {"_id": ObjectId(invoice.clientId)},
-                {"$set": {"userId": invoice_user_id_obj}}
+        if client.get("userId") != user_id_obj:
+            await db.clients.update_one(
+                {"_id": client_id_obj},
+                {"$set": {"userId": user_id_obj}}
             )
+            await record_change(db, "clients", client, {**client, "userId": user_id_obj})
     
     # Auto-generate invoice number if not provided
     if not invoice.invoiceNumber:
@@ -188,34 +67,28 @@ async def create_invoice(invoice: InvoiceCreate):
         invoice.invoiceNumber = f"INV-{last_number + 1}"
         
         # Update user's last invoice number
-        db.users.update_one(
-            {"_id": ObjectId(invoice.userId)},
+        await db.users.update_one(
+            {"_id": user_id_obj},
             {"$set": {"lastInvoiceNumber": last_number + 1}}
         )
     
-    # Insert invoice
+    # Insert invoice, with every reference stored as ObjectId
     invoice_dict = invoice.model_dump(exclude_unset=True)
-    # Convert userId to ObjectId
-    if invoice_dict.get("userId"):
-        invoice_dict["userId"] = ObjectId(invoice_dict["userId"])
-    # Set clientId if we found one
-    if client_id_obj:
-        invoice_dict["clientId"] = client_id_obj
-    # Convert jobId to ObjectId if provided and not empty
-    if invoice_dict.get("jobId") and invoice_dict["jobId"].strip():
-        invoice_dict["jobId"] = ObjectId(invoice_dict["jobId"])
-    result = db.invoices.insert_one(invoice_dict)
+    invoice_dict["userId"] = user_id_obj
+    normalize_references(invoice_dict, "invoices")
+    result = await db.invoices.insert_one(invoice_dict)
     invoice_id_obj = result.inserted_id
+    await record_change(db, "invoices", after=invoice_dict)
     
     # Create job after invoice is created (only if we have a clientId AND no jobId was provided)
     # If a jobId was already provided, use that job instead of creating a new one
     if client_id_obj and not invoice_dict.get("jobId"):
         # Use the invoice creator's userId (not the client's userId)
-        invoice_creator_user_id = ObjectId(invoice.userId)
+        invoice_creator_user_id = user_id_obj
         
         # Re-fetch client to get the client's address for job location
         # The job location should be where the work was performed (client's address)
-        client_for_job = db.clients.find_one({"_id": client_id_obj})
+        client_for_job = await db.clients.find_one({"_id": client_id_obj})
         if not client_for_job:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -234,9 +107,9 @@ async def create_invoice(invoice: InvoiceCreate):
         
         # Create job data
         job_data = {
-            "userId": ObjectId(invoice.userId),
+            "userId": user_id_obj,
             "clientId": client_id_obj,
-            "invoiceId": ObjectId(invoice_id_obj),  # Store as ObjectId
+            "invoiceId": invoice_id_obj,
             "title": invoice.invoiceTitle or invoice.invoiceDescription or "Invoice Job",
             "status": "completed",  # User said "done" but model uses "completed"
             "location": job_location,  # Use client's address, not user's business address
@@ -245,66 +118,52 @@ async def create_invoice(invoice: InvoiceCreate):
         }
         
         # Insert job
-        job_result = db.jobs.insert_one(job_data)
+        job_result = await db.jobs.insert_one(job_data)
         job_id_obj = job_result.inserted_id
+        await record_change(db, "jobs", after=job_data)
         
         # Update invoice with jobId (store as ObjectId)
-        db.invoices.update_one(
+        await db.invoices.update_one(
             {"_id": invoice_id_obj},
-            {"$set": {"jobId": ObjectId(job_id_obj)}}
+            {"$set": {"jobId": job_id_obj}}
         )
     
-    # Return created invoice - convert ObjectId fields to strings for response
-    created_invoice = db.invoices.find_one({"_id": invoice_id_obj})
-    if created_invoice:
-        created_invoice = convert_objectid_to_str(created_invoice)
-    return created_invoice
+    # Return created invoice
+    created_invoice = await db.invoices.find_one({"_id": invoice_id_obj})
+    return document_response(created_invoice, Invoice, status_code=status.HTTP_201_CREATED)
 
 @router.get("/", response_model=List[Invoice])
 async def get_invoices(
+    request: Request,
     user_id: str = None,
     client_id: str = None,
     status_filter: str = None,
+    cursor: str = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    stream: bool = False,
+    fields: str = None
 ):
-    """Get all invoices with optional filters"""
+    """Get all invoices with optional filters (cursor-paginated)"""
     db = get_database()
     
-    # Check and update overdue invoices before fetching
-    # Only check if we're not specifically filtering for overdue (to avoid infinite loops)
-    if status_filter != "overdue":
-        check_and_update_overdue_invoices(user_id=user_id)
-    
     query = {}
     if user_id:
-        # Convert user_id string to ObjectId for query
-        if ObjectId.is_valid(user_id):
-            query["userId"] = ObjectId(user_id)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
+        query["userId"] = to_object_id(user_id, "user")
     if client_id:
-        # Convert client_id string to ObjectId for query
-        if ObjectId.is_valid(client_id):
-            query["clientId"] = ObjectId(client_id)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid client ID format"
-            )
+        query["clientId"] = to_object_id(client_id, "client")
     if status_filter:
         query["status"] = status_filter
     
-    invoices = list(db.invoices.find(query).skip(skip).limit(limit))
-    # Convert ObjectId fields to strings for response
-    invoices = [convert_objectid_to_str(inv) for inv in invoices]
-    return invoices
+    selected = select_fields(fields, Invoice)
+    if wants_stream(request, stream):
+        return stream_find(request, db.invoices, query, cursor=cursor, model=Invoice, fields=selected)
+    
+    invoices, next_cursor = await paginate(db.invoices, query, limit=limit, cursor=cursor, skip=skip, projection=to_projection(selected))
+    return document_response(invoices, Invoice, headers=cursor_headers(next_cursor), fields=selected)
 
 @router.get("/{invoice_id}", response_model=Invoice)
-async def get_invoice(invoice_id: str):
+async def get_invoice(invoice_id: str, fields: str = None):
     """Get a specific invoice by ID"""
     db = get_database()
     
@@ -314,16 +173,15 @@ async def get_invoice(invoice_id: str):
             detail="Invalid invoice ID format"
         )
     
-    invoice = db.invoices.find_one({"_id": ObjectId(invoice_id)})
+    selected = select_fields(fields, Invoice)
+    invoice = await db.invoices.find_one({"_id": ObjectId(invoice_id)}, to_projection(selected))
     if not invoice:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invoice not found"
         )
     
-    # Convert ObjectId fields to strings for response
-    invoice = convert_objectid_to_str(invoice)
-    return invoice
+    return document_response(invoice, Invoice, fields=selected)
 
 @router.put("/{invoice_id}", response_model=Invoice)
 async def update_invoice(invoice_id: str, invoice_update: InvoiceUpdate):
@@ -344,123 +202,43 @@ async def update_invoice(invoice_id: str, invoice_update: InvoiceUpdate):
             detail="No fields to update"
         )
     
-    # Convert userId, clientId, jobId to ObjectId if present in update data
-    if update_data.get("userId"):
-        if ObjectId.is_valid(update_data["userId"]):
-            update_data["userId"] = ObjectId(update_data["userId"])
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
-    if update_data.get("clientId") and update_data["clientId"].strip():
-        if ObjectId.is_valid(update_data["clientId"]):
-            update_data["clientId"] = ObjectId(update_data["clientId"])
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid client ID format"
-            )
-    if update_data.get("jobId") and update_data["jobId"].strip():
-        if ObjectId.is_valid(update_data["jobId"]):
-            update_data["jobId"] = ObjectId(update_data["jobId"])
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid job ID format"
-            )
+    # Store userId, clientId, jobId as ObjectId
+    normalize_references(update_data, "invoices")
     
-    # Get invoice before update to check if status is changing to 'sent'
-    invoice_before = db.invoices.find_one({"_id": ObjectId(invoice_id)})
-    if not invoice_before:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Invoice not found"
-        )
-    
-    was_draft = invoice_before.get("status") == "draft"
-    is_being_sent = update_data.get("status") == "sent"
-    
-    result = db.invoices.update_one(
+    # Keep the previous version: it tells whether the status is changing to 'sent'
+    # and is needed to adjust the owner's summary stats
+    previous_invoice = await db.invoices.find_one_and_update(
         {"_id": ObjectId(invoice_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous_invoice is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invoice not found"
         )
     
-    updated_invoice = db.invoices.find_one({"_id": ObjectId(invoice_id)})
-    if updated_invoice:
-        updated_invoice = convert_objectid_to_str(updated_invoice)
-    
-    # Send email if status changed from draft to sent
-    if was_draft and is_being_sent:
-        try:
-            # Get user (sender) details
-            user = None
-            if updated_invoice.get("userId"):
-                user = db.users.find_one({"_id": ObjectId(updated_invoice["userId"])})
-            
-            # Get client (recipient) details
-            client = None
-            if updated_invoice.get("clientId"):
-                client = db.clients.find_one({"_id": ObjectId(updated_invoice["clientId"])})
-            
-            if user and client and client.get("email"):
-                # Prepare invoice data for email
-                invoice_data = {
-                    "invoiceNumber": updated_invoice.get("invoiceNumber", ""),
-                    "dueDate": updated_invoice.get("dueDate"),
-                    "lineItems": updated_invoice.get("lineItems", []),
-                    "total": updated_invoice.get("total", 0),
-                    "clientName": client.get("name", ""),
-                    "to": {
-                        "name": client.get("name", ""),
-                        "email": client.get("email", ""),
-                        "address": client.get("address", "")
-                    }
-                }
-                
-                # Prepare business info
-                business_info = {
-                    "businessName": user.get("businessName", ""),
-                    "email": user.get("businessEmail", ""),
-                    "phone": user.get("businessPhone", ""),
-                    "address": user.get("businessAddress", "")
-                }
-                
-                # Generate PDF for email attachment
-                pdf_base64 = None
-                try:
-                    pdf_data = {
-                        "invoice": updated_invoice,
-                        "user": user,
-                        "client": client
-                    }
-                    pdf_base64 = generate_pdf_base64(pdf_data, user, client)
-                except Exception as e:
-                    print(f"[WARNING] Failed to generate PDF: {e}")
-                    # Continue without PDF attachment
-                
-                # Send email (async, don't block the response)
-                email_result = send_invoice_email(
-                    invoice_data=invoice_data,
-                    business_info=business_info,
-                    client_email=client.get("email"),
-                    pdf_base64=pdf_base64
-                )
-                
-                if not email_result.get("success"):
-                    print(f"[WARNING] Failed to send invoice email: {email_result.get('error')}")
-                    # Don't fail the invoice update if email fails
-        except Exception as e:
-            print(f"[ERROR] Exception while sending invoice email: {e}")
-            # Don't fail the invoice update if email fails
-    
-    return updated_invoice
+    # The write replaced whole top-level fields, so the new version follows from the old
+    # one; re-reading it could pick up a concurrent write and miscount the stats
+    updated_invoice = {**previous_invoice, **update_data}
+    await record_change(db, "invoices", previous_invoice, updated_invoice)
+    
+    # Drop cached PDFs of the old version if anything they show changed
+    if any(previous_invoice.get(field) != updated_invoice.get(field) for field in PDF_INVOICE_FIELDS):
+        pdf_cache.invalidate(updated_invoice["_id"])
+    
+    was_draft = previous_invoice.get("status") == "draft"
+    is_being_sent = update_data.get("status") == "sent"
+    
+    # Queue the invoice email if status changed from draft to sent;
+    # the outbox workers deliver it, so the response doesn't wait on SMTP
+    if was_draft and is_being_sent and updated_invoice.get("clientId"):
+        client = await db.clients.find_one({"_id": updated_invoice["clientId"]}, {"email": 1})
+        if client and client.get("email"):
+            await enqueue_email(db, "invoice", updated_invoice["_id"], client["email"])
+    
+    return document_response(updated_invoice, Invoice)
 
 @router.delete("/{invoice_id}", response_model=MessageResponse)
 async def delete_invoice(invoice_id: str):
@@ -473,14 +251,17 @@ async def delete_invoice(invoice_id: str):
             detail="Invalid invoice ID format"
         )
     
-    result = db.invoices.delete_one({"_id": ObjectId(invoice_id)})
+    deleted_invoice = await db.invoices.find_one_and_delete({"_id": ObjectId(invoice_id)})
     
-    if result.deleted_count == 0:
+    if deleted_invoice is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invoice not found"
         )
     
+    await record_change(db, "invoices", before=deleted_invoice)
+    pdf_cache.invalidate(deleted_invoice["_id"])
+    
     return {"message": f"Invoice {invoice_id} deleted successfully"}
 
 # ===== RELATIONSHIP ENDPOINTS =====
@@ -497,21 +278,17 @@ async def get_invoice_details(invoice_id: str):
         )
     
     # Get invoice
-    invoice = db.invoices.find_one({"_id": ObjectId(invoice_id)})
+    invoice = await db.invoices.find_one({"_id": ObjectId(invoice_id)})
     if not invoice:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invoice not found"
         )
     
-    # Convert ObjectId and datetime fields to strings for JSON serialization
-    invoice = convert_objectid_to_str(invoice)
-    
     # Get user details
     user_details = None
     if invoice.get("userId"):
-        # MongoDB will handle ObjectId conversion
-        user = db.users.find_one({"_id": ObjectId(invoice["userId"])})
+        user = await db.users.find_one({"_id": invoice["userId"]})
         if user:
             user_details = {
                 "_id": str(user["_id"]),
@@ -525,38 +302,82 @@ async def get_invoice_details(invoice_id: str):
     
     # Get client details
     client_details = None
-    if invoice.get("clientId") and invoice.get("clientId").strip():
-        if ObjectId.is_valid(invoice["clientId"]):
-            client = db.clients.find_one({"_id": ObjectId(invoice["clientId"])})
-            if client:
-                client_details = {
-                    "_id": str(client["_id"]),
-                    "name": client.get("name"),
-                    "email": client.get("email"),
-                    "address": client.get("address")
-                }
+    if invoice.get("clientId"):
+        client = await db.clients.find_one({"_id": invoice["clientId"]})
+        if client:
+            client_details = {
+                "_id": str(client["_id"]),
+                "name": client.get("name"),
+                "email": client.get("email"),
+                "address": client.get("address")
+            }
     
     # Get job details if exists
     job_details = None
-    if invoice.get("jobId") and invoice.get("jobId").strip():
-        if ObjectId.is_valid(invoice["jobId"]):
-            job = db.jobs.find_one({"_id": ObjectId(invoice["jobId"])})
-            if job:
-                job_details = {
-                    "_id": str(job["_id"]),
-                    "title": job.get("title"),
-                    "status": job.get("status"),
-                    "startTime": job.get("startTime"),
-                    "endTime": job.get("endTime"),
-                    "location": job.get("location")
-                }
-    
-    return {
+    if invoice.get("jobId"):
+        job = await db.jobs.find_one({"_id": invoice["jobId"]})
+        if job:
+            job_details = {
+                "_id": str(job["_id"]),
+                "title": job.get("title"),
+                "status": job.get("status"),
+                "startTime": job.get("startTime"),
+                "endTime": job.get("endTime"),
+                "location": job.get("location")
+            }
+    
+    return document_response({
         "invoice": invoice,
         "user": user_details,
         "client": client_details,
         "job": job_details
-    }
+    })
+
+@router.get("/{invoice_id}/pdf")
+async def get_invoice_pdf(invoice_id: str, request: Request):
+    """
+    The invoice as a PDF file. The ETag is the hash of everything the PDF
+    shows, so a client holding the current version gets a 304 without
+    anything being rendered or read from the cache.
+    """
+    db = get_database()
+    
+    if not ObjectId.is_valid(invoice_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid invoice ID format"
+        )
+    
+    invoice = await db.invoices.find_one(
+        {"_id": ObjectId(invoice_id)},
+        {field: 1 for field in (*PDF_INVOICE_FIELDS, "userId", "clientId")}
+    )
+    if not invoice:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invoice not found"
+        )
+    
+    # The PDF shows the business and client details; missing ones are left blank
+    user = None
+    if invoice.get("userId"):
+        user = await db.users.find_one({"_id": invoice["userId"]}, {field: 1 for field in PDF_USER_FIELDS})
+    client = None
+    if invoice.get("clientId"):
+        client = await db.clients.find_one({"_id": invoice["clientId"]}, {field: 1 for field in PDF_CLIENT_FIELDS})
+    user = user or {}
+    client = client or {}
+    
+    etag = f'"{pdf_cache_key(invoice, user, client)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    pdf_bytes = await render_invoice_pdf(invoice, user, client)
+    headers["Content-Disposition"] = f'inline; filename="{invoice_pdf_filename(invoice)}"'
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
 @router.get("/{invoice_id}/printable")
 async def get_printable_invoice(invoice_id: str):
@@ -570,7 +391,7 @@ async def get_printable_invoice(invoice_id: str):
         )
     
     # Get invoice
-    invoice = db.invoices.find_one({"_id": ObjectId(invoice_id)})
+    invoice = await db.invoices.find_one({"_id": ObjectId(invoice_id)})
     if not invoice:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -580,20 +401,20 @@ async def get_printable_invoice(invoice_id: str):
     # Get user (sender) details
     user = None
     if invoice.get("userId"):
-        user = db.users.find_one({"_id": ObjectId(invoice["userId"])})
+        user = await db.users.find_one({"_id": ObjectId(invoice["userId"])})
     
     # Get client (recipient) details
     client = None
     if invoice.get("clientId"):
-        client = db.clients.find_one({"_id": ObjectId(invoice["clientId"])})
+        client = await db.clients.find_one({"_id": ObjectId(invoice["clientId"])})
     
     # Get job details if exists
     job = None
     if invoice.get("jobId"):
-        job = db.jobs.find_one({"_id": ObjectId(invoice["jobId"])})
+        job = await db.jobs.find_one({"_id": ObjectId(invoice["jobId"])})
     
     # Format for printing
-    return {
+    return document_response({
         "invoiceNumber": invoice.get("invoiceNumber"),
         "issueDate": invoice.get("issueDate"),
         "dueDate": invoice.get("dueDate"),
@@ -617,12 +438,12 @@ async def get_printable_invoice(invoice_id: str):
         } if job else None,
         "lineItems": invoice.get("lineItems", []),
         "total": invoice.get("total", 0)
-    }
+    })
 
 
 @router.post("/{invoice_id}/send-reminder", response_model=MessageResponse)
 async def send_invoice_reminder(invoice_id: str):
-    """Send a payment reminder email for an overdue invoice"""
+    """Queue a payment reminder email for an overdue invoice"""
     db = get_database()
     
     if not ObjectId.is_valid(invoice_id):
@@ -632,7 +453,7 @@ async def send_invoice_reminder(invoice_id: str):
         )
     
     # Get invoice
-    invoice = db.invoices.find_one({"_id": ObjectId(invoice_id)})
+    invoice = await db.invoices.find_one({"_id": ObjectId(invoice_id)})
     if not invoice:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -642,12 +463,12 @@ async def send_invoice_reminder(invoice_id: str):
     # Get user (sender) details
     user = None
     if invoice.get("userId"):
-        user = db.users.find_one({"_id": ObjectId(invoice["userId"])})
+        user = await db.users.find_one({"_id": ObjectId(invoice["userId"])})
     
     # Get client (recipient) details
     client = None
     if invoice.get("clientId"):
-        client = db.clients.find_one({"_id": ObjectId(invoice["clientId"])})
+        client = await db.clients.find_one({"_id": ObjectId(invoice["clientId"])})
     
     if not user:
         raise HTTPException(
@@ -667,36 +488,121 @@ async def send_invoice_reminder(invoice_id: str):
             detail="Client email not found. Cannot send reminder."
         )
     
-    # Prepare invoice data for reminder
-    invoice_data = {
-        "invoiceNumber": invoice.get("invoiceNumber", ""),
-        "dueDate": invoice.get("dueDate"),
-        "total": invoice.get("total", 0),
-        "clientName": client.get("name", ""),
-        "to": {
-            "name": client.get("name", ""),
-            "email": client.get("email", "")
+    # Queue the reminder; delivery status is listed under /invoices/{id}/emails
+    await enqueue_email(db, "reminder", invoice["_id"], client["email"])
+    
+    return {"message": f"Payment reminder queued for {client.get('email')}"}
+
+
+
+@router.post("/reminders/bulk")
+async def send_bulk_reminders(campaign: BulkReminderRequest):
+    """
+    Queue payment reminders for all of a user's invoices matching the filter
+    (overdue by default). Invoices and clients are loaded with one query each,
+    the reminders are queued with a single insert and the outbox workers send
+    them concurrently, rate limited. Returns what happened to each invoice.
+    """
+    db = get_database()
+    
+    user_id = to_object_id(campaign.userId, "user")
+    if not await db.users.find_one({"_id": user_id}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    query = {"userId": user_id, "status": campaign.status}
+    if campaign.invoiceIds is not None:
+        query["_id"] = {"$in": [to_object_id(invoice_id, "invoice") for invoice_id in campaign.invoiceIds]}
+    if campaign.minDaysOverdue:
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        query["dueDate"] = {"$lte": today - timedelta(days=campaign.minDaysOverdue)}
+    
+    invoices = await db.invoices.find(
+        query, {"invoiceNumber": 1, "clientId": 1, "dueDate": 1, "total": 1}
+    ).sort("dueDate", 1).to_list(length=MAX_BULK_REMINDERS + 1)
+    if len(invoices) > MAX_BULK_REMINDERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"More than {MAX_BULK_REMINDERS} invoices match. Narrow the filter."
+        )
+    
+    # Recipients in one query, and don't queue a second reminder for an invoice that already has one waiting
+    await attach_related(invoices, "clientId", db.clients, {"clientName": "name", "clientEmail": "email"})
+    already_queued = set(await db.email_outbox.distinct("invoiceId", {
+        "invoiceId": {"$in": [invoice["_id"] for invoice in invoices]},
+        "kind": "reminder",
+        "status": {"$in": ["pending", "sending"]},
+    })) if invoices else set()
+    
+    campaign_id = ObjectId()
+    results = []
+    recipients = []
+    for invoice in invoices:
+        result = {
+            "invoiceId": invoice["_id"],
+            "invoiceNumber": invoice.get("invoiceNumber"),
+            "clientName": invoice.get("clientName"),
+            "to": invoice.get("clientEmail"),
+            "status": "queued",
         }
-    }
-    
-    # Prepare business info
-    business_info = {
-        "businessName": user.get("businessName", ""),
-        "email": user.get("businessEmail", "")
-    }
-    
-    # Send reminder email
-    reminder_result = send_payment_reminder(
-        invoice_data=invoice_data,
-        business_info=business_info,
-        client_email=client.get("email")
-    )
+        if "clientName" not in invoice:
+            result.update(status="skipped", reason="Client not found")
+        elif not invoice.get("clientEmail"):
+            result.update(status="skipped", reason="Client email not found")
+        elif invoice["_id"] in already_queued:
+            result.update(status="skipped", reason="Reminder already queued")
+        else:
+            recipients.append((invoice["_id"], invoice["clientEmail"]))
+        results.append(result)
+    
+    await enqueue_emails(db, "reminder", recipients, campaignId=campaign_id)
+    
+    return document_response({
+        "campaignId": campaign_id,
+        "matched": len(invoices),
+        "queued": len(recipients),
+        "skipped": len(invoices) - len(recipients),
+        "results": results,
+    })
+
+
+@router.get("/reminders/bulk/{campaign_id}")
+async def get_bulk_reminder_report(campaign_id: str):
+    """Delivery status of every reminder queued by a bulk campaign"""
+    db = get_database()
     
-    if not reminder_result.get("success"):
+    emails = await db.email_outbox.find(
+        {"campaignId": to_object_id(campaign_id, "campaign")},
+        {"invoiceId": 1, "to": 1, "status": 1, "attempts": 1, "sentAt": 1, "lastError": 1}
+    ).to_list(length=MAX_BULK_REMINDERS)
+    if not emails:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=reminder_result.get("error", "Failed to send reminder email")
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Campaign not found"
         )
     
-    return {"message": f"Payment reminder sent successfully to {client.get('email')}"}
+    counts: Dict[str, int] = {}
+    for email in emails:
+        counts[email["status"]] = counts.get(email["status"], 0) + 1
+    
+    return document_response({"campaignId": campaign_id, "counts": counts, "results": emails})
+
 
+@router.get("/{invoice_id}/emails")
+async def get_invoice_emails(invoice_id: str):
+    """Delivery status of the emails queued for an invoice, newest first"""
+    db = get_database()
+    
+    if not ObjectId.is_valid(invoice_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid invoice ID format"
+        )
+    
+    emails = await db.email_outbox.find(
+        {"invoiceId": ObjectId(invoice_id)}
+    ).sort("createdAt", -1).to_list(length=100)
+    
+    return document_response(emails)
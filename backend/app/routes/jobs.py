@@ -1,123 +1,88 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
 from typing import List, Dict, Any
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 
 from ..models import Job, JobCreate, JobUpdate, MessageResponse
 from ..database import get_database
+from ..user_stats import record_change
+from ..object_ids import to_object_id, normalize_references
+from ..pagination import paginate, cursor_headers
+from ..streaming import stream_find, wants_stream
+from ..projection import select_fields, to_projection
+from ..serialization import document_response
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
-def convert_objectid_to_str(doc):
-    """Convert ObjectId fields to strings for JSON serialization"""
-    if doc is None:
-        return None
-    if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = convert_objectid_to_str(value)
-            elif isinstance(value, list):
-                result[key] = [convert_objectid_to_str(item) for item in value]
-            else:
-                result[key] = value
-        return result
-    return doc
-
 @router.post("/", response_model=Job, status_code=status.HTTP_201_CREATED)
 async def create_job(job: JobCreate):
     """Create a new job"""
     db = get_database()
     
-    # Validate user ID format
-    if not ObjectId.is_valid(job.userId):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user ID format"
-        )
+    # Transform Input Data to appropriate types for storage in the database (ObjectId for all references)
+    job_dict = job.model_dump(exclude_unset=True)
+    job_dict["userId"] = to_object_id(job.userId, "user")
+    normalize_references(job_dict, "jobs")
     
-    # Verify user exists (MongoDB will handle ObjectId conversion)
-    user = db.users.find_one({"_id": ObjectId(job.userId)})
+    # Verify user exists
+    user = await db.users.find_one({"_id": job_dict["userId"]})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Validate client ID only if provided (and only if it looks like an ObjectId)
-    if job.clientId and ObjectId.is_valid(job.clientId):
+    # Validate client only if provided
+    if job_dict.get("clientId"):
         # Verify client exists
-        client = db.clients.find_one({"_id": ObjectId(job.clientId)})
+        client = await db.clients.find_one({"_id": job_dict["clientId"]})
         if not client:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Client not found"
             )
-    # Transform Input Data to appropriate types for storage in the database (e.g. ObjectId for MongoDB ObjectIds)
+    
     # Insert job
-    job_dict = job.model_dump(exclude_unset=True)
-    # Convert userId to ObjectId
-    if job_dict.get("userId"):
-        job_dict["userId"] = ObjectId(job_dict["userId"])
-    # Convert clientId to ObjectId if provided and not empty
-    if job_dict.get("clientId") and job_dict["clientId"].strip():
-        job_dict["clientId"] = ObjectId(job_dict["clientId"])
-    # Convert invoiceId to ObjectId if provided and not empty
-    if job_dict.get("invoiceId") and job_dict["invoiceId"].strip():
-        if ObjectId.is_valid(job_dict["invoiceId"]):
-            job_dict["invoiceId"] = ObjectId(job_dict["invoiceId"])
-    result = db.jobs.insert_one(job_dict)
-    
-    # Return created job - convert ObjectId fields to strings for response
-    created_job = db.jobs.find_one({"_id": result.inserted_id})
-    if created_job:
-        created_job = convert_objectid_to_str(created_job)
-    return created_job
+    result = await db.jobs.insert_one(job_dict)
+    await record_change(db, "jobs", after=job_dict)
+    
+    # Return created job
+    created_job = await db.jobs.find_one({"_id": result.inserted_id})
+    return document_response(created_job, Job, status_code=status.HTTP_201_CREATED)
 
 @router.get("/", response_model=List[Job])
 async def get_jobs(
+    request: Request,
     user_id: str = None,
     client_id: str = None,
     status_filter: str = None,
+    cursor: str = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    stream: bool = False,
+    fields: str = None
 ):
-    """Get all jobs with optional filters"""
+    """Get all jobs with optional filters (cursor-paginated)"""
     db = get_database()
     
     query = {}
     if user_id:
-        # Convert user_id string to ObjectId for query
-        if ObjectId.is_valid(user_id):
-            query["userId"] = ObjectId(user_id)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
+        query["userId"] = to_object_id(user_id, "user")
     if client_id:
-        # Convert client_id string to ObjectId for query
-        if ObjectId.is_valid(client_id):
-            query["clientId"] = ObjectId(client_id)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid client ID format"
-            )
+        query["clientId"] = to_object_id(client_id, "client")
     if status_filter:
         query["status"] = status_filter
     
-    jobs = list(db.jobs.find(query).skip(skip).limit(limit))
-    # Convert ObjectId fields to strings for response
-    jobs = [convert_objectid_to_str(job) for job in jobs]
-    return jobs
+    selected = select_fields(fields, Job)
+    if wants_stream(request, stream):
+        return stream_find(request, db.jobs, query, cursor=cursor, model=Job, fields=selected)
+    
+    jobs, next_cursor = await paginate(db.jobs, query, limit=limit, cursor=cursor, skip=skip, projection=to_projection(selected))
+    return document_response(jobs, Job, headers=cursor_headers(next_cursor), fields=selected)
 
 @router.get("/{job_id}", response_model=Job)
-async def get_job(job_id: str):
+async def get_job(job_id: str, fields: str = None):
     """Get a specific job by ID"""
     db = get_database()
     
@@ -127,16 +92,15 @@ async def get_job(job_id: str):
             detail="Invalid job ID format"
         )
     
-    job = db.jobs.find_one({"_id": ObjectId(job_id)})
+    selected = select_fields(fields, Job)
+    job = await db.jobs.find_one({"_id": ObjectId(job_id)}, to_projection(selected))
     if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Job not found"
         )
     
-    # Convert ObjectId fields to strings for response
-    job = convert_objectid_to_str(job)
-    return job
+    return document_response(job, Job, fields=selected)
 
 @router.put("/{job_id}", response_model=Job)
 async def update_job(job_id: str, job_update: JobUpdate):
@@ -165,34 +129,12 @@ async def update_job(job_id: str, job_update: JobUpdate):
             detail="No fields to update"
         )
     
-    # Convert userId, clientId, and invoiceId to ObjectId if present in update data
-    if update_data.get("userId"):
-        if ObjectId.is_valid(update_data["userId"]):
-            update_data["userId"] = ObjectId(update_data["userId"])
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid user ID format"
-            )
-    if update_data.get("clientId"):
-        # Handle empty string - remove it from update_data
-        if isinstance(update_data["clientId"], str) and not update_data["clientId"].strip():
-            update_data.pop("clientId")
-        elif ObjectId.is_valid(update_data["clientId"]):
-            update_data["clientId"] = ObjectId(update_data["clientId"])
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid client ID format"
-            )
-    if update_data.get("invoiceId") and update_data["invoiceId"].strip():
-        if ObjectId.is_valid(update_data["invoiceId"]):
-            update_data["invoiceId"] = ObjectId(update_data["invoiceId"])
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid invoice ID format"
-            )
+    # Handle empty clientId string - keep the existing client
+    if isinstance(update_data.get("clientId"), str) and not update_data["clientId"].strip():
+        update_data.pop("clientId")
+    
+    # Store userId, clientId, and invoiceId as ObjectId
+    normalize_references(update_data, "jobs")
     
     # Build update operation
     update_operation = {}
@@ -207,21 +149,26 @@ async def update_job(job_id: str, job_update: JobUpdate):
             detail="No fields to update"
         )
     
-    result = db.jobs.update_one(
+    # The previous version is needed to adjust the owner's summary stats
+    previous_job = await db.jobs.find_one_and_update(
         {"_id": ObjectId(job_id)},
-        update_operation
+        update_operation,
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if previous_job is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Job not found"
         )
     
-    updated_job = db.jobs.find_one({"_id": ObjectId(job_id)})
-    if updated_job:
-        updated_job = convert_objectid_to_str(updated_job)
-    return updated_job
+    # The write replaced or removed whole top-level fields, so the new version follows
+    # from the old one; re-reading it could pick up a concurrent write and miscount the stats
+    updated_job = {**previous_job, **update_data}
+    for field in unset_fields:
+        updated_job.pop(field, None)
+    await record_change(db, "jobs", previous_job, updated_job)
+    return document_response(updated_job, Job)
 
 @router.delete("/{job_id}", response_model=MessageResponse)
 async def delete_job(job_id: str):
@@ -234,14 +181,16 @@ async def delete_job(job_id: str):
             detail="Invalid job ID format"
         )
     
-    result = db.jobs.delete_one({"_id": ObjectId(job_id)})
+    deleted_job = await db.jobs.find_one_and_delete({"_id": ObjectId(job_id)})
     
-    if result.deleted_count == 0:
+    if deleted_job is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Job not found"
         )
     
+    await record_change(db, "jobs", before=deleted_job)
+    
     return {"message": f"Job {job_id} deleted successfully"}
 
 # ===== RELATIONSHIP ENDPOINTS =====
@@ -258,7 +207,7 @@ async def get_job_details(job_id: str):
         )
     
     # Get job
-    job = db.jobs.find_one({"_id": ObjectId(job_id)})
+    job = await db.jobs.find_one({"_id": ObjectId(job_id)})
     if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -268,7 +217,7 @@ async def get_job_details(job_id: str):
     # Get client details
     client_details = None
     if job.get("clientId"):
-        client = db.clients.find_one({"_id": ObjectId(job["clientId"])})
+        client = await db.clients.find_one({"_id": job["clientId"]})
         if client:
             client_details = {
                 "_id": str(client["_id"]),
@@ -280,7 +229,7 @@ async def get_job_details(job_id: str):
     # Get user details
     user_details = None
     if job.get("userId"):
-        user = db.users.find_one({"_id": ObjectId(job["userId"])})
+        user = await db.users.find_one({"_id": job["userId"]})
         if user:
             user_details = {
                 "_id": str(user["_id"]),
@@ -292,9 +241,7 @@ async def get_job_details(job_id: str):
     # Get invoice details if exists
     invoice_details = None
     if job.get("invoiceId"):
-        # invoiceId is stored as ObjectId, use it directly
-        invoice_id = job["invoiceId"] if isinstance(job["invoiceId"], ObjectId) else ObjectId(job["invoiceId"])
-        invoice = db.invoices.find_one({"_id": invoice_id})
+        invoice = await db.invoices.find_one({"_id": job["invoiceId"]})
         if invoice:
             invoice_details = {
                 "_id": str(invoice["_id"]),
@@ -305,12 +252,12 @@ async def get_job_details(job_id: str):
                 "dueDate": invoice.get("dueDate")
             }
     
-    return {
+    return document_response({
         "job": job,
         "client": client_details,
         "user": user_details,
         "invoice": invoice_details
-    }
+    })
 
 @router.get("/{job_id}/invoice")
 async def get_job_invoice(job_id: str):
@@ -324,7 +271,7 @@ async def get_job_invoice(job_id: str):
         )
     
     # Get job
-    job = db.jobs.find_one({"_id": ObjectId(job_id)})
+    job = await db.jobs.find_one({"_id": ObjectId(job_id)})
     if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -333,11 +280,9 @@ async def get_job_invoice(job_id: str):
     
     # Get invoice
     if job.get("invoiceId"):
-        # invoiceId is stored as ObjectId, use it directly
-        invoice_id = job["invoiceId"] if isinstance(job["invoiceId"], ObjectId) else ObjectId(job["invoiceId"])
-        invoice = db.invoices.find_one({"_id": invoice_id})
+        invoice = await db.invoices.find_one({"_id": job["invoiceId"]})
         if invoice:
-            return invoice
+            return document_response(invoice)
     
     # No invoice found
     raise HTTPException(
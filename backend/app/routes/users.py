@@ -1,11 +1,23 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Query, Request, status, Depends
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from pymongo import ASCENDING
 
 from ..models import User, UserCreate, UserUpdate, MessageResponse
 from ..database import get_database
 from ..api.dependencies import verify_token
+from ..pagination import paginate, cursor_headers
+from ..streaming import stream_find, wants_stream
+from ..projection import select_fields, to_projection
+from ..serialization import document_response
+from ..relations import attach_related, count_by
+from ..user_stats import get_user_stats, rebuild_user_stats, stat
+from ..dates import parse_date
+from ..pdf_cache import PDF_USER_FIELDS
+from ..invoice_export import stream_invoice_zip
+from ..sql_snapshots import sql_snapshots
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -16,7 +28,7 @@ async def sync_user(token: dict = Depends(verify_token)):
     auth0_id = token.get("sub")
     users_collection = db.users
     
-    existing_user = users_collection.find_one({"auth0_id": auth0_id})
+    existing_user = await users_collection.find_one({"auth0_id": auth0_id})
 
     # Case 1: User doesn't exist at all -> Create them, but mark as incomplete
     if not existing_user:
@@ -24,7 +36,7 @@ async def sync_user(token: dict = Depends(verify_token)):
             "auth0_id": auth0_id,
             "onboarding_complete": False  # <--- THE FLAG
         }
-        result = users_collection.insert_one(new_user)
+        result = await users_collection.insert_one(new_user)
         return {"status": "created", "onboarding_complete": False}
 
     # Case 2: User exists, but hasn't finished the form
@@ -42,7 +54,7 @@ async def get_profile(token: dict = Depends(verify_token)):
     auth0_id = token.get("sub")
     users_collection = db.users
     
-    user = users_collection.find_one({"auth0_id": auth0_id})
+    user = await users_collection.find_one({"auth0_id": auth0_id})
     
     if not user:
         raise HTTPException(
@@ -50,20 +62,17 @@ async def get_profile(token: dict = Depends(verify_token)):
             detail="User not found"
         )
     
-    # Convert ObjectId to string for JSON serialization
-    user["_id"] = str(user["_id"])
-    
-    return user
+    return document_response(user)
 
 @router.put("/profile")
-def update_profile(profile: User, token: dict = Depends(verify_token)):
+async def update_profile(profile: User, token: dict = Depends(verify_token)):
     db = get_database()
 
     auth0_id = token.get("sub")
     users_collection = db.users
     
     # Update the document for this specific user
-    result = users_collection.update_one(
+    result = await users_collection.update_one(
         {"auth0_id": auth0_id},
         {"$set": {
             "businessName": profile.businessName,
@@ -90,7 +99,7 @@ async def create_user(user: UserCreate):
     db = get_database()
     
     # Check if user with email already exists
-    existing_user = db.users.find_one({"auth0_id": user.auth0Id})
+    existing_user = await db.users.find_one({"auth0_id": user.auth0Id})
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -102,35 +111,46 @@ async def create_user(user: UserCreate):
     user_dict["createdAt"] = datetime.utcnow()
     
     # Insert into database
-    result = db.users.insert_one(user_dict)
+    result = await db.users.insert_one(user_dict)
     
     # Retrieve and return created user
-    created_user = db.users.find_one({"_id": result.inserted_id})
-    return created_user
+    created_user = await db.users.find_one({"_id": result.inserted_id})
+    return document_response(created_user, User, status_code=status.HTTP_201_CREATED)
 
 @router.get("/", response_model=List[User])
-async def get_users(skip: int = 0, limit: int = 100):
-    """Get all users with pagination"""
+async def get_users(
+    request: Request,
+    cursor: str = None,
+    skip: int = 0,
+    limit: int = 100,
+    stream: bool = False,
+    fields: str = None
+):
+    """Get all users with cursor pagination"""
     db = get_database()
-    users = list(db.users.find().skip(skip).limit(limit))
-    return users
+    selected = select_fields(fields, User)
+    if wants_stream(request, stream):
+        return stream_find(request, db.users, {}, cursor=cursor, model=User, fields=selected)
+    
+    users, next_cursor = await paginate(db.users, {}, limit=limit, cursor=cursor, skip=skip, projection=to_projection(selected))
+    return document_response(users, User, headers=cursor_headers(next_cursor), fields=selected)
 
 @router.get("/by-auth0/{auth0_id:path}", response_model=User)
 async def get_user_by_auth0(auth0_id: str):
     """Get a user by their Auth0 ID (sub claim)"""
     db = get_database()
     
-    user = db.users.find_one({"auth0_id": auth0_id})
+    user = await db.users.find_one({"auth0_id": auth0_id})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return user
+    return document_response(user, User)
 
 @router.get("/{user_id}", response_model=User)
-async def get_user(user_id: str):
+async def get_user(user_id: str, fields: str = None):
     """Get a specific user by ID"""
     db = get_database()
     
@@ -140,14 +160,15 @@ async def get_user(user_id: str):
             detail="Invalid user ID format"
         )
     
-    user = db.users.find_one({"_id": ObjectId(user_id)})
+    selected = select_fields(fields, User)
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, to_projection(selected))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return user
+    return document_response(user, User, fields=selected)
 
 @router.put("/{user_id}", response_model=User)
 async def update_user(user_id: str, user_update: UserUpdate):
@@ -170,7 +191,7 @@ async def update_user(user_id: str, user_update: UserUpdate):
         )
     
     # Update user
-    result = db.users.update_one(
+    result = await db.users.update_one(
         {"_id": ObjectId(user_id)},
         {"$set": update_data}
     )
@@ -182,8 +203,8 @@ async def update_user(user_id: str, user_update: UserUpdate):
         )
     
     # Return updated user
-    updated_user = db.users.find_one({"_id": ObjectId(user_id)})
-    return updated_user
+    updated_user = await db.users.find_one({"_id": ObjectId(user_id)})
+    return document_response(updated_user, User)
 
 @router.delete("/{user_id}", response_model=MessageResponse)
 async def delete_user(user_id: str):
@@ -196,7 +217,7 @@ async def delete_user(user_id: str):
             detail="Invalid user ID format"
         )
     
-    result = db.users.delete_one({"_id": ObjectId(user_id)})
+    result = await db.users.delete_one({"_id": ObjectId(user_id)})
     
     if result.deleted_count == 0:
         raise HTTPException(
@@ -204,13 +225,16 @@ async def delete_user(user_id: str):
             detail="User not found"
         )
     
+    await db.user_stats.delete_one({"_id": ObjectId(user_id)})
+    sql_snapshots.invalidate(ObjectId(user_id))
+    
     return {"message": f"User {user_id} deleted successfully"}
 
 # ===== RELATIONSHIP ENDPOINTS =====
 
 @router.get("/{user_id}/clients", response_model=List[Dict[str, Any]])
-async def get_user_clients(user_id: str):
-    """Get all clients for a specific user"""
+async def get_user_clients(user_id: str, cursor: str = None, limit: int = None):
+    """Get all clients for a specific user (one page of them if limit or cursor is given)"""
     db = get_database()
     
     if not ObjectId.is_valid(user_id):
@@ -220,25 +244,30 @@ async def get_user_clients(user_id: str):
         )
     
     # Verify user exists
-    user = db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Get all clients for this user
-    clients = list(db.clients.find({"userId": user_id}))
-    
-    # Add job count for each client
+    # Get the clients for this user
+    query = {"userId": user["_id"]}
+    next_cursor = None
+    if limit is not None or cursor:
+        clients, next_cursor = await paginate(db.clients, query, limit=limit or 100, cursor=cursor)
+    else:
+        clients = await db.clients.find(query).sort("_id", ASCENDING).to_list(length=None)
+    
+    # Add job and invoice counts for each client
+    client_ids = [client["_id"] for client in clients]
+    job_counts = await count_by(db.jobs, "clientId", client_ids)
+    invoice_counts = await count_by(db.invoices, "clientId", client_ids)
     for client in clients:
-        client_id = str(client["_id"])
-        job_count = db.jobs.count_documents({"clientId": client_id})
-        invoice_count = db.invoices.count_documents({"clientId": client_id})
-        client["jobCount"] = job_count
-        client["invoiceCount"] = invoice_count
+        client["jobCount"] = job_counts.get(client["_id"], 0)
+        client["invoiceCount"] = invoice_counts.get(client["_id"], 0)
     
-    return clients
+    return document_response(clients, headers=cursor_headers(next_cursor))
 
 @router.get("/{user_id}/jobs", response_model=List[Dict[str, Any]])
 async def get_user_jobs(user_id: str, status_filter: str = None):
@@ -252,7 +281,7 @@ async def get_user_jobs(user_id: str, status_filter: str = None):
         )
     
     # Verify user exists
-    user = db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -260,22 +289,19 @@ async def get_user_jobs(user_id: str, status_filter: str = None):
         )
     
     # Build query
-    query = {"userId": user_id}
+    query = {"userId": user["_id"]}
     if status_filter:
         query["status"] = status_filter
     
     # Get jobs and add client info
-    jobs = list(db.jobs.find(query))
+    jobs = await db.jobs.find(query).to_list(length=None)
     
-    for job in jobs:
-        # Add client info
-        if job.get("clientId"):
-            client = db.clients.find_one({"_id": ObjectId(job["clientId"])})
-            if client:
-                job["clientName"] = client.get("name")
-                job["clientEmail"] = client.get("email")
+    await attach_related(jobs, "clientId", db.clients, {
+        "clientName": "name",
+        "clientEmail": "email"
+    })
     
-    return jobs
+    return document_response(jobs)
 
 @router.get("/{user_id}/invoices", response_model=List[Dict[str, Any]])
 async def get_user_invoices(user_id: str, status_filter: str = None):
@@ -289,7 +315,7 @@ async def get_user_invoices(user_id: str, status_filter: str = None):
         )
     
     # Verify user exists
-    user = db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -297,27 +323,71 @@ async def get_user_invoices(user_id: str, status_filter: str = None):
         )
     
     # Build query
-    query = {"userId": user_id}
+    query = {"userId": user["_id"]}
     if status_filter:
         query["status"] = status_filter
     
     # Get invoices and add client info
-    invoices = list(db.invoices.find(query))
-    
-    for invoice in invoices:
-        # Add client info
-        if invoice.get("clientId"):
-            client = db.clients.find_one({"_id": ObjectId(invoice["clientId"])})
-            if client:
-                invoice["clientName"] = client.get("name")
-        
-        # Add job info if exists
-        if invoice.get("jobId"):
-            job = db.jobs.find_one({"_id": ObjectId(invoice["jobId"])})
-            if job:
-                invoice["jobTitle"] = job.get("title")
+    invoices = await db.invoices.find(query).to_list(length=None)
+    
+    # Add client info
+    await attach_related(invoices, "clientId", db.clients, {"clientName": "name"})
     
-    return invoices
+    # Add job info if exists
+    await attach_related(invoices, "jobId", db.jobs, {"jobTitle": "title"})
+    
+    return document_response(invoices)
+
+@router.get("/{user_id}/invoices/export.zip")
+async def export_user_invoices(
+    user_id: str,
+    from_date: str = Query(None, alias="from"),
+    to_date: str = Query(None, alias="to")
+):
+    """
+    ZIP of the PDFs of a user's invoices issued between ``from`` and ``to``
+    (inclusive dates, both optional), streamed while the PDFs render
+    """
+    db = get_database()
+    
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid user ID format"
+        )
+    
+    try:
+        start = parse_date(from_date)
+        end = parse_date(to_date)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {field: 1 for field in PDF_USER_FIELDS})
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    query = {"userId": user["_id"]}
+    if start or end:
+        query["issueDate"] = {}
+        if start:
+            query["issueDate"]["$gte"] = start
+        if end:
+            # A plain date includes the whole of that day
+            is_date = end == end.replace(hour=0, minute=0, second=0, microsecond=0)
+            query["issueDate"]["$lt"] = end + timedelta(days=1) if is_date else end
+    
+    filename = f"invoices-{start.date() if start else 'all'}-{end.date() if end else 'all'}.zip"
+    return StreamingResponse(
+        stream_invoice_zip(db, user, query),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @router.get("/{user_id}/summary")
 async def get_user_summary(user_id: str):
@@ -331,36 +401,15 @@ async def get_user_summary(user_id: str):
         )
     
     # Get user
-    user = db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Count related documents
-    client_count = db.clients.count_documents({"userId": user_id})
-    job_count = db.jobs.count_documents({"userId": user_id})
-    invoice_count = db.invoices.count_documents({"userId": user_id})
-    
-    # Get job status breakdown
-    jobs_pending = db.jobs.count_documents({"userId": user_id, "status": "pending"})
-    jobs_in_progress = db.jobs.count_documents({"userId": user_id, "status": "in_progress"})
-    jobs_completed = db.jobs.count_documents({"userId": user_id, "status": "completed"})
-    
-    # Get invoice status breakdown
-    invoices_draft = db.invoices.count_documents({"userId": user_id, "status": "draft"})
-    invoices_sent = db.invoices.count_documents({"userId": user_id, "status": "sent"})
-    invoices_paid = db.invoices.count_documents({"userId": user_id, "status": "paid"})
-    invoices_overdue = db.invoices.count_documents({"userId": user_id, "status": "overdue"})
-    
-    # Calculate total revenue (from paid invoices)
-    paid_invoices = list(db.invoices.find({"userId": user_id, "status": "paid"}))
-    total_revenue = sum(inv.get("total", 0) for inv in paid_invoices)
-    
-    # Calculate pending revenue (from sent invoices)
-    sent_invoices = list(db.invoices.find({"userId": user_id, "status": "sent"}))
-    pending_revenue = sum(inv.get("total", 0) for inv in sent_invoices)
+    # Counts and totals are maintained incrementally in user_stats
+    stats = await get_user_stats(db, user["_id"])
     
     return {
         "user": {
@@ -371,24 +420,51 @@ async def get_user_summary(user_id: str):
             "hourlyRate": user.get("hourlyRate")
         },
         "counts": {
-            "clients": client_count,
-            "jobs": job_count,
-            "invoices": invoice_count
+            "clients": stat(stats, "clients.count"),
+            "jobs": stat(stats, "jobs.count"),
+            "invoices": stat(stats, "invoices.count")
         },
         "jobs": {
-            "pending": jobs_pending,
-            "inProgress": jobs_in_progress,
-            "completed": jobs_completed
+            "pending": stat(stats, "jobs.byStatus.pending"),
+            "inProgress": stat(stats, "jobs.byStatus.in_progress"),
+            "completed": stat(stats, "jobs.byStatus.completed")
         },
         "invoices": {
-            "draft": invoices_draft,
-            "sent": invoices_sent,
-            "paid": invoices_paid,
-            "overdue": invoices_overdue
+            "draft": stat(stats, "invoices.byStatus.draft"),
+            "sent": stat(stats, "invoices.byStatus.sent"),
+            "paid": stat(stats, "invoices.byStatus.paid"),
+            "overdue": stat(stats, "invoices.byStatus.overdue")
         },
         "revenue": {
-            "total": total_revenue,
-            "pending": pending_revenue
+            "total": stat(stats, "invoices.totals.paid"),
+            "pending": stat(stats, "invoices.totals.sent"),
+            "billed": sum(stat(stats, "invoices.totals", {}).values())
+        },
+        "expenses": {
+            "count": stat(stats, "expenses.count"),
+            "total": stat(stats, "expenses.total"),
+            "tax": stat(stats, "expenses.tax")
         }
     }
 
+@router.post("/{user_id}/stats/reconcile")
+async def reconcile_user_stats(user_id: str):
+    """Rebuild the user's summary counters from their clients, jobs, invoices and expenses"""
+    db = get_database()
+    
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid user ID format"
+        )
+    
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 1})
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    stats = await rebuild_user_stats(db, user["_id"])
+    return document_response(stats)
+
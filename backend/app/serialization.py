@@ -0,0 +1,111 @@
+"""
+Shared BSON -> JSON serialization.
+
+Every router returns MongoDB documents through MongoJSONResponse, which
+encodes them with orjson in a single pass (ObjectId becomes its hex string,
+datetimes become ISO 8601 strings). MongoDB hands datetimes back without a
+timezone but every stored datetime is UTC, so they are written with an
+explicit +00:00 offset. Because a Response object is returned,
+FastAPI skips re-validating the data against the route's response_model;
+the model is still declared on the route for the OpenAPI docs.
+
+What the validation pass did for our output is reproduced cheaply by
+shape(): fill in the model's defaults and drop keys the model doesn't
+declare. The JSON matches what FastAPI produced before, except that:
+
+- datetimes carry an explicit ``+00:00`` offset (they used to be naive);
+- numbers are written as stored: an int in a float field stays ``75``
+  instead of becoming ``75.0`` (the same JSON number);
+- documents are trusted, not validated: a stored value of the wrong type
+  is passed through instead of failing the request.
+
+tests/test_serialization.py checks this against the old encoding for
+every response model.
+"""
+
+from functools import lru_cache
+from typing import AbstractSet, Any, Dict, FrozenSet, Optional, Tuple, Type
+
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any, sort_keys: bool = False) -> bytes:
+    """Serialize documents (or any JSON-like structure) to JSON bytes"""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(content, default=_default, option=option)
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response that encodes MongoDB documents directly with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _model_shape(model: Type[BaseModel]) -> Tuple[Optional[FrozenSet[str]], Dict[str, Any]]:
+    """(allowed keys or None if extras are allowed, defaults) for a response model"""
+    keys = set()
+    defaults: Dict[str, Any] = {}
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        keys.add(key)
+        if field.default is not PydanticUndefined and field.default_factory is None:
+            defaults[key] = field.default
+    allow_extra = model.model_config.get("extra") == "allow"
+    return (None if allow_extra else frozenset(keys)), defaults
+
+
+def shape(
+    doc: Optional[Dict[str, Any]],
+    model: Optional[Type[BaseModel]] = None,
+    fields: Optional[AbstractSet[str]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Give a trusted DB document the same keys response_model validation would,
+    restricted to ``fields`` (see app/projection.py) when given
+    """
+    if doc is None or model is None:
+        return doc
+    keys, defaults = _model_shape(model)
+    if fields is not None:
+        keys = fields if keys is None else keys & fields
+        defaults = {key: value for key, value in defaults.items() if key in fields}
+    if keys is None:
+        return {**defaults, **doc}
+    shaped = dict(defaults)
+    for key, value in doc.items():
+        if key in keys:
+            shaped[key] = value
+    return shaped
+
+
+def document_response(
+    content: Any,
+    model: Optional[Type[BaseModel]] = None,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+    fields: Optional[AbstractSet[str]] = None
+) -> MongoJSONResponse:
+    """Respond with one document or a list of documents, shaped to ``model``"""
+    if model is not None:
+        if isinstance(content, list):
+            content = [shape(doc, model, fields) for doc in content]
+        else:
+            content = shape(content, model, fields)
+    return MongoJSONResponse(content, status_code=status_code, headers=headers)
@@ -0,0 +1,168 @@
+"""
+Per-user DuckDB snapshots for the agent's SQL analysis.
+
+A snapshot is a DuckDB connection with the user's clients, expenses,
+invoices and jobs registered as tables (pandas DataFrames), so repeated
+questions don't re-read the user's whole dataset from Mongo. Each snapshot
+is tagged with the user's ``user_stats.dataVersion``, which every write
+bumps: a query first reads that one number and only reloads the snapshot
+when it changed.
+
+Snapshots are kept least recently used first within SQL_SNAPSHOT_CACHE_MB
+(measured as the DataFrames' memory). Evicted snapshots are only dropped,
+not closed, so a query that already holds one can still finish.
+
+The ``profile`` table is not part of the snapshot: profile edits don't bump
+dataVersion, and the caller has just fetched the user document anyway.
+"""
+
+import asyncio
+import functools
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import duckdb
+import pandas as pd
+from bson import ObjectId
+
+from .config import settings
+
+SNAPSHOT_TABLES = ("clients", "expenses", "invoices", "jobs")
+# Keywords a read-only query may start with
+QUERY_KEYWORDS = {"SELECT", "WITH", "FROM", "VALUES"}
+
+
+class Snapshot:
+    """One user's tables registered on a DuckDB connection"""
+
+    def __init__(self, version: int, frames: Dict[str, pd.DataFrame]):
+        self.version = version
+        self.con = duckdb.connect(database=':memory:')
+        self._lock = threading.Lock()
+        for name, frame in frames.items():
+            self.con.register(name, frame)
+        self.size = sum(int(frame.memory_usage(deep=True).sum()) for frame in frames.values())
+
+    def query(self, sql_query: str, profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Run a query against the snapshot plus the given profile. Blocking:
+        call it in a worker thread. Registered tables only exist on this one
+        connection, so concurrent queries on a snapshot take turns.
+        """
+        with self._lock:
+            self.con.register('profile', pd.DataFrame([profile]))
+            return self.con.execute(sql_query).df().to_dict(orient='records')
+
+
+class SnapshotCache:
+    """Memory-bounded LRU of per-user snapshots"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[ObjectId, Snapshot]" = OrderedDict()  # oldest first
+        self._size = 0
+        self._loading: Dict[Tuple[ObjectId, int], asyncio.Task] = {}
+        self._stats = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0}
+
+    async def get(self, db, user_id: ObjectId) -> Snapshot:
+        """The user's snapshot at their current data version, loaded if needed"""
+        stats = await db.user_stats.find_one({"_id": user_id}, {"dataVersion": 1})
+        version = (stats or {}).get("dataVersion", 0)
+
+        snapshot = self._entries.get(user_id)
+        if snapshot is not None and snapshot.version == version:
+            self._entries.move_to_end(user_id)
+            self._stats["hits"] += 1
+            return snapshot
+
+        # The load is a task of its own that every caller waits on, so a caller
+        # that is cancelled doesn't cancel it for the others
+        key = (user_id, version)
+        task = self._loading.get(key)
+        if task is not None:
+            self._stats["shared"] += 1
+        else:
+            self._stats["misses"] += 1
+            task = asyncio.ensure_future(self._load_and_store(db, user_id, version))
+            self._loading[key] = task
+            task.add_done_callback(functools.partial(self._load_done, key))
+        return await asyncio.shield(task)
+
+    async def _load_and_store(self, db, user_id: ObjectId, version: int) -> Snapshot:
+        snapshot = await self._load(db, user_id, version)
+        self._store(user_id, snapshot)
+        return snapshot
+
+    def _load_done(self, key: Tuple[ObjectId, int], task: asyncio.Task) -> None:
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        if not task.cancelled():
+            # Every caller may have gone away; don't let the task log "exception never retrieved"
+            task.exception()
+
+    async def _load(self, db, user_id: ObjectId, version: int) -> Snapshot:
+        # The version was read before these queries: a write landing meanwhile only
+        # makes the snapshot newer than its tag, and the next query reloads it
+        results = await asyncio.gather(*(
+            getattr(db, name).find({"userId": user_id}).to_list(length=None) for name in SNAPSHOT_TABLES
+        ))
+        # DuckDB can't register a DataFrame without columns: an empty collection
+        # becomes an empty table instead of failing every query
+        frames = {
+            name: pd.DataFrame(docs) if docs else pd.DataFrame({"_id": []})
+            for name, docs in zip(SNAPSHOT_TABLES, results)
+        }
+        return await asyncio.to_thread(Snapshot, version, frames)
+
+    def _store(self, user_id: ObjectId, snapshot: Snapshot) -> None:
+        current = self._entries.get(user_id)
+        if current is not None and current.version > snapshot.version:
+            # A newer snapshot was stored while this one loaded
+            return
+        if current is not None:
+            self._size -= self._entries.pop(user_id).size
+        self._entries[user_id] = snapshot
+        self._size += snapshot.size
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, oldest = self._entries.popitem(last=False)
+            self._size -= oldest.size
+            self._stats["evictions"] += 1
+
+    def invalidate(self, user_id: ObjectId) -> None:
+        """Drop a user's snapshot (e.g. when the user is deleted)"""
+        snapshot = self._entries.pop(user_id, None)
+        if snapshot is not None:
+            self._size -= snapshot.size
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for the health endpoint"""
+        return {**self._stats, "users": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+def is_read_only(sql_query: str) -> bool:
+    """
+    True for a single query (SELECT, WITH, FROM or VALUES). Snapshots are
+    shared between queries, so anything that could change them (CREATE,
+    INSERT, DROP, ATTACH, SET, ...) is refused, as is anything that doesn't
+    parse. DESCRIBE, SHOW, SUMMARIZE and PRAGMA parse as SELECT statements,
+    so the statement's first keyword is checked too.
+    """
+    try:
+        statements = duckdb.extract_statements(sql_query)
+        tokens = duckdb.tokenize(sql_query)
+    except duckdb.Error:
+        return False
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        return False
+    # Comments are not tokens; skip the parentheses of e.g. "(SELECT ...) UNION ..."
+    for position, token_type in tokens:
+        word = re.match(r"\w+|\S", sql_query[position:]).group().upper()
+        if token_type == duckdb.token_type.operator and word == "(":
+            continue
+        return token_type == duckdb.token_type.keyword and word in QUERY_KEYWORDS
+    return False
+
+
+sql_snapshots = SnapshotCache(settings.SQL_SNAPSHOT_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,90 @@
+"""
+Streaming responses for large list queries.
+
+Instead of loading the whole result into a list and serializing it in one go,
+the MongoDB cursor is iterated in batches and each batch of documents is
+written to the client as soon as it arrives, so memory stays flat and the
+first bytes go out right away.
+
+Two formats are supported:
+- NDJSON (one document per line), requested with ``Accept: application/x-ndjson``
+- a regular JSON array, streamed, requested with ``?stream=true``
+
+A streamed response contains every matching document from the cursor
+position onwards; ``limit``/``skip`` don't apply.
+"""
+
+from typing import AbstractSet, Any, AsyncIterator, Dict, Optional, Type
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from pymongo import ASCENDING
+
+from .pagination import keyset_query, sort_spec
+from .projection import to_projection
+from .serialization import dumps, shape
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 200
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def wants_stream(request: Request, stream: bool = False) -> bool:
+    """True if the client asked for a streamed (NDJSON or JSON array) response"""
+    return stream or wants_ndjson(request)
+
+
+async def _ndjson_chunks(cursor, batch_size: int, model, fields) -> AsyncIterator[bytes]:
+    batch = []
+    async for doc in cursor:
+        batch.append(dumps(shape(doc, model, fields)))
+        if len(batch) >= batch_size:
+            yield b"\n".join(batch) + b"\n"
+            batch = []
+    if batch:
+        yield b"\n".join(batch) + b"\n"
+
+
+async def _json_array_chunks(cursor, batch_size: int, model, fields) -> AsyncIterator[bytes]:
+    yield b"["
+    first = True
+    batch = []
+    async for doc in cursor:
+        batch.append(dumps(shape(doc, model, fields)))
+        if len(batch) >= batch_size:
+            yield (b"" if first else b",") + b",".join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield (b"" if first else b",") + b",".join(batch)
+    yield b"]"
+
+
+def stream_find(
+    request: Request,
+    collection,
+    query: Dict[str, Any],
+    *,
+    cursor: Optional[str] = None,
+    sort_field: Optional[str] = None,
+    direction: int = ASCENDING,
+    model: Optional[Type[BaseModel]] = None,
+    fields: Optional[AbstractSet[str]] = None,
+    batch_size: int = STREAM_BATCH_SIZE
+) -> StreamingResponse:
+    """
+    Stream every document matching ``query`` in the same order as the paginated
+    list, each one shaped to ``model`` (and ``fields``) like the non-streamed response
+    """
+    find = (
+        collection.find(keyset_query(query, cursor, sort_field, direction), to_projection(fields))
+        .sort(sort_spec(sort_field, direction))
+        .batch_size(batch_size)
+    )
+    if wants_ndjson(request):
+        return StreamingResponse(_ndjson_chunks(find, batch_size, model, fields), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(_json_array_chunks(find, batch_size, model, fields), media_type="application/json")
@@ -0,0 +1,55 @@
+"""
+Server-side totals for the user and client summary endpoints.
+
+All the collections a summary needs are combined with ``$unionWith`` and
+grouped by (collection, status) in a single aggregation, so a summary costs
+one round trip and no documents are pulled into Python just to be counted.
+"""
+
+from typing import Any, Dict, Iterable
+
+
+def _tagged(collection: str, match: Dict[str, Any]):
+    """Pipeline stages selecting ``match`` and tagging each row with its collection"""
+    return [
+        {"$match": match},
+        {"$project": {"collection": {"$literal": collection}, "status": 1, "total": 1}},
+    ]
+
+
+async def status_totals(db, match: Dict[str, Any], collections: Iterable[str]) -> Dict[str, Dict[Any, Dict[str, Any]]]:
+    """
+    Count the documents matching ``match`` in each collection, by status, and
+    sum their ``total``. Returns ``{collection: {status: {"count", "total"}}}``;
+    collections without matching documents map to an empty dict.
+    """
+    first, *others = collections
+    pipeline = _tagged(first, match)
+    for name in others:
+        pipeline.append({"$unionWith": {"coll": name, "pipeline": _tagged(name, match)}})
+    pipeline.append({
+        "$group": {
+            "_id": {"collection": "$collection", "status": "$status"},
+            "count": {"$sum": 1},
+            "total": {"$sum": "$total"},
+        }
+    })
+
+    totals: Dict[str, Dict[Any, Dict[str, Any]]] = {name: {} for name in (first, *others)}
+    async for row in db.get_collection(first).aggregate(pipeline):
+        key = row["_id"]
+        # A missing status and a null one group separately; both report as None
+        by_status = totals[key["collection"]].setdefault(key.get("status"), {"count": 0, "total": 0})
+        by_status["count"] += row["count"]
+        by_status["total"] += row["total"]
+    return totals
+
+
+def count(by_status: Dict[Any, Dict[str, Any]], *statuses) -> int:
+    """Documents with any of ``statuses`` (all documents if none given)"""
+    return sum(v["count"] for s, v in by_status.items() if not statuses or s in statuses)
+
+
+def amount(by_status: Dict[Any, Dict[str, Any]], *statuses) -> Any:
+    """Sum of ``total`` over ``statuses`` (all documents if none given)"""
+    return sum(v["total"] for s, v in by_status.items() if not statuses or s in statuses)
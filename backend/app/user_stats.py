@@ -0,0 +1,158 @@
+"""
+Per-user summary counters.
+
+Each user has one ``user_stats`` document (``_id`` = user id) holding the
+numbers the dashboard and summary endpoints show: client count, job and
+invoice counts by status, invoice totals by status and expense totals.
+Every create/update/delete in the routers calls record_change() with the
+document before and after the write, which applies the difference with one
+``$inc``. That is a second write, not part of the source write: a request
+that dies in between leaves the counters off until the next reconcile.
+Updates derive the after-state from the before-state and the fields they
+set, so a concurrent write to the same document is never counted twice.
+Reading a summary is then one document fetch.
+
+``dataVersion`` is bumped on every change to any of the user's documents,
+so caches built from the user's data can tell when they are stale.
+
+rebuild_user_stats() recomputes a user's document from the source
+collections; it backs the reconcile endpoint and the initial backfill.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from .summaries import status_totals
+
+
+def _status_key(status: Any) -> str:
+    """Status as a field name (documents without a usable status count as 'unknown')"""
+    if isinstance(status, str) and status and "." not in status and not status.startswith("$"):
+        return status
+    return "unknown"
+
+
+def _number(value: Any):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+def contribution(kind: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """What one document adds to its owner's stats, as ``{dotted path: amount}``"""
+    if kind == "clients":
+        return {"clients.count": 1}
+    if kind == "jobs":
+        return {"jobs.count": 1, f"jobs.byStatus.{_status_key(doc.get('status'))}": 1}
+    if kind == "invoices":
+        key = _status_key(doc.get("status"))
+        return {
+            "invoices.count": 1,
+            f"invoices.byStatus.{key}": 1,
+            f"invoices.totals.{key}": _number(doc.get("total")),
+        }
+    if kind == "expenses":
+        return {
+            "expenses.count": 1,
+            "expenses.total": _number(doc.get("totalAmount")),
+            "expenses.tax": _number(doc.get("taxAmount")),
+        }
+    raise ValueError(f"Unknown stats kind: {kind}")
+
+
+async def record_change(
+    db,
+    kind: str,
+    before: Optional[Dict[str, Any]] = None,
+    after: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Update the owners' stats for a write: ``before`` is None for an insert,
+    ``after`` is None for a delete. Moves the contribution between users if
+    the document's userId changed.
+    """
+    deltas: Dict[ObjectId, Dict[str, Any]] = {}
+    for doc, sign in ((before, -1), (after, 1)):
+        if not doc or not isinstance(doc.get("userId"), ObjectId):
+            continue
+        delta = deltas.setdefault(doc["userId"], {})
+        for path, amount in contribution(kind, doc).items():
+            delta[path] = delta.get(path, 0) + sign * amount
+
+    for user_id, delta in deltas.items():
+        increments = {path: amount for path, amount in delta.items() if amount}
+        increments["dataVersion"] = 1
+        await db.user_stats.update_one(
+            {"_id": user_id},
+            {"$inc": increments, "$set": {"updatedAt": datetime.utcnow()}},
+            upsert=True
+        )
+
+
+async def rebuild_user_stats(db, user_id: ObjectId) -> Dict[str, Any]:
+    """
+    Recompute a user's stats from the source collections and store them.
+    Writes that land while the rebuild runs may be missed; run it again (or
+    reconcile later) if the user is busy.
+    """
+    totals = await status_totals(db, {"userId": user_id}, ["clients", "jobs", "invoices"])
+
+    stats: Dict[str, Any] = {
+        "clients": {"count": sum(v["count"] for v in totals["clients"].values())},
+        "jobs": {"count": 0, "byStatus": {}},
+        "invoices": {"count": 0, "byStatus": {}, "totals": {}},
+    }
+    for status, row in totals["jobs"].items():
+        key = _status_key(status)
+        stats["jobs"]["count"] += row["count"]
+        stats["jobs"]["byStatus"][key] = stats["jobs"]["byStatus"].get(key, 0) + row["count"]
+    for status, row in totals["invoices"].items():
+        key = _status_key(status)
+        stats["invoices"]["count"] += row["count"]
+        stats["invoices"]["byStatus"][key] = stats["invoices"]["byStatus"].get(key, 0) + row["count"]
+        stats["invoices"]["totals"][key] = stats["invoices"]["totals"].get(key, 0) + row["total"]
+
+    expenses = await db.expenses.aggregate([
+        {"$match": {"userId": user_id}},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "total": {"$sum": "$totalAmount"},
+            "tax": {"$sum": "$taxAmount"},
+        }},
+    ]).to_list(length=None)
+    expense_row = expenses[0] if expenses else {}
+    stats["expenses"] = {
+        "count": expense_row.get("count", 0),
+        "total": expense_row.get("total", 0),
+        "tax": expense_row.get("tax", 0),
+    }
+
+    stats["updatedAt"] = datetime.utcnow()
+    return await db.user_stats.find_one_and_update(
+        {"_id": user_id},
+        {"$set": stats, "$inc": {"dataVersion": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def get_user_stats(db, user_id: ObjectId) -> Dict[str, Any]:
+    """A user's stats document, built on first use"""
+    stats = await db.user_stats.find_one({"_id": user_id})
+    if stats is None:
+        stats = await rebuild_user_stats(db, user_id)
+    return stats
+
+
+def stat(stats: Dict[str, Any], path: str, default: Any = 0) -> Any:
+    """Read a dotted path from a stats document, e.g. ``invoices.byStatus.paid``"""
+    value: Any = stats
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
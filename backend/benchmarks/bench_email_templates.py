@@ -0,0 +1,252 @@
+"""
+Email template rendering benchmark.
+
+Renders the invoice email (HTML + plain text) for invoices with a growing
+number of line items and compares it with the email service's rendering
+before the templates (whole-email f-strings with the rows appended by
+repeated string concatenation). Both must produce the same bodies.
+
+Run from backend/:
+    python -m benchmarks.bench_email_templates [--items 10,1000,5000] [--repeat 5]
+"""
+
+import argparse
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.email_templates import render_invoice_email  # noqa: E402
+
+BUSINESS = {"businessName": "Acme Plumbing", "email": "billing@acme.test"}
+
+
+def make_invoice(items: int) -> dict:
+    return {
+        "invoiceNumber": "INV-1001",
+        "dueDate": datetime(2026, 3, 1),
+        "total": items * 42.5,
+        "clientName": "Jane Client",
+        "lineItems": [
+            {"description": f"Line item {i}", "quantity": 1 + i % 5, "rate": 42.5, "amount": 42.5}
+            for i in range(items)
+        ],
+    }
+
+
+# ----- baseline: the email service's rendering before the templates -----
+
+def legacy_html(invoice_data: dict, business_info: dict) -> str:
+    """The email service's HTML body before the templates (rows appended with +=)"""
+    
+    items_html = ""
+    for item in invoice_data.get("lineItems", []):
+        item_total = float(item.get("amount", 0))
+        items_html += f"""
+        <tr>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; font-size: 14px;">{item.get('description', '')}</td>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: center; font-size: 14px;">{item.get('quantity', 1)}</td>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: right; font-size: 14px;">${float(item.get('rate', 0)):.2f}</td>
+            <td style="padding: 12px; border-bottom: 1px solid #e5e7eb; text-align: right; font-size: 14px; font-weight: 600;">${item_total:.2f}</td>
+        </tr>
+        """
+    
+    due_date = invoice_data.get("dueDate", "")
+    if due_date:
+        try:
+            if isinstance(due_date, str):
+                due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00')).strftime("%B %d, %Y")
+            elif isinstance(due_date, datetime):
+                due_date = due_date.strftime("%B %d, %Y")
+        except ValueError:
+            due_date = str(due_date)
+    
+    client_name = invoice_data.get("clientName") or invoice_data.get("to", {}).get("name") or "Valued Customer"
+    invoice_number = invoice_data.get("invoiceNumber", "")
+    total_amount = float(invoice_data.get("total", 0))
+    business_name = business_info.get("businessName", "Your Business")
+    business_email = business_info.get("email", "")
+    
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    </head>
+    <body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #f3f4f6;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 40px 20px;">
+            <!-- Header -->
+            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 16px 16px 0 0; padding: 32px; text-align: center;">
+                <h1 style="color: white; margin: 0; font-size: 28px; font-weight: 700;">Invoice #{invoice_number}</h1>
+                <p style="color: rgba(255,255,255,0.9); margin: 8px 0 0 0; font-size: 16px;">from {business_name}</p>
+            </div>
+            
+            <!-- Main Content -->
+            <div style="background: white; padding: 32px; border-radius: 0 0 16px 16px; box-shadow: 0 4px 6px -1px rgba(0,0,0,0.1);">
+                <!-- Greeting -->
+                <p style="font-size: 16px; color: #374151; margin: 0 0 24px 0;">
+                    Dear <strong>{client_name}</strong>,
+                </p>
+                <p style="font-size: 14px; color: #6b7280; margin: 0 0 32px 0; line-height: 1.6;">
+                    Please find your invoice details below. We appreciate your business and look forward to serving you again.
+                </p>
+                
+                <!-- Invoice Summary Box -->
+                <div style="background: #f9fafb; border-radius: 12px; padding: 24px; margin-bottom: 32px;">
+                    <div style="display: flex; justify-content: space-between; margin-bottom: 16px;">
+                        <div>
+                            <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Invoice Number</p>
+                            <p style="margin: 4px 0 0 0; font-size: 18px; font-weight: 600; color: #111827;">#{invoice_number}</p>
+                        </div>
+                        <div style="text-align: right;">
+                            <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Amount Due</p>
+                            <p style="margin: 4px 0 0 0; font-size: 24px; font-weight: 700; color: #667eea;">${total_amount:.2f}</p>
+                        </div>
+                    </div>
+                    <div style="border-top: 1px solid #e5e7eb; padding-top: 16px; margin-top: 16px;">
+                        <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Due Date</p>
+                        <p style="margin: 4px 0 0 0; font-size: 16px; font-weight: 500; color: #111827;">{due_date}</p>
+                    </div>
+                </div>
+                
+                <!-- Items Table -->
+                <table style="width: 100%; border-collapse: collapse; margin-bottom: 24px;">
+                    <thead>
+                        <tr style="background: #f3f4f6;">
+                            <th style="padding: 12px; text-align: left; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Description</th>
+                            <th style="padding: 12px; text-align: center; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Qty</th>
+                            <th style="padding: 12px; text-align: right; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Rate</th>
+                            <th style="padding: 12px; text-align: right; font-size: 12px; font-weight: 600; color: #6b7280; text-transform: uppercase; letter-spacing: 0.5px;">Total</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        {items_html}
+                    </tbody>
+                    <tfoot>
+                        <tr>
+                            <td colspan="3" style="padding: 16px 12px; text-align: right; font-size: 16px; font-weight: 600; color: #374151;">Total Amount:</td>
+                            <td style="padding: 16px 12px; text-align: right; font-size: 20px; font-weight: 700; color: #667eea;">${total_amount:.2f}</td>
+                        </tr>
+                    </tfoot>
+                </table>
+                
+                <!-- Payment Info -->
+                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; padding: 24px; text-align: center; margin-top: 32px;">
+                    <p style="margin: 0; font-size: 14px; color: rgba(255,255,255,0.9);">Payment is due by</p>
+                    <p style="margin: 8px 0 0 0; font-size: 20px; font-weight: 700; color: white;">{due_date}</p>
+                </div>
+                
+                <!-- Footer -->
+                <div style="margin-top: 32px; padding-top: 24px; border-top: 1px solid #e5e7eb; text-align: center;">
+                    <p style="margin: 0; font-size: 14px; color: #6b7280;">
+                        Thank you for your business!
+                    </p>
+                    <p style="margin: 8px 0 0 0; font-size: 12px; color: #9ca3af;">
+                        {business_name} • {business_email}
+                    </p>
+                </div>
+            </div>
+            
+            <!-- Email Footer -->
+            <div style="text-align: center; padding: 24px;">
+                <p style="margin: 0; font-size: 12px; color: #9ca3af;">
+                    This invoice was sent via PersonalCFO
+                </p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+
+def legacy_plain(invoice_data: dict, business_info: dict) -> str:
+    """The email service's plain-text body before the templates"""
+    
+    items_text = ""
+    for item in invoice_data.get("lineItems", []):
+        item_total = float(item.get("amount", 0))
+        items_text += f"  • {item.get('description', '')} (x{item.get('quantity', 1)}) - ${item_total:.2f}\n"
+    
+    due_date = invoice_data.get("dueDate", "")
+    if due_date:
+        try:
+            if isinstance(due_date, str):
+                due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00')).strftime("%B %d, %Y")
+            elif isinstance(due_date, datetime):
+                due_date = due_date.strftime("%B %d, %Y")
+        except ValueError:
+            due_date = str(due_date)
+    
+    client_name = invoice_data.get("clientName") or invoice_data.get("to", {}).get("name") or "Valued Customer"
+    invoice_number = invoice_data.get("invoiceNumber", "")
+    total_amount = float(invoice_data.get("total", 0))
+    business_name = business_info.get("businessName", "Your Business")
+    business_email = business_info.get("email", "")
+    
+    return f"""
+INVOICE #{invoice_number}
+from {business_name}
+
+=====================================
+
+Dear {client_name},
+
+Please find your invoice details below.
+
+INVOICE DETAILS
+---------------
+Invoice Number: #{invoice_number}
+Amount Due: ${total_amount:.2f}
+Due Date: {due_date}
+
+ITEMS
+-----
+{items_text}
+TOTAL: ${total_amount:.2f}
+
+=====================================
+
+Payment is due by {due_date}
+
+Thank you for your business!
+
+{business_name}
+{business_email}
+
+---
+This invoice was sent via PersonalCFO
+    """
+
+
+def legacy_render(invoice: dict) -> tuple:
+    """(plain text, HTML), as render_invoice_email returns them"""
+    return legacy_plain(invoice, BUSINESS), legacy_html(invoice, BUSINESS)
+
+
+def best_ms(fn, repeat: int) -> float:
+    runs = timeit.repeat(fn, number=1, repeat=repeat)
+    return min(runs) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", default="10,1000,5000", help="comma-separated line-item counts")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'items':>7}  {'render (ms)':>12}  {'legacy (ms)':>12}  {'html KB':>8}")
+    for count in (int(n) for n in args.items.split(",")):
+        invoice = make_invoice(count)
+        rendered = render_invoice_email(invoice, BUSINESS)
+        if rendered != legacy_render(invoice):
+            sys.exit(f"{count} items: rendered email differs from the legacy rendering")
+        render = best_ms(lambda: render_invoice_email(invoice, BUSINESS), args.repeat)
+        legacy = best_ms(lambda: legacy_render(invoice), args.repeat)
+        size = len(rendered[1]) / 1024
+        print(f"{count:>7}  {render:>12.2f}  {legacy:>12.2f}  {size:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Invoice PDF rendering benchmark and regression check.
+
+Renders a fixed set of invoices with create_pdf_document and records, per
+case, the best wall time over --repeat runs, the memory the rendering
+added to the process and the size and page count of the output. Each case
+runs in its own subprocess so its memory isn't polluted by the cases
+before it.
+
+Absolute timings only mean something on the machine that recorded them,
+so each subprocess also times a fixed pure-Python calibration workload and
+the check compares ``relative_time`` (case time / calibration time); the
+memory check compares ``rss_growth_mb`` (peak RSS minus RSS once the PDF
+code is imported). Results are compared with benchmarks/pdf_baseline.json
+and any case that is slower, uses more memory or is bigger on disk than its
+baseline by more than the allowed threshold is reported; with --check the
+script then exits 1. Timings on a busy or shared machine can swing more than
+the thresholds allow, so only use --check where runs are quiet.
+
+Run from backend/:
+    python -m benchmarks.bench_pdf                     # compare with the baseline
+    python -m benchmarks.bench_pdf --check             # ... and exit 1 on a regression
+    python -m benchmarks.bench_pdf --update-baseline   # record a new baseline
+    python -m benchmarks.bench_pdf --cases items_1,items_50 --max-time-regression 0.5
+"""
+
+import argparse
+import gc
+import json
+import re
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "pdf_baseline.json"
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+USER = {
+    "businessName": "Acme Plumbing & Heating",
+    "businessAddress": "12 Main Street, Springfield",
+    "businessPhone": "(555) 010-2000",
+    "businessEmail": "billing@acme.test",
+}
+CLIENT = {"name": "Jane Client", "email": "jane@client.test", "address": "99 Elm Road, Shelbyville"}
+
+LONG_TEXT = (
+    "Replaced the corroded section of the main supply line, including shut-off valve, "
+    "fittings and pressure test; removed debris and restored the finished wall surface. "
+) * 4
+
+
+def _items(count: int, description, rate: float = 42.5) -> List[Dict[str, Any]]:
+    return [
+        {"description": description(i), "quantity": 1 + i % 4, "rate": rate, "amount": rate * (1 + i % 4)}
+        for i in range(count)
+    ]
+
+
+def _invoice(items: List[Dict[str, Any]], **extra) -> Dict[str, Any]:
+    return {
+        "invoiceNumber": "INV-1001",
+        "issueDate": datetime(2026, 2, 1),
+        "dueDate": datetime(2026, 3, 1),
+        "status": "sent",
+        "invoiceTitle": "Kitchen renovation",
+        "invoiceDescription": "Plumbing work for the kitchen renovation",
+        "lineItems": items,
+        **extra,
+    }
+
+
+def _split(i: int) -> str:
+    # Alternates between the services and materials sections of the PDF
+    return f"Labor hour {i}" if i % 2 else f"Copper pipe 15mm, lot {i}"
+
+
+CASES = {
+    "items_1": lambda: _invoice(_items(1, lambda i: "Labor - emergency call-out")),
+    "items_50": lambda: _invoice(_items(50, _split)),
+    "items_500": lambda: _invoice(_items(500, _split)),
+    "items_5000": lambda: _invoice(_items(5000, _split)),
+    "long_descriptions": lambda: _invoice(_items(60, lambda i: f"{_split(i)}: {LONG_TEXT}")),
+    "services_only": lambda: _invoice(_items(200, lambda i: f"Service visit {i}")),
+    "materials_only": lambda: _invoice(_items(200, lambda i: f"Fitting type {i}")),
+    "manual_total": lambda: _invoice(_items(50, _split), total=99999.99),
+}
+
+METRICS = ("relative_time", "rss_growth_mb", "size_bytes")
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _calibration() -> None:
+    # Interpreter-bound work (objects, dicts, string formatting) like the
+    # layout code, but independent of it so the reference never changes
+    rows = []
+    for i in range(20000):
+        row = {"description": f"Item {i}", "quantity": i % 7, "rate": i * 0.25}
+        rows.append(f"{row['description']}:{row['quantity'] * row['rate']:.2f}")
+    "".join(rows).split(":")
+
+
+def _best_seconds(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_case(name: str, repeat: int) -> Dict[str, Any]:
+    """Measure one case in this process"""
+    from app.pdf_generator import create_pdf_document
+
+    invoice = CASES[name]()
+    base_rss = _peak_rss_mb()
+    output = {}
+
+    def render():
+        output["pdf"] = create_pdf_document({"invoice": invoice}, USER, CLIENT).getvalue()
+
+    best = _best_seconds(render, repeat)
+    pdf = output["pdf"]
+    peak_rss = _peak_rss_mb()
+    # After the memory reading: the calibration allocates too. Without the
+    # collector, so its time doesn't depend on what the render left on the heap
+    gc.collect()
+    gc.disable()
+    try:
+        calibration = _best_seconds(_calibration, 15)
+    finally:
+        gc.enable()
+    return {
+        "wall_ms": round(best * 1000, 1),
+        "calibration_ms": round(calibration * 1000, 1),
+        "relative_time": round(best / calibration, 3),
+        "peak_rss_mb": peak_rss,
+        "rss_growth_mb": round(peak_rss - base_rss, 1),
+        "size_bytes": len(pdf),
+        "pages": len(re.findall(rb"/Type\s*/Page\b(?!s)", pdf)),
+    }
+
+
+def measure(name: str, repeat: int) -> Dict[str, Any]:
+    """Measure one case in a fresh subprocess"""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_pdf", "--run-case", name, "--repeat", str(repeat)],
+        cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    limits: Dict[str, float],
+    min_deltas: Dict[str, float]
+) -> List[str]:
+    """
+    Regressions beyond the allowed fraction, as messages. ``min_deltas``
+    holds, per metric, the smallest absolute increase that counts (timer and
+    allocator noise); the relative time's is in milliseconds of this run.
+    """
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in METRICS:
+            if not base.get(metric):
+                continue
+            change = result[metric] / base[metric] - 1
+            delta = result[metric] - base[metric]
+            if metric == "relative_time":
+                delta *= result["calibration_ms"]
+            if delta < min_deltas.get(metric, 0):
+                continue
+            if change > limits[metric]:
+                failures.append(
+                    f"{name}: {metric} {result[metric]} vs baseline {base[metric]} "
+                    f"(+{change:.0%}, allowed +{limits[metric]:.0%})"
+                )
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", default=",".join(CASES), help="comma-separated case names")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best wall time is kept)")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case regressed")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--max-time-regression", type=float, default=0.25, help="allowed relative time increase (0.25 = +25%%)")
+    parser.add_argument("--min-time-delta-ms", type=float, default=5, help="ignore time increases smaller than this")
+    parser.add_argument("--max-rss-regression", type=float, default=0.20, help="allowed RSS growth increase")
+    parser.add_argument("--min-rss-delta-mb", type=float, default=2, help="ignore RSS growth increases smaller than this")
+    parser.add_argument("--max-size-regression", type=float, default=0.10, help="allowed output size increase")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.repeat)))
+        return 0
+
+    names = [name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = {}
+    print(f"{'case':<18} {'wall ms':>9} {'relative':>9} {'RSS +MB':>8} {'size KB':>9} {'pages':>6}   baseline relative")
+    for name in names:
+        result = results[name] = measure(name, args.repeat)
+        base = baseline.get(name, {}).get("relative_time", "-")
+        print(f"{name:<18} {result['wall_ms']:>9} {result['relative_time']:>9} {result['rss_growth_mb']:>8} "
+              f"{result['size_bytes'] / 1024:>9.1f} {result['pages']:>6}   {base}")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("No baseline yet; run with --update-baseline to record one.")
+        return 0
+
+    failures = compare(results, baseline, {
+        "relative_time": args.max_time_regression,
+        "rss_growth_mb": args.max_rss_regression,
+        "size_bytes": args.max_size_regression,
+    }, {
+        "relative_time": args.min_time_delta_ms,
+        "rss_growth_mb": args.min_rss_delta_mb,
+    })
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        return 1 if args.check else 0
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Shared test setup.
+
+Tests run against an in-memory MongoDB (mongomock-motor); install the
+extra packages with ``pip install -r requirements-dev.txt`` and run
+``python -m pytest`` from backend/.
+"""
+
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Settings are read at import time
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("PDF_CACHE_DIR", tempfile.mkdtemp(prefix="pdf-cache-test-"))
+os.environ.setdefault("PDF_WORKERS", "0")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def mongo():
+    """A fresh in-memory database wired into app.database.db"""
+    from mongomock_motor import AsyncMongoMockClient
+    from app.database import db
+
+    db.client = AsyncMongoMockClient()
+    db.db = db.client["test"]
+    yield db
+    db.client = None
+    db.db = None
+
+
+@pytest.fixture
+def union_with(monkeypatch):
+    """Teach mongomock the $unionWith stage (not implemented upstream)"""
+    from mongomock import aggregate
+
+    def handle(in_collection, database, options):
+        if isinstance(options, str):
+            options = {"coll": options}
+        other = database.get_collection(options["coll"])
+        return list(in_collection) + list(other.aggregate(options.get("pipeline", [])))
+
+    monkeypatch.setitem(aggregate._PIPELINE_HANDLERS, "$unionWith", handle)
+
+
+@pytest.fixture
+def bulk_updates(monkeypatch):
+    """Let mongomock's bulk_write take pymongo 4.18's UpdateOne (which passes ``sort``)"""
+    from mongomock.collection import BulkOperationBuilder
+
+    add_update = BulkOperationBuilder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        assert sort is None, "mongomock can't sort updates"
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(BulkOperationBuilder, "add_update", add_update_without_sort)
+
+
+class Inbox:
+    """aiosmtpd handler that keeps what it receives and can refuse recipients or messages"""
+
+    def __init__(self):
+        self.messages = []
+        self.refused_recipients = set()
+        self.refuse_data = False
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refused_recipients:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.refuse_data:
+            return "554 Message rejected"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """A local SMTP server (no TLS or login) that app.email_service sends to"""
+    from aiosmtpd.controller import Controller
+    from app import email_service
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    inbox = Inbox()
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(email_service, "EMAIL_HOST", "127.0.0.1")
+    monkeypatch.setattr(email_service, "EMAIL_PORT", port)
+    monkeypatch.setattr(email_service, "EMAIL_USER", "billing@example.com")
+    monkeypatch.setattr(email_service, "EMAIL_PASSWORD", None)
+    monkeypatch.setattr(email_service, "EMAIL_USE_TLS", False)
+    yield inbox
+    email_service.smtp_pool.close()
+    controller.stop()
@@ -0,0 +1,124 @@
+"""POST /invoices/reminders/bulk and its campaign report"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.email_outbox import process_next
+from app.routes import invoices
+
+USER_ID = ObjectId()
+
+
+def _invoice(number, client_id, status="overdue", due_days_ago=30, user_id=USER_ID):
+    return {
+        "_id": ObjectId(), "userId": user_id, "clientId": client_id, "invoiceNumber": number,
+        "status": status, "total": 100, "dueDate": datetime.utcnow() - timedelta(days=due_days_ago),
+    }
+
+
+@pytest.fixture
+def seeded(mongo):
+    jane, nomail, bounce, gone = ObjectId(), ObjectId(), ObjectId(), ObjectId()
+    docs = {
+        "jane": _invoice("INV-1", jane),
+        "nomail": _invoice("INV-2", nomail),
+        "bounce": _invoice("INV-3", bounce),
+        "gone": _invoice("INV-4", gone),
+        # Don't qualify for the default filter
+        "paid": _invoice("INV-5", jane, status="paid"),
+        "recent": _invoice("INV-6", jane, due_days_ago=2),
+        "other_user": _invoice("INV-7", jane, user_id=ObjectId()),
+    }
+
+    async def seed():
+        await mongo.db.users.insert_one({"_id": USER_ID, "businessName": "Acme Roofing", "businessEmail": "owner@example.com"})
+        await mongo.db.clients.insert_many([
+            {"_id": jane, "name": "Jane", "email": "jane@example.com"},
+            {"_id": nomail, "name": "No Mail"},
+            {"_id": bounce, "name": "Bounce", "email": "bounce@example.com"},
+        ])
+        await mongo.db.invoices.insert_many(list(docs.values()))
+    asyncio.run(seed())
+
+    app = FastAPI()
+    app.include_router(invoices.router)
+    return TestClient(app), {name: str(doc["_id"]) for name, doc in docs.items()}
+
+
+def _bulk(client, **body):
+    response = client.post("/invoices/reminders/bulk", json={"userId": str(USER_ID), **body})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _by_number(report):
+    return {result["invoiceNumber"]: result for result in report["results"]}
+
+
+def _drain(mongo):
+    async def run():
+        while await process_next(mongo.db):
+            pass
+    asyncio.run(run())
+
+
+def test_partial_failures_are_reported_per_invoice(mongo, smtp_server, seeded):
+    client, ids = seeded
+    smtp_server.refused_recipients.add("bounce@example.com")
+
+    report = _bulk(client, minDaysOverdue=7)
+    assert (report["matched"], report["queued"], report["skipped"]) == (4, 2, 2)
+    results = _by_number(report)
+    assert {number: result["status"] for number, result in results.items()} == {
+        "INV-1": "queued", "INV-2": "skipped", "INV-3": "queued", "INV-4": "skipped",
+    }
+    assert results["INV-2"]["reason"] == "Client email not found"
+    assert results["INV-4"]["reason"] == "Client not found"
+
+    # One recipient is refused and waits for a retry; the other reminder still goes out
+    _drain(mongo)
+    assert [message.rcpt_tos for message in smtp_server.messages] == [["jane@example.com"]]
+    campaign = client.get(f"/invoices/reminders/bulk/{report['campaignId']}").json()
+    assert campaign["counts"] == {"sent": 1, "pending": 1}
+    retrying = next(email for email in campaign["results"] if email["status"] == "pending")
+    assert (retrying["to"], retrying["invoiceId"], retrying["attempts"]) == ("bounce@example.com", ids["bounce"], 1)
+    assert "550" in retrying["lastError"]
+
+
+def test_non_qualifying_invoices_are_left_out(mongo, seeded):
+    client, ids = seeded
+    report = _bulk(client, invoiceIds=[ids["jane"], ids["paid"], ids["recent"], ids["other_user"], str(ObjectId())], minDaysOverdue=7)
+    assert report["matched"] == report["queued"] == 1
+    assert [result["invoiceId"] for result in report["results"]] == [ids["jane"]]
+    queued = asyncio.run(mongo.db.email_outbox.distinct("invoiceId"))
+    assert queued == [ObjectId(ids["jane"])]
+
+
+def test_duplicate_ids_queue_one_reminder(mongo, seeded):
+    client, ids = seeded
+    report = _bulk(client, invoiceIds=[ids["jane"], ids["jane"], ids["bounce"], ids["jane"]])
+    assert (report["matched"], report["queued"]) == (2, 2)
+    assert sorted(result["invoiceNumber"] for result in report["results"]) == ["INV-1", "INV-3"]
+    assert asyncio.run(mongo.db.email_outbox.count_documents({"invoiceId": ObjectId(ids["jane"])})) == 1
+
+
+def test_pending_reminder_is_not_queued_twice(mongo, seeded):
+    client, ids = seeded
+    _bulk(client, invoiceIds=[ids["jane"]])
+    again = _bulk(client, invoiceIds=[ids["jane"]])
+    assert again["queued"] == 0
+    assert again["results"][0]["reason"] == "Reminder already queued"
+    assert asyncio.run(mongo.db.email_outbox.count_documents({})) == 1
+
+
+def test_invalid_ids_and_unknown_users_are_rejected(seeded):
+    client, _ = seeded
+    response = client.post("/invoices/reminders/bulk", json={"userId": str(USER_ID), "invoiceIds": ["nope"]})
+    assert response.status_code == 400
+    response = client.post("/invoices/reminders/bulk", json={"userId": str(ObjectId())})
+    assert response.status_code == 404
@@ -0,0 +1,248 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app import email_outbox, email_service
+from app.config import settings
+from app.email_outbox import _claim, enqueue_email, process_next, retry_delay
+
+
+async def _entry(db, entry_id):
+    return await db.email_outbox.find_one({"_id": entry_id})
+
+
+async def _seed_invoice(db):
+    user_id, client_id = ObjectId(), ObjectId()
+    await db.users.insert_one({"_id": user_id, "businessName": "Acme Roofing", "businessEmail": "owner@example.com"})
+    await db.clients.insert_one({"_id": client_id, "name": "Jane", "email": "jane@example.com"})
+    invoice_id = ObjectId()
+    await db.invoices.insert_one({
+        "_id": invoice_id, "userId": user_id, "clientId": client_id, "invoiceNumber": "INV-7",
+        "status": "overdue", "total": 120, "dueDate": datetime(2026, 2, 1),
+    })
+    return invoice_id
+
+
+def test_claim_takes_each_due_entry_once(mongo):
+    async def scenario():
+        entry_id = await enqueue_email(mongo, "reminder", ObjectId(), "a@example.com")
+        later = await enqueue_email(mongo, "reminder", ObjectId(), "b@example.com")
+        await mongo.email_outbox.update_one(
+            {"_id": later}, {"$set": {"nextAttemptAt": datetime.utcnow() + timedelta(hours=1)}}
+        )
+        first = await _claim(mongo)
+        second = await _claim(mongo)
+        return entry_id, first, second
+
+    entry_id, first, second = asyncio.run(scenario())
+    assert first["_id"] == entry_id
+    assert first["status"] == "sending"
+    assert first["attempts"] == 1
+    assert first["leaseExpiresAt"] > datetime.utcnow()
+    # Claimed by the first worker, and the other entry isn't due yet
+    assert second is None
+
+
+def test_expired_lease_is_claimed_again(mongo):
+    async def scenario():
+        entry_id = await enqueue_email(mongo, "reminder", ObjectId(), "a@example.com")
+        await _claim(mongo)
+        await mongo.email_outbox.update_one(
+            {"_id": entry_id}, {"$set": {"leaseExpiresAt": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        return await _claim(mongo)
+
+    entry = asyncio.run(scenario())
+    assert entry["status"] == "sending"
+    assert entry["attempts"] == 2
+
+
+def test_retry_delay_backs_off_exponentially():
+    base = settings.EMAIL_RETRY_BASE_SECONDS
+    for attempts in (1, 2, 3):
+        delay = retry_delay(attempts)
+        assert base * 2 ** (attempts - 1) * 0.8 <= delay <= base * 2 ** (attempts - 1) * 1.2
+    assert retry_delay(50) <= email_outbox.MAX_RETRY_DELAY_SECONDS * 1.2
+
+
+def test_failed_send_is_rescheduled(mongo, monkeypatch):
+    async def failing_deliver(db, entry):
+        return {"success": False, "error": "451 try again later"}
+
+    monkeypatch.setattr(email_outbox, "deliver", failing_deliver)
+
+    async def scenario():
+        entry_id = await enqueue_email(mongo, "reminder", ObjectId(), "a@example.com")
+        assert await process_next(mongo)
+        return await _entry(mongo, entry_id)
+
+    before = datetime.utcnow()
+    entry = asyncio.run(scenario())
+    assert entry["status"] == "pending"
+    assert entry["lastError"] == "451 try again later"
+    assert "leaseExpiresAt" not in entry
+    delay = (entry["nextAttemptAt"] - before).total_seconds()
+    assert settings.EMAIL_RETRY_BASE_SECONDS * 0.8 - 1 <= delay <= settings.EMAIL_RETRY_BASE_SECONDS * 1.2 + 1
+
+
+def test_gives_up_after_max_attempts(mongo, monkeypatch):
+    async def failing_deliver(db, entry):
+        raise ConnectionRefusedError("connection refused")
+
+    monkeypatch.setattr(email_outbox, "deliver", failing_deliver)
+
+    async def scenario():
+        entry_id = await enqueue_email(mongo, "reminder", ObjectId(), "a@example.com")
+        for attempt in range(settings.EMAIL_MAX_ATTEMPTS):
+            # Make the scheduled retry due now
+            await mongo.email_outbox.update_one({"_id": entry_id}, {"$set": {"nextAttemptAt": datetime.utcnow()}})
+            assert await process_next(mongo)
+            entry = await _entry(mongo, entry_id)
+            expected = "failed" if attempt == settings.EMAIL_MAX_ATTEMPTS - 1 else "pending"
+            assert entry["status"] == expected
+        await mongo.email_outbox.update_one({"_id": entry_id}, {"$set": {"nextAttemptAt": datetime.utcnow()}})
+        return entry, await process_next(mongo)
+
+    entry, more = asyncio.run(scenario())
+    assert entry["attempts"] == settings.EMAIL_MAX_ATTEMPTS
+    assert entry["lastError"] == "connection refused"
+    assert more is False
+
+
+def test_missing_configuration_fails_without_retrying(mongo, monkeypatch):
+    monkeypatch.setattr(email_service, "EMAIL_USER", None)
+
+    async def scenario():
+        invoice_id = await _seed_invoice(mongo)
+        entry_id = await enqueue_email(mongo, "reminder", invoice_id, "jane@example.com")
+        await process_next(mongo)
+        return await _entry(mongo, entry_id)
+
+    entry = asyncio.run(scenario())
+    assert entry["status"] == "failed"
+    assert entry["attempts"] == 1
+    assert entry["lastError"] == "Email not configured"
+
+
+def test_entry_is_delivered_once(mongo, smtp_server):
+    async def scenario():
+        invoice_id = await _seed_invoice(mongo)
+        entry_id = await enqueue_email(mongo, "reminder", invoice_id, "jane@example.com")
+        processed = await process_next(mongo)
+        idle = await process_next(mongo)
+        return processed, idle, await _entry(mongo, entry_id)
+
+    processed, idle, entry = asyncio.run(scenario())
+    assert (processed, idle) == (True, False)
+    assert entry["status"] == "sent"
+    assert entry["attempts"] == 1
+    assert entry["timing"]["totalMs"] >= 0
+    assert len(smtp_server.messages) == 1
+    message = smtp_server.messages[0]
+    assert message.rcpt_tos == ["jane@example.com"]
+    assert b"Payment Reminder: Invoice #INV-7" in message.content
+
+
+def test_worker_wakes_for_entry_enqueued_during_idle_pass(mongo, monkeypatch):
+    claim = email_outbox._claim
+    delivered = []
+
+    async def deliver(db, entry):
+        delivered.append(entry["_id"])
+        return {"success": True}
+
+    async def racing_claim(db):
+        entry = await claim(db)
+        if entry is None and not delivered:
+            # Lands after this pass found the outbox empty, before the worker sleeps
+            await enqueue_email(db, "reminder", ObjectId(), "a@example.com")
+        return entry
+
+    monkeypatch.setattr(email_outbox, "deliver", deliver)
+    monkeypatch.setattr(email_outbox, "_claim", racing_claim)
+    monkeypatch.setattr(email_outbox, "POLL_SECONDS", 60)
+
+    async def scenario():
+        email_outbox.start_email_workers(mongo, count=1)
+        try:
+            for _ in range(100):
+                if delivered:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await email_outbox.stop_email_workers()
+
+    asyncio.run(scenario())
+    assert len(delivered) == 1
+
+
+def test_worker_survives_a_cancelled_send(mongo, monkeypatch):
+    attempts = []
+
+    async def deliver(db, entry):
+        attempts.append(entry["_id"])
+        if len(attempts) == 1:
+            # e.g. a shared PDF render that was cancelled under this send
+            raise asyncio.CancelledError()
+        return {"success": True}
+
+    monkeypatch.setattr(email_outbox, "deliver", deliver)
+
+    async def scenario():
+        cancelled = await enqueue_email(mongo, "reminder", ObjectId(), "a@example.com")
+        email_outbox.start_email_workers(mongo, count=1)
+        try:
+            for _ in range(100):
+                if (await _entry(mongo, cancelled))["status"] == "pending":
+                    break
+                await asyncio.sleep(0.01)
+            # The worker is still running and delivers the next entry
+            later = await enqueue_email(mongo, "reminder", ObjectId(), "b@example.com")
+            for _ in range(100):
+                if (await _entry(mongo, later))["status"] == "sent":
+                    break
+                await asyncio.sleep(0.01)
+            return await _entry(mongo, cancelled), await _entry(mongo, later)
+        finally:
+            await email_outbox.stop_email_workers()
+
+    cancelled, later = asyncio.run(scenario())
+    assert cancelled["status"] == "pending"
+    assert cancelled["lastError"] == "Cancelled"
+    assert later["status"] == "sent"
+
+
+def test_reminder_for_an_invoice_paid_meanwhile_is_skipped(mongo, smtp_server):
+    async def scenario():
+        invoice_id = await _seed_invoice(mongo)
+        entry_id = await enqueue_email(mongo, "reminder", invoice_id, "jane@example.com")
+        await mongo.invoices.update_one({"_id": invoice_id}, {"$set": {"status": "paid"}})
+        await process_next(mongo)
+        return await _entry(mongo, entry_id)
+
+    entry = asyncio.run(scenario())
+    assert entry["status"] == "skipped"
+    assert entry["attempts"] == 1
+    assert entry["lastError"] == "Invoice is paid; reminder skipped"
+    assert smtp_server.messages == []
+
+
+def test_invoice_email_does_not_depend_on_status(mongo, monkeypatch):
+    sent = []
+    monkeypatch.setattr(email_outbox, "send_invoice_email", lambda **kwargs: sent.append(kwargs) or {"success": True})
+
+    async def render(invoice, user, client):
+        return b"%PDF"
+
+    monkeypatch.setattr(email_outbox, "render_invoice_pdf", render)
+
+    async def scenario():
+        invoice_id = await _seed_invoice(mongo)
+        await mongo.invoices.update_one({"_id": invoice_id}, {"$set": {"status": "paid"}})
+        entry_id = await enqueue_email(mongo, "invoice", invoice_id, "jane@example.com")
+        await process_next(mongo)
+        return await _entry(mongo, entry_id)
+
+    assert asyncio.run(scenario())["status"] == "sent"
+    assert len(sent) == 1
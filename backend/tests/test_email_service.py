@@ -0,0 +1,66 @@
+import smtplib
+from email.mime.text import MIMEText
+
+import pytest
+
+from app.email_service import SMTPPool
+
+
+def _message(to):
+    msg = MIMEText("Hello")
+    msg["Subject"] = "Test"
+    msg["To"] = to
+    return msg
+
+
+@pytest.fixture
+def pool(smtp_server):
+    pool = SMTPPool(size=2, idle_seconds=60)
+    yield pool
+    pool.close()
+
+
+def test_connection_is_reused(smtp_server, pool):
+    assert pool.send(_message("a@example.com"), "a@example.com")["reused"] is False
+    assert pool.send(_message("b@example.com"), "b@example.com")["reused"] is True
+    assert pool.stats()["connections"] == 1
+    assert len(smtp_server.messages) == 2
+
+
+def test_refused_recipient_keeps_the_connection(smtp_server, pool):
+    smtp_server.refused_recipients.add("nobody@example.com")
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send(_message("nobody@example.com"), "nobody@example.com")
+    assert pool.stats()["idle"] == 1
+
+    timing = pool.send(_message("a@example.com"), "a@example.com")
+    assert timing["reused"] is True
+    assert pool.stats()["connections"] == 1
+    assert [m.rcpt_tos for m in smtp_server.messages] == [["a@example.com"]]
+
+
+def test_rejected_message_keeps_the_connection(smtp_server, pool):
+    smtp_server.refuse_data = True
+    with pytest.raises(smtplib.SMTPDataError):
+        pool.send(_message("a@example.com"), "a@example.com")
+    smtp_server.refuse_data = False
+
+    assert pool.send(_message("a@example.com"), "a@example.com")["reused"] is True
+    assert pool.stats()["connections"] == 1
+    assert len(smtp_server.messages) == 1
+
+
+def test_connection_error_closes_the_connection(smtp_server, pool, monkeypatch):
+    pool.send(_message("a@example.com"), "a@example.com")
+    conn, _ = pool._idle[0]
+
+    def broken_sendmail(*args, **kwargs):
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+    monkeypatch.setattr(smtplib.SMTP, "sendmail", broken_sendmail)
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send(_message("a@example.com"), "a@example.com")
+    # The reused connection and its fresh replacement were both dropped
+    assert pool.stats()["idle"] == 0
+    assert pool.stats()["reconnects"] == 1
+    assert conn.sock is None
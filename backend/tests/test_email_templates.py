@@ -0,0 +1,29 @@
+from datetime import datetime
+from string import Template
+
+import pytest
+
+from app.email_templates import EmailTemplate, render_invoice_email
+
+
+@pytest.mark.parametrize("source", ["", "plain", "$a", "x $a y $$ ${b}z", "$$$a", "{a} $b {{", "$a$b"])
+def test_renders_like_string_template(source):
+    values = {"a": 1, "b": "{q}"}
+    assert EmailTemplate(source).render(values) == Template(source).substitute(values)
+
+
+def test_invalid_placeholder_is_rejected():
+    with pytest.raises(ValueError):
+        EmailTemplate("costs $5")
+
+
+def test_invoice_email_rows():
+    invoice = {
+        "invoiceNumber": "INV-1", "dueDate": datetime(2026, 3, 1), "total": 60, "clientName": "Jane",
+        "lineItems": [{"description": "Labor", "quantity": 2, "rate": 30, "amount": 60}],
+    }
+    plain, html = render_invoice_email(invoice, {"businessName": "Acme", "email": "a@example.com"})
+    assert "  • Labor (x2) - $60.00\n" in plain
+    assert "Due Date: March 01, 2026" in plain
+    assert ">$30.00</td>" in html
+    assert html.count("$60.00") == 3
@@ -0,0 +1,37 @@
+import asyncio
+import io
+import zipfile
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import invoice_export
+from app.invoice_export import stream_invoice_zip
+
+
+def test_failed_and_cancelled_renders_are_listed(mongo, monkeypatch):
+    async def render(invoice, user, client):
+        await asyncio.sleep(0)
+        if invoice["invoiceNumber"] == "2":
+            raise ValueError("bad line item")
+        if invoice["invoiceNumber"] == "3":
+            # What a waiter sees when the render it shares is cancelled
+            raise asyncio.CancelledError()
+        return f"%PDF {invoice['invoiceNumber']}".encode()
+
+    monkeypatch.setattr(invoice_export, "render_invoice_pdf", render)
+
+    async def scenario():
+        user_id = ObjectId()
+        for number in ("1", "2", "3", "4"):
+            await mongo.invoices.insert_one({
+                "_id": ObjectId(), "userId": user_id, "invoiceNumber": number, "issueDate": datetime(2026, 1, int(number)),
+            })
+        return b"".join([chunk async for chunk in stream_invoice_zip(mongo, {"_id": user_id}, {"userId": user_id})])
+
+    archive = zipfile.ZipFile(io.BytesIO(asyncio.run(scenario())))
+    assert sorted(archive.namelist()) == ["Invoice-1.pdf", "Invoice-4.pdf", "export-errors.txt"]
+    assert archive.read("Invoice-4.pdf") == b"%PDF 4"
+    errors = archive.read("export-errors.txt").decode()
+    assert "2: bad line item" in errors
+    assert "3: rendering was cancelled" in errors
@@ -0,0 +1,101 @@
+"""GET /invoices/{id}/pdf: ETag validation and conditional requests"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import pdf_renderer
+from app.pdf_cache import PDFCache
+from app.routes import invoices
+
+INVOICE_ID, USER_ID, CLIENT_ID = ObjectId(), ObjectId(), ObjectId()
+URL = f"/invoices/{INVOICE_ID}/pdf"
+
+
+@pytest.fixture
+def client(mongo, tmp_path, monkeypatch):
+    cache = PDFCache(str(tmp_path), max_bytes=1024 * 1024)
+    monkeypatch.setattr(pdf_renderer, "pdf_cache", cache)
+    monkeypatch.setattr(invoices, "pdf_cache", cache)
+
+    async def seed():
+        await mongo.db.users.insert_one({"_id": USER_ID, "businessName": "Acme Roofing"})
+        await mongo.db.clients.insert_one({"_id": CLIENT_ID, "name": "Jane", "email": "jane@example.com"})
+        await mongo.db.invoices.insert_one({
+            "_id": INVOICE_ID, "userId": USER_ID, "clientId": CLIENT_ID, "invoiceNumber": "INV-7",
+            "status": "sent", "issueDate": datetime(2026, 2, 1), "total": 120,
+            "lineItems": [{"description": "Labor", "quantity": 2, "rate": 60, "amount": 120}],
+        })
+    asyncio.run(seed())
+
+    app = FastAPI()
+    app.include_router(invoices.router)
+    return TestClient(app)
+
+
+def _etag(client):
+    return client.get(URL).headers["etag"]
+
+
+def _forbid_rendering(monkeypatch):
+    async def fail(*args):
+        raise AssertionError("rendered a PDF for a conditional request that matched")
+    monkeypatch.setattr(invoices, "render_invoice_pdf", fail)
+
+
+def test_pdf_carries_an_etag(client):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"') and len(etag) == 66
+    assert response.headers["cache-control"] == "private, no-cache"
+    # Stable while nothing changes
+    assert client.get(URL).headers["etag"] == etag
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"stale", {etag}', "*"])
+def test_matching_if_none_match_is_a_304(client, monkeypatch, if_none_match):
+    etag = _etag(client)
+    _forbid_rendering(monkeypatch)
+    response = client.get(URL, headers={"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_stale_etag_gets_the_pdf(client):
+    response = client.get(URL, headers={"If-None-Match": '"0000"'})
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("change", [
+    lambda db: db.invoices.update_one({"_id": INVOICE_ID}, {"$set": {"status": "paid"}}),
+    lambda db: db.users.update_one({"_id": USER_ID}, {"$set": {"businessName": "Acme Roofing Ltd"}}),
+    lambda db: db.clients.update_one({"_id": CLIENT_ID}, {"$set": {"address": "9 Elm Road"}}),
+])
+def test_changed_pdf_gets_a_new_etag(mongo, client, change):
+    first = client.get(URL)
+    asyncio.run(change(mongo.db))
+    response = client.get(URL, headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == 200
+    assert response.headers["etag"] != first.headers["etag"]
+    assert response.content != first.content
+    assert client.get(URL, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_fields_the_pdf_does_not_show_keep_the_etag(mongo, client):
+    etag = _etag(client)
+    asyncio.run(mongo.db.invoices.update_one({"_id": INVOICE_ID}, {"$set": {"notes": "call first"}}))
+    assert client.get(URL, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_unknown_or_invalid_invoice(client):
+    assert client.get(f"/invoices/{ObjectId()}/pdf").status_code == 404
+    assert client.get("/invoices/nope/pdf").status_code == 400
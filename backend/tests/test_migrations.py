@@ -0,0 +1,248 @@
+"""
+Versioned migrations and resumable backfills, including runs that are
+interrupted part-way through and picked up again on the next startup.
+"""
+
+import asyncio
+import functools
+
+import pytest
+from bson import ObjectId
+
+from app import migrations
+from app.migrations import MIGRATIONS_COLLECTION, Migration, backfill, run_migrations
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FailingCheckpoints:
+    """Database wrapper whose schema_migrations writes fail after ``allowed`` of them"""
+
+    def __init__(self, db, allowed):
+        self.db = db
+        self.allowed = allowed
+
+    def get_collection(self, name):
+        collection = self.db.get_collection(name)
+        if name != MIGRATIONS_COLLECTION:
+            return collection
+        wrapper = self
+
+        class Checkpoints:
+            def find_one(self, *args, **kwargs):
+                return collection.find_one(*args, **kwargs)
+
+            async def update_one(self, *args, **kwargs):
+                if wrapper.allowed == 0:
+                    raise Interrupted("stopped before the checkpoint")
+                wrapper.allowed -= 1
+                return await collection.update_one(*args, **kwargs)
+
+        return Checkpoints()
+
+
+async def _seed(db, count):
+    ids = [ObjectId() for _ in range(count)]
+    await db.docs.insert_many([{"_id": _id, "value": "old"} for _id in sorted(ids)])
+    return sorted(ids)
+
+
+def _converter(seen, written, fail_on=None):
+    """transform() for backfill: 'old' -> 'new', recording what it looked at"""
+    def transform(doc):
+        if fail_on is not None and len(seen) == fail_on:
+            raise Interrupted("stopped mid-batch")
+        seen.append(doc["_id"])
+        if doc["value"] == "old":
+            written.append(doc["_id"])
+            return {"value": "new"}
+        return {}
+    return transform
+
+
+@pytest.fixture
+def pending(monkeypatch):
+    """Replace the registered migrations with test ones that log their runs"""
+    runs = []
+    registered = []
+
+    def add(version, fail_times=0):
+        failures = [fail_times]
+
+        async def apply(db):
+            runs.append(version)
+            if failures[0]:
+                failures[0] -= 1
+                raise Interrupted(f"migration {version} failed")
+
+        registered.append(Migration(version, f"test migration {version}", apply))
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", registered)
+    monkeypatch.setattr(migrations, "INDEXES", [])
+    return runs, add
+
+
+def test_pending_migrations_run_once_in_version_order(mongo, pending):
+    runs, add = pending
+    for version in (3, 1, 2):
+        add(version)
+
+    async def run():
+        await run_migrations(mongo.db)
+        assert runs == [1, 2, 3]
+        await run_migrations(mongo.db)
+        assert runs == [1, 2, 3]
+
+        add(4)
+        await run_migrations(mongo.db)
+        assert runs == [1, 2, 3, 4]
+        recorded = await mongo.db[MIGRATIONS_COLLECTION].find().sort("_id").to_list(length=None)
+        assert [(doc["_id"], "appliedAt" in doc) for doc in recorded] == [(1, True), (2, True), (3, True), (4, True)]
+    asyncio.run(run())
+
+
+def test_failed_migration_is_retried_on_the_next_run(mongo, pending):
+    runs, add = pending
+    add(1)
+    add(2, fail_times=1)
+    add(3)
+
+    async def run():
+        with pytest.raises(Interrupted):
+            await run_migrations(mongo.db)
+        assert runs == [1, 2]
+        assert await mongo.db[MIGRATIONS_COLLECTION].find_one({"_id": 2}) is None
+        await run_migrations(mongo.db)
+        assert runs == [1, 2, 2, 3]
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("interrupt", ["mid-batch", "before checkpoint"])
+def test_interrupted_backfill_resumes_from_its_checkpoint(mongo, bulk_updates, interrupt):
+    async def run():
+        ids = await _seed(mongo.db, 10)
+        seen, written = [], []
+        if interrupt == "mid-batch":
+            # Fails on the 5th document: the first batch of 3 is done
+            transform, db = _converter(seen, written, fail_on=4), mongo.db
+        else:
+            # The second batch is written but its checkpoint isn't
+            transform, db = _converter(seen, written), FailingCheckpoints(mongo.db, allowed=1)
+        with pytest.raises(Interrupted):
+            await backfill(db, 7, "docs", {}, transform, batch_size=3)
+
+        checkpoint = (await mongo.db[MIGRATIONS_COLLECTION].find_one({"_id": 7}))["checkpoints"]["docs"]
+        assert checkpoint == ids[2]
+        stored = {doc["_id"] async for doc in mongo.db.docs.find({"value": "new"})}
+
+        resumed, rewritten = [], []
+        await backfill(mongo.db, 7, "docs", {}, _converter(resumed, rewritten), batch_size=3)
+        # Picks up right after the checkpoint...
+        assert resumed[0] == ids[3]
+        # ...and converts each remaining document once, none of the stored ones again
+        assert len(rewritten) == len(set(rewritten))
+        assert not stored & set(rewritten)
+        assert stored | set(rewritten) == set(ids)
+        assert await mongo.db.docs.count_documents({"value": "new"}) == 10
+    asyncio.run(run())
+
+
+def test_completed_backfill_does_nothing_when_run_again(mongo, bulk_updates):
+    async def run():
+        await _seed(mongo.db, 7)
+        seen, written = [], []
+        assert await backfill(mongo.db, 7, "docs", {}, _converter(seen, written), batch_size=3) == 7
+        again = []
+        assert await backfill(mongo.db, 7, "docs", {}, _converter(again, written), batch_size=3) == 0
+        assert again == []
+        assert len(written) == 7
+    asyncio.run(run())
+
+
+# ----- migration 1: reference fields as ObjectId -----
+
+@pytest.fixture
+def recorded_writes(monkeypatch):
+    """Every document id backfill() writes, and small batches so runs span several"""
+    writes = []
+    update_one = migrations.UpdateOne
+
+    def recording_update_one(selector, update, **kwargs):
+        writes.append(selector["_id"])
+        return update_one(selector, update, **kwargs)
+
+    monkeypatch.setattr(migrations, "UpdateOne", recording_update_one)
+    monkeypatch.setattr(migrations, "backfill", functools.partial(backfill, batch_size=2))
+    return writes
+
+
+def _references_migration():
+    return next(m for m in migrations.MIGRATIONS if m.version == 1)
+
+
+async def _seed_references(db):
+    user, client, job, invoice = ObjectId(), ObjectId(), ObjectId(), ObjectId()
+    await db.clients.insert_many([{"_id": ObjectId(), "userId": str(user)} for _ in range(3)])
+    await db.jobs.insert_many([
+        {"_id": ObjectId(), "userId": str(user), "clientId": client, "invoiceId": str(invoice)},
+        {"_id": ObjectId(), "userId": user, "clientId": str(client), "invoiceId": ""},
+        {"_id": ObjectId(), "userId": user, "clientId": "legacy-name", "invoiceId": None},
+        {"_id": ObjectId(), "userId": str(user), "clientId": str(client)},
+        {"_id": ObjectId(), "userId": user, "clientId": client},
+    ])
+    await db.invoices.insert_many([{"_id": ObjectId(), "userId": str(user), "jobId": str(job)} for _ in range(3)])
+    return user, client, job, invoice
+
+
+async def _assert_references_converted(db, user, client, job, invoice):
+    for doc in await db.clients.find().to_list(length=None):
+        assert doc["userId"] == user
+    jobs = await db.jobs.find().sort("_id").to_list(length=None)
+    assert [doc["userId"] for doc in jobs] == [user] * 5
+    assert [doc["clientId"] for doc in jobs] == [client, client, "legacy-name", client, client]
+    assert [doc.get("invoiceId") for doc in jobs] == [invoice, None, None, None, None]
+    for doc in await db.invoices.find().to_list(length=None):
+        assert (doc["userId"], doc["jobId"]) == (user, job)
+
+
+def test_references_become_object_ids(mongo, bulk_updates, recorded_writes):
+    async def run():
+        refs = await _seed_references(mongo.db)
+        await _references_migration().apply(mongo.db)
+        await _assert_references_converted(mongo.db, *refs)
+        # Documents that were already canonical (or can't be converted) aren't written
+        assert len(recorded_writes) == 3 + 3 + 3
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("allowed", [1, 2, 4])
+def test_interrupted_reference_migration_resumes(mongo, bulk_updates, recorded_writes, allowed):
+    async def run():
+        refs = await _seed_references(mongo.db)
+        with pytest.raises(Interrupted):
+            await _references_migration().apply(FailingCheckpoints(mongo.db, allowed))
+        written_before = list(recorded_writes)
+        assert written_before
+
+        await _references_migration().apply(mongo.db)
+        await _assert_references_converted(mongo.db, *refs)
+        # No document is written twice across the two runs
+        assert len(recorded_writes) == len(set(recorded_writes)) == 3 + 3 + 3
+    asyncio.run(run())
+
+
+def test_applied_reference_migration_is_not_run_again(mongo, bulk_updates, union_with, recorded_writes):
+    async def run():
+        refs = await _seed_references(mongo.db)
+        await run_migrations(mongo.db)
+        await _assert_references_converted(mongo.db, *refs)
+        writes = len(recorded_writes)
+
+        # A legacy write after the migration stays put: version 1 is done
+        late = await mongo.db.clients.insert_one({"userId": str(refs[0])})
+        await run_migrations(mongo.db)
+        assert len(recorded_writes) == writes
+        assert (await mongo.db.clients.find_one({"_id": late.inserted_id}))["userId"] == str(refs[0])
+    asyncio.run(run())
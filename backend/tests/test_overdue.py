@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from app import overdue
+from app.overdue import sweep_overdue_invoices
+from app.user_stats import get_user_stats, record_change, stat
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+async def _seed(db, count):
+    user_id, client_id = ObjectId(), ObjectId()
+    await db.clients.insert_one({"_id": client_id, "userId": user_id, "email": "client@example.com"})
+    for _ in range(count):
+        invoice = {"_id": ObjectId(), "userId": user_id, "clientId": client_id,
+                   "status": "sent", "total": 10, "dueDate": datetime(2026, 2, 1)}
+        await db.invoices.insert_one(invoice)
+        await record_change(db, "invoices", after=invoice)
+    return user_id
+
+
+def test_sweep_marks_counts_and_queues_once(mongo):
+    async def scenario():
+        user_id = await _seed(mongo, 2)
+        marked = await sweep_overdue_invoices(mongo, NOW)
+        again = await sweep_overdue_invoices(mongo, NOW)
+        return user_id, marked, again
+
+    user_id, marked, again = asyncio.run(scenario())
+    assert (marked, again) == (2, 0)
+
+    async def check():
+        stats = await get_user_stats(mongo, user_id)
+        reminders = await mongo.email_outbox.count_documents({"kind": "reminder"})
+        flagged = await mongo.invoices.count_documents({"overdueFollowUp": True})
+        return stats, reminders, flagged
+
+    stats, reminders, flagged = asyncio.run(check())
+    assert stat(stats, "invoices.byStatus.overdue") == 2
+    assert stat(stats, "invoices.byStatus.sent") == 0
+    assert reminders == 2
+    assert flagged == 0
+
+
+def test_interrupted_sweep_is_finished_by_the_next(mongo, monkeypatch):
+    enqueue_email = overdue.enqueue_email
+    calls = []
+
+    async def failing_enqueue(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return await enqueue_email(*args, **kwargs)
+
+    monkeypatch.setattr(overdue, "enqueue_email", failing_enqueue)
+
+    async def scenario():
+        user_id = await _seed(mongo, 3)
+        with pytest.raises(RuntimeError):
+            await sweep_overdue_invoices(mongo, NOW)
+        # Nothing new is due, but the invoices left over are still handled
+        assert await sweep_overdue_invoices(mongo, NOW) == 0
+        stats = await get_user_stats(mongo, user_id)
+        reminders = await mongo.email_outbox.distinct("invoiceId", {"kind": "reminder"})
+        return stats, reminders
+
+    stats, reminders = asyncio.run(scenario())
+    # The invoice already finished is not handled again and the rest aren't lost
+    assert stat(stats, "invoices.byStatus.sent") == 0
+    assert stat(stats, "invoices.byStatus.overdue") == 3
+    assert len(reminders) == 3
+    assert len(calls) == 4
+
+
+def test_concurrent_sweeps_handle_each_invoice_once(mongo, monkeypatch):
+    enqueue_email = overdue.enqueue_email
+    record_change = overdue.record_change
+
+    # Give the other sweep a chance to run between every step, as separate processes would
+    async def yielding_enqueue(*args, **kwargs):
+        await asyncio.sleep(0)
+        return await enqueue_email(*args, **kwargs)
+
+    async def yielding_record_change(*args, **kwargs):
+        await asyncio.sleep(0)
+        return await record_change(*args, **kwargs)
+
+    monkeypatch.setattr(overdue, "enqueue_email", yielding_enqueue)
+    monkeypatch.setattr(overdue, "record_change", yielding_record_change)
+
+    async def scenario():
+        user_id = await _seed(mongo, 3)
+        # Marked by an earlier sweep that died before following up
+        await mongo.invoices.update_many({}, {"$set": {"status": "overdue", "overdueFollowUp": True}})
+        await asyncio.gather(sweep_overdue_invoices(mongo, NOW), sweep_overdue_invoices(mongo, NOW))
+        stats = await get_user_stats(mongo, user_id)
+        reminders = await mongo.email_outbox.find({"kind": "reminder"}).to_list(length=None)
+        leftover = await mongo.invoices.count_documents(
+            {"$or": [{"overdueFollowUp": {"$exists": True}}, {"followUpLeaseUntil": {"$exists": True}}]}
+        )
+        return stats, reminders, leftover
+
+    stats, reminders, leftover = asyncio.run(scenario())
+    assert len(reminders) == 3
+    assert len({r["invoiceId"] for r in reminders}) == 3
+    assert stat(stats, "invoices.byStatus.sent") == 0
+    assert stat(stats, "invoices.byStatus.overdue") == 3
+    assert leftover == 0
+
+
+def test_leased_follow_up_waits_for_the_lease(mongo):
+    async def scenario():
+        await _seed(mongo, 1)
+        await mongo.invoices.update_many({}, {"$set": {
+            "status": "overdue", "overdueFollowUp": True,
+            # Another sweep is working on it
+            "followUpLeaseUntil": datetime.utcnow() + timedelta(minutes=1),
+        }})
+        await sweep_overdue_invoices(mongo, NOW)
+        held = await mongo.email_outbox.count_documents({})
+        # Its sweep died: the lease runs out and a later sweep finishes the job
+        await mongo.invoices.update_many({}, {"$set": {"followUpLeaseUntil": datetime.utcnow() - timedelta(seconds=1)}})
+        await sweep_overdue_invoices(mongo, NOW)
+        return held, await mongo.email_outbox.count_documents({})
+
+    assert asyncio.run(scenario()) == (0, 1)
@@ -0,0 +1,100 @@
+"""
+Keyset pages walked end to end against the plain skip-based ordering of the
+same query: together they must list every document exactly once, in order.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from app.pagination import paginate, sort_spec
+
+DAY = datetime(2026, 1, 1)
+
+
+def _expenses():
+    docs = []
+    for i in range(23):
+        doc = {"_id": ObjectId(), "userId": "u1", "vendorName": f"Vendor {i}"}
+        if i % 5 == 0:
+            doc["date"] = None
+        elif i % 7 != 0:
+            # Only a few distinct dates, so many documents share a sort key
+            doc["date"] = DAY + timedelta(days=i % 3)
+        # else: no date at all
+        docs.append(doc)
+    return docs
+
+
+async def _walk(collection, limit, sort_field, direction, between_pages=None):
+    ids, cursor, pages = [], None, 0
+    while True:
+        docs, cursor = await paginate(
+            collection, {"userId": "u1"}, limit=limit, cursor=cursor,
+            sort_field=sort_field, direction=direction
+        )
+        ids.extend(doc["_id"] for doc in docs)
+        pages += 1
+        if not cursor:
+            return ids, pages
+        if between_pages:
+            await between_pages(pages)
+
+
+async def _skip_order(collection, sort_field, direction):
+    docs = await collection.find({"userId": "u1"}).sort(sort_spec(sort_field, direction)).to_list(length=None)
+    return [doc["_id"] for doc in docs]
+
+
+@pytest.mark.parametrize("sort_field, direction", [
+    (None, ASCENDING),
+    ("date", ASCENDING),
+    ("date", DESCENDING),
+])
+@pytest.mark.parametrize("limit", [1, 4, 23, 100])
+def test_pages_match_the_full_ordering(mongo, sort_field, direction, limit):
+    async def run():
+        await mongo.db.expenses.insert_many(_expenses())
+        ids, pages = await _walk(mongo.db.expenses, limit, sort_field, direction)
+        assert ids == await _skip_order(mongo.db.expenses, sort_field, direction)
+        assert pages == max(1, -(-23 // limit))
+    asyncio.run(run())
+
+
+def test_newest_first_puts_missing_dates_last(mongo):
+    async def run():
+        await mongo.db.expenses.insert_many(_expenses())
+        ids, _ = await _walk(mongo.db.expenses, 3, "date", DESCENDING)
+        dates = [(await mongo.db.expenses.find_one({"_id": _id})).get("date") for _id in ids]
+        dated = [d for d in dates if d is not None]
+        assert dates[:len(dated)] == sorted(dated, reverse=True)
+        assert all(d is None for d in dates[len(dated):])
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("direction", [ASCENDING, DESCENDING])
+def test_inserts_between_pages_cause_no_gaps_or_repeats(mongo, direction):
+    async def run():
+        original = _expenses()
+        await mongo.db.expenses.insert_many(original)
+        inserted = []
+
+        async def insert(page):
+            # Land on both sides of the cursor: in the null group, inside a
+            # shared date, and before/after every existing date
+            for date in (None, DAY + timedelta(days=1), DAY - timedelta(days=page), DAY + timedelta(days=10 + page)):
+                doc = {"_id": ObjectId(), "userId": "u1", "date": date}
+                await mongo.db.expenses.insert_one(doc)
+                inserted.append(doc["_id"])
+
+        ids, _ = await _walk(mongo.db.expenses, 4, "date", direction, between_pages=insert)
+        assert len(ids) == len(set(ids))
+        # Every document that existed before the walk is listed...
+        assert {doc["_id"] for doc in original} <= set(ids)
+        # ...and whatever was seen follows the final full ordering
+        final = await _skip_order(mongo.db.expenses, "date", direction)
+        assert ids == [_id for _id in final if _id in set(ids)]
+    asyncio.run(run())
@@ -0,0 +1,139 @@
+"""The rendered-PDF disk cache: what invalidates an entry, and LRU eviction by size"""
+
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import pdf_renderer
+from app.pdf_cache import PDF_CLIENT_FIELDS, PDF_INVOICE_FIELDS, PDF_USER_FIELDS, PDFCache, pdf_cache_key
+from app.pdf_renderer import render_invoice_pdf
+from app.routes import invoices
+
+INVOICE = {
+    "_id": ObjectId(), "invoiceNumber": "INV-1", "issueDate": datetime(2026, 2, 1), "dueDate": datetime(2026, 3, 1),
+    "status": "sent", "total": 10, "lineItems": [{"description": "Labor", "quantity": 1, "rate": 10}],
+    "invoiceTitle": "Roof", "invoiceDescription": "Patch", "notes": "internal", "updatedAt": datetime(2026, 2, 2),
+}
+USER = {"businessName": "Acme", "businessAddress": "1 Main", "businessPhone": "555", "businessEmail": "a@acme.test", "hourlyRate": 75}
+CLIENT = {"name": "Jane", "email": "jane@example.com", "address": "9 Elm", "archived": False}
+
+
+@pytest.mark.parametrize("doc, fields", [(INVOICE, PDF_INVOICE_FIELDS), (USER, PDF_USER_FIELDS), (CLIENT, PDF_CLIENT_FIELDS)])
+def test_key_changes_with_every_field_the_pdf_shows(doc, fields):
+    docs = {"invoice": INVOICE, "user": USER, "client": CLIENT}
+    name = next(name for name, value in docs.items() if value is doc)
+    key = pdf_cache_key(INVOICE, USER, CLIENT)
+    for field in fields:
+        changed = {**docs, name: {**doc, field: "changed"}}
+        assert pdf_cache_key(changed["invoice"], changed["user"], changed["client"]) != key, field
+    # Fields the PDF doesn't show don't matter
+    other = {**docs, name: {**{k: v for k, v in doc.items() if k in fields}, "unrelated": 1}}
+    assert pdf_cache_key(other["invoice"], other["user"], other["client"]) == key
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = PDFCache(str(tmp_path), max_bytes=1024 * 1024)
+    monkeypatch.setattr(pdf_renderer, "pdf_cache", cache)
+    monkeypatch.setattr(invoices, "pdf_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    rendered = []
+
+    async def fake_render(invoice, user, client):
+        rendered.append((invoice["status"], user["businessName"]))
+        return f"%PDF {invoice['status']} {user['businessName']}".encode()
+
+    monkeypatch.setattr(pdf_renderer, "_render", fake_render)
+    return rendered
+
+
+def test_repeat_render_comes_from_the_cache(cache, renders):
+    async def run():
+        first = await render_invoice_pdf(INVOICE, USER, CLIENT)
+        assert await render_invoice_pdf(INVOICE, USER, CLIENT) == first
+    asyncio.run(run())
+    assert renders == [("sent", "Acme")]
+    assert cache.stats()["hits"] == 1
+
+
+def test_changed_invoice_or_branding_renders_again(cache, renders):
+    async def run():
+        await render_invoice_pdf(INVOICE, USER, CLIENT)
+        rebranded = await render_invoice_pdf(INVOICE, {**USER, "businessName": "Acme Roofing"}, CLIENT)
+        paid = await render_invoice_pdf({**INVOICE, "status": "paid"}, USER, CLIENT)
+        return rebranded, paid
+    rebranded, paid = asyncio.run(run())
+    assert rebranded == b"%PDF sent Acme Roofing"
+    assert paid == b"%PDF paid Acme"
+    assert renders == [("sent", "Acme"), ("sent", "Acme Roofing"), ("paid", "Acme")]
+    # Every version is kept until the invoice itself changes
+    assert cache.invalidate(INVOICE["_id"]) == 3
+    assert cache.stats()["files"] == 0
+
+
+def test_invoice_update_and_delete_drop_cached_pdfs(mongo, cache):
+    invoice_id = ObjectId()
+    asyncio.run(mongo.db.invoices.insert_one({**INVOICE, "_id": invoice_id}))
+    other = ObjectId()
+    key = pdf_cache_key(INVOICE, USER, CLIENT)
+    cache.put(invoice_id, key, b"%PDF old")
+    cache.put(other, key, b"%PDF other")
+    app = FastAPI()
+    app.include_router(invoices.router)
+    client = TestClient(app)
+
+    # Fields the PDF doesn't show keep the cached file
+    assert client.put(f"/invoices/{invoice_id}", json={"notes": "call first"}).status_code == 200
+    assert cache.get(invoice_id, key) == b"%PDF old"
+
+    assert client.put(f"/invoices/{invoice_id}", json={"total": 12}).status_code == 200
+    assert cache.get(invoice_id, key) is None
+    cache.put(invoice_id, key, b"%PDF new")
+
+    assert client.delete(f"/invoices/{invoice_id}").status_code == 200
+    assert cache.get(invoice_id, key) is None
+    assert cache.get(other, key) == b"%PDF other"
+
+
+def test_least_recently_used_files_are_evicted_by_size(tmp_path):
+    cache = PDFCache(str(tmp_path), max_bytes=250)
+    cache.put("a", "k", b"a" * 100)
+    cache.put("b", "k", b"b" * 100)
+    assert cache.get("a", "k")  # now b is the least recently used
+    cache.put("c", "k", b"c" * 100)
+
+    assert cache.get("b", "k") is None
+    assert cache.get("a", "k") and cache.get("c", "k")
+    assert sorted(os.listdir(tmp_path)) == ["a-k.pdf", "c-k.pdf"]
+    stats = cache.stats()
+    assert (stats["files"], stats["bytes"], stats["evictions"]) == (2, 200, 1)
+
+    # Replacing a file counts its new size only
+    cache.put("a", "k", b"a" * 50)
+    assert cache.stats()["bytes"] == 150
+
+    # A PDF larger than the whole cache evicts everything else but is kept
+    cache.put("d", "k", b"d" * 300)
+    assert os.listdir(tmp_path) == ["d-k.pdf"]
+    assert cache.stats()["bytes"] == 300
+
+
+def test_files_on_disk_are_indexed_oldest_first(tmp_path):
+    for age, name in enumerate(["new", "mid", "old"]):
+        path = tmp_path / f"{name}-k.pdf"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1_000_000 - age * 10, 1_000_000 - age * 10))
+
+    # e.g. after a restart
+    cache = PDFCache(str(tmp_path), max_bytes=250)
+    cache.put("next", "k", b"x" * 100)
+    assert sorted(os.listdir(tmp_path)) == ["new-k.pdf", "next-k.pdf"]
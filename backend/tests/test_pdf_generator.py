@@ -0,0 +1,86 @@
+import re
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from reportlab import Version, rl_config
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import paragraph as rl_paragraph
+
+from app import pdf_generator
+from app.invoice_export import _ZipSink
+from app.pdf_generator import create_pdf_bytes
+
+USER = {"businessName": "Acme Plumbing", "businessAddress": "12 Main Street", "businessEmail": "billing@acme.test"}
+CLIENT = {"name": "Jane Client", "email": "jane@client.test", "address": "99 Elm Road"}
+
+
+def _invoice(count):
+    def description(i):
+        text = f"Labor hour {i}" if i % 2 else f"Copper pipe 15mm, lot {i}"
+        # Some rows wrap onto several lines, so rows differ in height
+        return text + ": replaced the corroded section and pressure tested" * (i % 7 == 0) * 3
+    return {
+        "invoiceNumber": "INV-1", "issueDate": datetime(2026, 2, 1), "dueDate": datetime(2026, 3, 1),
+        "status": "sent", "invoiceTitle": "Kitchen renovation",
+        "lineItems": [
+            {"description": description(i), "quantity": 1 + i % 4, "rate": 42.5, "amount": 42.5 * (1 + i % 4)}
+            for i in range(count)
+        ],
+    }
+
+
+@pytest.mark.parametrize("count", [1, 199, 200, 5000])
+def test_streaming_layout_renders_the_same_pdf(count, monkeypatch):
+    # No timestamps or random document ids, so identical layouts give identical bytes
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    streamed_tables = []
+    line_items_table = pdf_generator.LineItemsTable
+
+    def spy(*args, **kwargs):
+        table = line_items_table(*args, **kwargs)
+        streamed_tables.append(table)
+        return table
+
+    monkeypatch.setattr(pdf_generator, "LineItemsTable", spy)
+    invoice = _invoice(count)
+
+    streamed = create_pdf_bytes(invoice, USER, CLIENT, streaming=True)
+    assert streamed_tables
+    built = create_pdf_bytes(invoice, USER, CLIENT, streaming=False)
+    assert streamed == built
+
+
+def test_streaming_defaults_on_from_the_threshold(monkeypatch):
+    used = []
+    monkeypatch.setattr(pdf_generator, "items_table", lambda *a: used.append("built") or pdf_generator.Spacer(1, 1))
+    monkeypatch.setattr(pdf_generator, "LineItemsTable", lambda *a: used.append("streamed") or pdf_generator.Spacer(1, 1))
+    threshold = pdf_generator.settings.PDF_STREAM_MIN_ITEMS
+    create_pdf_bytes(_invoice(threshold - 1), USER, CLIENT)
+    assert set(used) == {"built"}
+    used.clear()
+    create_pdf_bytes(_invoice(threshold), USER, CLIENT)
+    assert set(used) == {"streamed"}
+
+
+def test_renders_into_a_non_seekable_sink(monkeypatch):
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    invoice = _invoice(3)
+    sink = _ZipSink()
+    assert pdf_generator.create_pdf_document(invoice, USER, CLIENT, output=sink) is sink
+    assert sink.drain() == create_pdf_bytes(invoice, USER, CLIENT)
+
+
+def test_paragraph_line_breaking_uses_the_width_cache():
+    # Guards the one reportlab patch against upgrades past the pinned version
+    pin = re.search(r"^reportlab==(\S+)$", (Path(__file__).parents[1] / "requirements.txt").read_text(), re.M)
+    assert pin and pin.group(1) == Version
+    assert pdf_generator.install_paragraph_width_cache()
+    assert rl_paragraph.stringWidth is pdf_generator.measure_text
+    assert pdf_generator.measure_text.__wrapped__ is stringWidth
+
+    text = "a rarely measured phrase zqxv " * 20
+    style = pdf_generator.get_invoice_layout(pdf_generator.Branding.from_user(USER)).style_normal
+    pdf_generator.measure_text.cache_clear()
+    pdf_generator.Paragraph(text, style).wrap(100, 1000)
+    assert pdf_generator.measure_text.cache_info().misses > 0
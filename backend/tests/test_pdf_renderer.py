@@ -0,0 +1,82 @@
+import asyncio
+
+from bson import ObjectId
+
+from app import pdf_renderer
+from app.pdf_renderer import render_invoice_pdf
+
+USER = {"businessName": "Acme"}
+CLIENT = {"name": "Jane"}
+
+
+def _invoice():
+    return {"_id": ObjectId(), "invoiceNumber": "INV-1", "lineItems": [], "total": 10}
+
+
+def test_cancelled_caller_does_not_cancel_a_shared_render(monkeypatch):
+    renders = []
+
+    async def slow_render(invoice, user, client):
+        renders.append(invoice["_id"])
+        await asyncio.sleep(0.05)
+        return b"%PDF shared"
+
+    monkeypatch.setattr(pdf_renderer, "_render", slow_render)
+    invoice = _invoice()
+
+    async def scenario():
+        first = asyncio.ensure_future(render_invoice_pdf(invoice, USER, CLIENT))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(render_invoice_pdf(invoice, USER, CLIENT))
+        await asyncio.sleep(0.01)
+        # e.g. the client that started the render disconnected
+        first.cancel()
+        data = await second
+        assert first.cancelled()
+        return data
+
+    assert asyncio.run(scenario()) == b"%PDF shared"
+    assert len(renders) == 1
+    assert not pdf_renderer._inflight
+
+
+def test_render_finishes_and_is_cached_when_every_caller_is_gone(monkeypatch):
+    async def slow_render(invoice, user, client):
+        await asyncio.sleep(0.02)
+        return b"%PDF cached"
+
+    monkeypatch.setattr(pdf_renderer, "_render", slow_render)
+    invoice = _invoice()
+
+    async def scenario():
+        caller = asyncio.ensure_future(render_invoice_pdf(invoice, USER, CLIENT))
+        await asyncio.sleep(0.005)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+
+        async def no_render(*args):
+            raise AssertionError("should come from the cache")
+
+        monkeypatch.setattr(pdf_renderer, "_render", no_render)
+        return await render_invoice_pdf(invoice, USER, CLIENT)
+
+    assert asyncio.run(scenario()) == b"%PDF cached"
+
+
+def test_failed_shared_render_reaches_every_caller(monkeypatch):
+    async def failing_render(invoice, user, client):
+        await asyncio.sleep(0.01)
+        raise ValueError("bad layout")
+
+    monkeypatch.setattr(pdf_renderer, "_render", failing_render)
+    invoice = _invoice()
+
+    async def scenario():
+        return await asyncio.gather(
+            render_invoice_pdf(invoice, USER, CLIENT),
+            render_invoice_pdf(invoice, USER, CLIENT),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert [str(r) for r in results] == ["bad layout", "bad layout"]
@@ -0,0 +1,91 @@
+"""?fields= parsing, the MongoDB projection it becomes, and the response shape"""
+
+import asyncio
+import json
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.models import Expense, Invoice
+from app.projection import select_fields, to_projection
+from app.routes import expenses, invoices
+from app.serialization import document_response
+from app.streaming import NDJSON_MEDIA_TYPE
+
+USER_ID = ObjectId()
+
+
+def test_no_fields_means_everything():
+    assert select_fields(None, Invoice) is None
+    assert select_fields("", Invoice) is None
+    assert to_projection(None) is None
+
+
+def test_id_and_sort_key_are_always_selected():
+    assert select_fields("status", Invoice) == {"_id", "status"}
+    assert select_fields(" total , status,", Invoice) == {"_id", "total", "status"}
+    selected = select_fields("vendorName", Expense, "date")
+    assert selected == {"_id", "vendorName", "date"}
+    assert to_projection(selected) == {"_id": 1, "date": 1, "vendorName": 1}
+
+
+def test_alias_and_attribute_name_map_to_the_document_key():
+    assert select_fields("id", Invoice) == select_fields("_id", Invoice) == {"_id"}
+
+
+def test_unknown_fields_are_a_400():
+    with pytest.raises(HTTPException) as error:
+        select_fields("status,nope,passwordHash", Invoice)
+    assert error.value.status_code == 400
+    assert "nope" in error.value.detail and "passwordHash" in error.value.detail
+
+
+def test_unselected_model_defaults_are_omitted():
+    doc = {"_id": ObjectId(), "status": "sent"}
+    body = json.loads(document_response(doc, Invoice, fields=select_fields("status", Invoice)).body)
+    assert body == {"_id": str(doc["_id"]), "status": "sent"}
+    # Without fields the model defaults are filled in as before
+    full = json.loads(document_response(doc, Invoice).body)
+    assert full["total"] == 0.0 and full["lineItems"] == []
+
+
+@pytest.fixture
+def client(mongo):
+    asyncio.run(mongo.db.invoices.insert_many([
+        {"_id": ObjectId(), "userId": USER_ID, "invoiceNumber": f"INV-{i}", "status": "sent",
+         "total": 10 * i, "lineItems": [{"description": "Labor"}], "secretNote": "x"}
+        for i in range(3)
+    ]))
+    asyncio.run(mongo.db.expenses.insert_one({"_id": ObjectId(), "userId": USER_ID, "vendorName": "Depot", "totalAmount": 5}))
+    app = FastAPI()
+    app.include_router(invoices.router)
+    app.include_router(expenses.router)
+    return TestClient(app)
+
+
+def test_list_returns_only_the_selected_fields(client):
+    listed = client.get("/invoices/", params={"user_id": str(USER_ID), "fields": "invoiceNumber,total"}).json()
+    assert len(listed) == 3
+    assert all(set(doc) == {"_id", "invoiceNumber", "total"} for doc in listed)
+
+
+def test_streamed_list_returns_only_the_selected_fields(client):
+    response = client.get(
+        "/invoices/", params={"user_id": str(USER_ID), "fields": "status"},
+        headers={"Accept": NDJSON_MEDIA_TYPE}
+    )
+    assert [set(json.loads(line)) for line in response.text.splitlines()] == [{"_id", "status"}] * 3
+
+
+def test_sort_key_comes_back_for_the_cursor(client):
+    listed = client.get("/expenses/", params={"user_id": str(USER_ID), "fields": "vendorName"}).json()
+    # No stored date, so the model default for the sort key fills in
+    assert set(listed[0]) == {"_id", "vendorName", "date"}
+
+
+def test_list_rejects_unknown_fields(client):
+    response = client.get("/invoices/", params={"fields": "total,bogus"})
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
@@ -0,0 +1,98 @@
+"""Batched joins and per-document counts for the relationship endpoints"""
+
+import asyncio
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.relations import attach_related, count_by
+from app.routes import users
+
+
+class CountingCollection:
+    """Passes through to a collection, counting the queries made"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = []
+
+    def find(self, *args, **kwargs):
+        self.queries.append(args)
+        return self.collection.find(*args, **kwargs)
+
+
+def test_attach_related(mongo):
+    async def run():
+        acme, globex, gone = ObjectId(), ObjectId(), ObjectId()
+        await mongo.db.clients.insert_many([
+            {"_id": acme, "name": "Acme", "email": "a@acme.test", "address": "private"},
+            {"_id": globex, "name": "Globex", "email": "g@globex.test"},
+        ])
+        invoices = [
+            {"_id": 1, "clientId": acme},
+            {"_id": 2, "clientId": acme},           # shared with the first
+            {"_id": 3, "clientId": str(globex)},    # legacy string reference
+            {"_id": 4, "clientId": gone},           # client was deleted
+            {"_id": 5, "clientId": None},
+            {"_id": 6},
+            {"_id": 7, "clientId": "not-an-id"},
+        ]
+        clients = CountingCollection(mongo.db.clients)
+        result = await attach_related(invoices, "clientId", clients, {"clientName": "name", "clientEmail": "email"})
+
+        assert result is invoices
+        assert len(clients.queries) == 1
+        assert [doc.get("clientName") for doc in invoices] == ["Acme", "Acme", "Globex", None, None, None, None]
+        assert invoices[2]["clientEmail"] == "g@globex.test"
+        # Unmatched documents are left as they were; only mapped fields are copied
+        assert invoices[3] == {"_id": 4, "clientId": gone}
+        assert invoices[6] == {"_id": 7, "clientId": "not-an-id"}
+        assert "address" not in invoices[0]
+        # The stored reference itself isn't rewritten
+        assert invoices[2]["clientId"] == str(globex)
+    asyncio.run(run())
+
+
+def test_attach_related_skips_the_query_without_references(mongo):
+    async def run():
+        clients = CountingCollection(mongo.db.clients)
+        docs = [{"_id": 1, "clientId": None}, {"_id": 2}]
+        await attach_related(docs, "clientId", clients, {"clientName": "name"})
+        assert clients.queries == []
+        assert await attach_related([], "clientId", clients, {"clientName": "name"}) == []
+    asyncio.run(run())
+
+
+def test_count_by(mongo):
+    async def run():
+        busy, quiet, idle, other = ObjectId(), ObjectId(), ObjectId(), ObjectId()
+        await mongo.db.jobs.insert_many(
+            [{"clientId": busy} for _ in range(3)] + [{"clientId": quiet}, {"clientId": other}, {}]
+        )
+        counts = await count_by(mongo.db.jobs, "clientId", [busy, quiet, idle])
+        # Only the requested ids; ids without documents have no entry (count 0)
+        assert counts == {busy: 3, quiet: 1}
+        assert counts.get(idle, 0) == 0
+        assert await count_by(mongo.db.jobs, "clientId", []) == {}
+    asyncio.run(run())
+
+
+def test_client_list_counts_include_zero(mongo):
+    user, busy, idle = ObjectId(), ObjectId(), ObjectId()
+
+    async def seed():
+        await mongo.db.users.insert_one({"_id": user})
+        await mongo.db.clients.insert_many([
+            {"_id": busy, "userId": user, "name": "Busy"},
+            {"_id": idle, "userId": user, "name": "Idle"},
+        ])
+        await mongo.db.jobs.insert_many([{"clientId": busy}, {"clientId": busy}])
+        await mongo.db.invoices.insert_one({"clientId": busy})
+    asyncio.run(seed())
+
+    app = FastAPI()
+    app.include_router(users.router)
+    listed = TestClient(app).get(f"/users/{user}/clients").json()
+    counts = {doc["name"]: (doc["jobCount"], doc["invoiceCount"]) for doc in listed}
+    assert counts == {"Busy": (2, 1), "Idle": (0, 0)}
@@ -0,0 +1,110 @@
+"""
+MongoJSONResponse output compared with the encoding the routers used before
+the shared codec: a per-router ObjectId/datetime converter followed by
+FastAPI's response_model validation and JSON encoding.
+"""
+
+import re
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.models import Client, Expense, Invoice, Job, User
+from app.serialization import document_response, dumps
+
+
+def legacy_convert(doc):
+    """The converter every router had (convert_objectid_to_str)"""
+    if isinstance(doc, dict):
+        result = {}
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                result[key] = str(value)
+            elif isinstance(value, datetime):
+                result[key] = value.isoformat()
+            elif isinstance(value, (dict, list)):
+                result[key] = legacy_convert(value)
+            else:
+                result[key] = value
+        return result
+    if isinstance(doc, list):
+        return [legacy_convert(item) for item in doc]
+    return doc
+
+
+WHEN = datetime(2026, 1, 17, 9, 30)
+
+DOCUMENTS = {
+    "user": (User, {
+        "_id": ObjectId(), "auth0Id": "auth0|1", "businessEmail": "b@example.com",
+        "hourlyRate": 75, "createdAt": WHEN, "notInModel": 1,
+    }),
+    "user_sparse": (User, {"_id": ObjectId(), "businessEmail": "b@example.com"}),
+    "client": (Client, {"_id": ObjectId(), "name": "Acme", "userId": ObjectId(), "notInModel": "x"}),
+    "job": (Job, {
+        "_id": ObjectId(), "userId": ObjectId(), "clientId": ObjectId(), "title": "Roof",
+        "startTime": WHEN, "invoiceId": ObjectId(),
+    }),
+    "invoice": (Invoice, {
+        "_id": ObjectId(), "userId": ObjectId(), "clientId": ObjectId(), "status": "sent",
+        "issueDate": WHEN, "total": 10, "markedOverdueAt": WHEN,
+        "lineItems": [{"description": "Labor", "quantity": 1, "rate": 10}],
+        "agentExtras": {"ref": ObjectId()},
+    }),
+    "invoice_sparse": (Invoice, {"_id": ObjectId()}),
+    "expense": (Expense, {
+        "_id": ObjectId(), "userId": ObjectId(), "vendorName": "Depot", "totalAmount": 5,
+        "date": WHEN, "createdAt": WHEN,
+        "lineItems": [{"description": "Paper", "quantity": 2, "unitPrice": 1, "total": 2}],
+    }),
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    for name, (model, doc) in DOCUMENTS.items():
+        app.add_api_route(f"/old/{name}", lambda doc=doc: legacy_convert(doc), response_model=model)
+        app.add_api_route(f"/new/{name}", lambda doc=doc, model=model: document_response(doc, model), response_model=model)
+    return TestClient(app)
+
+
+def without_utc_offset(value):
+    """Documented difference: naive datetimes now carry +00:00"""
+    if isinstance(value, dict):
+        return {key: without_utc_offset(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [without_utc_offset(item) for item in value]
+    if isinstance(value, str) and re.fullmatch(r"\d{4}-\d\d-\d\dT[\d:.]+\+00:00", value):
+        return value[:-len("+00:00")]
+    return value
+
+
+@pytest.mark.parametrize("name", DOCUMENTS)
+def test_same_json_as_response_model_validation(client, name):
+    old = client.get(f"/old/{name}").json()
+    new = client.get(f"/new/{name}").json()
+    # Same keys and values; ints in float fields compare equal (75 == 75.0)
+    assert without_utc_offset(new) == old
+
+
+def test_naive_datetimes_get_utc_offset():
+    assert dumps({"at": WHEN}) == b'{"at":"2026-01-17T09:30:00+00:00"}'
+
+
+def test_bson_types_without_a_json_equivalent():
+    oid = ObjectId()
+    assert dumps({"_id": oid, "amount": Decimal128("19.90")}) == f'{{"_id":"{oid}","amount":"19.90"}}'.encode()
+    with pytest.raises(TypeError):
+        dumps({"raw": object()})
+
+
+def test_list_responses_are_shaped_per_document(client):
+    docs = [DOCUMENTS["client"][1], DOCUMENTS["client"][1]]
+    body = document_response(docs, Client).body
+    assert b"notInModel" not in body
+    assert body.count(b'"archived":false') == 2
@@ -0,0 +1,125 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from bson import ObjectId
+
+from app.routes.agent import run_sql_analysis
+from app.sql_snapshots import SnapshotCache, is_read_only
+from app.user_stats import record_change
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT 1",
+    "  -- totals\n select count(*) from invoices",
+    "WITH t AS (SELECT 1 AS x) SELECT * FROM t",
+    "(SELECT 1) UNION (SELECT 2)",
+    "FROM clients",
+    "VALUES (1)",
+])
+def test_queries_are_read_only(query):
+    assert is_read_only(query)
+
+
+@pytest.mark.parametrize("query", [
+    "DESCRIBE clients",
+    "/* schema */ DESCRIBE clients",
+    "PRAGMA table_info('clients')",
+    "SHOW TABLES",
+    "SUMMARIZE clients",
+    "EXPLAIN SELECT 1",
+    "CALL pragma_version()",
+    "SELECT 1; DROP TABLE clients",
+    "CREATE TABLE t AS SELECT 1",
+    "ATTACH 'other.db'",
+    "SET threads = 1",
+    "SELEC 1",
+    "",
+])
+def test_everything_else_is_refused(query):
+    assert not is_read_only(query)
+
+
+async def _seed(db):
+    user_id = ObjectId()
+    await db.users.insert_one({"_id": user_id, "auth0_id": "auth0|1", "businessName": "Acme"})
+    for total in (10, 20):
+        invoice = {"_id": ObjectId(), "userId": user_id, "status": "sent", "total": total}
+        await db.invoices.insert_one(invoice)
+        await record_change(db, "invoices", after=invoice)
+    return user_id
+
+
+def test_snapshot_is_reloaded_when_data_changes(mongo):
+    cache = SnapshotCache(max_bytes=1 << 30)
+
+    async def scenario():
+        user_id = await _seed(mongo)
+        first = await cache.get(mongo, user_id)
+        again = await cache.get(mongo, user_id)
+        invoice = {"_id": ObjectId(), "userId": user_id, "status": "draft", "total": 5}
+        await mongo.invoices.insert_one(invoice)
+        await record_change(mongo, "invoices", after=invoice)
+        reloaded = await cache.get(mongo, user_id)
+        return first, again, reloaded
+
+    first, again, reloaded = asyncio.run(scenario())
+    assert again is first
+    assert reloaded is not first
+    profile = {"businessName": "Acme"}
+    assert first.query("SELECT count(*) AS n FROM invoices", profile) == [{"n": 2}]
+    assert reloaded.query("SELECT count(*) AS n FROM invoices", profile) == [{"n": 3}]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_concurrent_queries_on_one_snapshot(mongo):
+    cache = SnapshotCache(max_bytes=1 << 30)
+
+    async def scenario():
+        return await cache.get(mongo, await _seed(mongo))
+
+    snapshot = asyncio.run(scenario())
+    query = "SELECT sum(total) AS total, any_value(p.businessName) AS name FROM invoices, profile p"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(
+            lambda i: snapshot.query(query, {"businessName": f"Acme {i}"}), range(40)
+        ))
+    assert results == [[{"total": 30, "name": f"Acme {i}"}] for i in range(40)]
+
+
+def test_agent_sql_analysis(mongo):
+    async def scenario():
+        await _seed(mongo)
+        rows = await run_sql_analysis("auth0|1", "SELECT status, sum(total) AS total FROM invoices GROUP BY status")
+        refused = await run_sql_analysis("auth0|1", "DESCRIBE invoices")
+        return rows, refused
+
+    rows, refused = asyncio.run(scenario())
+    assert rows == [{"status": "sent", "total": 30}]
+    assert refused.startswith("Safety Violation")
+
+
+def test_cancelled_caller_does_not_cancel_a_shared_load(mongo, monkeypatch):
+    cache = SnapshotCache(max_bytes=1 << 30)
+    load = cache._load
+
+    async def slow_load(db, user_id, version):
+        await asyncio.sleep(0.05)
+        return await load(db, user_id, version)
+
+    monkeypatch.setattr(cache, "_load", slow_load)
+
+    async def scenario():
+        user_id = await _seed(mongo)
+        first = asyncio.ensure_future(cache.get(mongo, user_id))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(cache.get(mongo, user_id))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot.query("SELECT count(*) AS n FROM invoices", {"x": 1}) == [{"n": 2}]
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["shared"] == 1
@@ -0,0 +1,116 @@
+"""
+Streamed list responses (NDJSON and JSON array) compared with the regular
+paginated list of the same query.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pymongo import DESCENDING
+
+from app.models import Expense
+from app.pagination import NEXT_CURSOR_HEADER
+from app.routes import expenses
+from app.streaming import NDJSON_MEDIA_TYPE, stream_find
+
+USER_ID = ObjectId()
+
+
+def _insert(mongo, count):
+    docs = [
+        {
+            "_id": ObjectId(), "userId": USER_ID, "vendorName": f"Vendor {i}", "totalAmount": i,
+            # Shared and missing dates, so the (date, _id) order matters
+            **({"date": datetime(2026, 1, 1) + timedelta(days=i % 4)} if i % 6 else {}),
+        }
+        for i in range(count)
+    ]
+    if docs:
+        asyncio.run(mongo.db.expenses.insert_many(docs))
+
+
+@pytest.fixture
+def client(mongo):
+    app = FastAPI()
+    app.include_router(expenses.router)
+
+    @app.get("/small-batches")
+    def small_batches(request: Request, cursor: str = None):
+        # Same query as GET /expenses, a few documents per streamed chunk
+        return stream_find(
+            request, mongo.db.expenses, {"userId": USER_ID}, cursor=cursor,
+            sort_field="date", direction=DESCENDING, model=Expense, batch_size=3
+        )
+
+    return TestClient(app)
+
+
+def _listed(client, **params):
+    response = client.get("/expenses/", params={"user_id": str(USER_ID), "limit": 1000, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("count", [0, 1, 450])
+def test_json_array_matches_the_list(mongo, client, count):
+    _insert(mongo, count)
+    expected = _listed(client)
+    response = client.get("/expenses/", params={"user_id": str(USER_ID), "stream": "true"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == expected
+    assert len(expected) == count
+
+
+@pytest.mark.parametrize("count", [0, 1, 450])
+def test_ndjson_matches_the_list(mongo, client, count):
+    _insert(mongo, count)
+    expected = _listed(client)
+    response = client.get("/expenses/", params={"user_id": str(USER_ID)}, headers={"Accept": NDJSON_MEDIA_TYPE})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == NDJSON_MEDIA_TYPE
+    # One document per line, each line terminated
+    assert response.text.count("\n") == count
+    assert response.text.endswith("\n") or count == 0
+    assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+
+def test_plain_accept_gets_a_paginated_list(mongo, client):
+    _insert(mongo, 5)
+    response = client.get("/expenses/", params={"user_id": str(USER_ID), "limit": 2}, headers={"Accept": "application/json"})
+    assert len(response.json()) == 2
+    assert NEXT_CURSOR_HEADER in response.headers
+
+
+def test_ndjson_wins_over_stream_param(mongo, client):
+    _insert(mongo, 3)
+    response = client.get(
+        "/expenses/", params={"user_id": str(USER_ID), "stream": "true"},
+        headers={"Accept": f"application/json, {NDJSON_MEDIA_TYPE}"}
+    )
+    assert response.headers["content-type"] == NDJSON_MEDIA_TYPE
+    assert len(response.text.splitlines()) == 3
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 4, 20])
+def test_batches_join_into_valid_json(mongo, client, count):
+    _insert(mongo, count)
+    expected = _listed(client)
+    assert client.get("/small-batches").json() == expected
+    lines = client.get("/small-batches", headers={"Accept": NDJSON_MEDIA_TYPE}).text.splitlines()
+    assert [json.loads(line) for line in lines] == expected
+
+
+@pytest.mark.parametrize("path", ["/expenses/", "/small-batches"])
+def test_stream_continues_from_a_page_cursor(mongo, client, path):
+    _insert(mongo, 20)
+    everything = _listed(client)
+    first = client.get("/expenses/", params={"user_id": str(USER_ID), "limit": 7})
+    cursor = first.headers[NEXT_CURSOR_HEADER]
+    rest = client.get(path, params={"user_id": str(USER_ID), "cursor": cursor, "stream": "true"}).json()
+    assert first.json() + rest == everything
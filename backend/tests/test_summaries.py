@@ -0,0 +1,73 @@
+"""The single $unionWith aggregation behind the summaries, against counting each collection separately"""
+
+import asyncio
+import random
+
+import pytest
+from bson import ObjectId
+
+from app.summaries import amount, count, status_totals
+
+USER_ID = ObjectId()
+COLLECTIONS = ["clients", "jobs", "invoices"]
+
+
+def _random_doc(rng, user_id):
+    doc = {"_id": ObjectId(), "userId": user_id}
+    if rng.random() < 0.85:
+        doc["status"] = rng.choice(["draft", "sent", "paid", "overdue", "active", None])
+    if rng.random() < 0.8:
+        doc["total"] = rng.choice([rng.randint(0, 500), round(rng.uniform(0, 900), 2)])
+    return doc
+
+
+async def _naive_totals(db, match, collections):
+    totals = {}
+    for name in collections:
+        by_status = totals.setdefault(name, {})
+        async for doc in db[name].find(match):
+            row = by_status.setdefault(doc.get("status"), {"count": 0, "total": 0})
+            row["count"] += 1
+            row["total"] += doc.get("total", 0)
+    return totals
+
+
+def _rounded(totals):
+    return {
+        name: {s: {"count": v["count"], "total": round(v["total"], 6)} for s, v in by_status.items()}
+        for name, by_status in totals.items()
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_a_query_per_collection(mongo, union_with, seed):
+    rng = random.Random(seed)
+
+    async def run():
+        for name in COLLECTIONS:
+            docs = [_random_doc(rng, rng.choice([USER_ID, ObjectId()])) for _ in range(rng.randint(0, 40))]
+            if docs:
+                await mongo.db[name].insert_many(docs)
+        match = {"userId": USER_ID}
+        expected = await _naive_totals(mongo.db, match, COLLECTIONS)
+        totals = await status_totals(mongo.db, match, COLLECTIONS)
+        assert _rounded(totals) == _rounded(expected)
+    asyncio.run(run())
+
+
+def test_collections_without_matches_are_empty(mongo, union_with):
+    async def run():
+        await mongo.db.invoices.insert_one({"userId": USER_ID, "status": "paid", "total": 20})
+        totals = await status_totals(mongo.db, {"userId": USER_ID}, COLLECTIONS)
+        assert totals == {"clients": {}, "jobs": {}, "invoices": {"paid": {"count": 1, "total": 20}}}
+        assert await status_totals(mongo.db, {"userId": ObjectId()}, ["jobs"]) == {"jobs": {}}
+    asyncio.run(run())
+
+
+def test_count_and_amount_helpers():
+    by_status = {"paid": {"count": 2, "total": 30}, "sent": {"count": 1, "total": 5}, None: {"count": 4, "total": 0}}
+    assert count(by_status) == 7
+    assert count(by_status, "paid", "sent") == 3
+    assert count(by_status, "void") == 0
+    assert amount(by_status, "paid") == 30
+    assert amount(by_status) == 35
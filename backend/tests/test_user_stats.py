@@ -0,0 +1,38 @@
+import asyncio
+
+from bson import ObjectId
+
+from app.models import InvoiceUpdate
+from app.routes.invoices import update_invoice
+from app.user_stats import get_user_stats, record_change, stat
+
+
+def test_concurrent_updates_are_counted_once(mongo, monkeypatch):
+    user_id = ObjectId()
+    invoice = {"_id": ObjectId(), "userId": user_id, "status": "draft", "total": 10}
+
+    collection_type = type(mongo.invoices)
+    original = collection_type.find_one_and_update
+    interleaved = []
+
+    async def find_one_and_update(self, *args, **kwargs):
+        previous = await original(self, *args, **kwargs)
+        # Another request updates the invoice between this write and the stats update
+        if not interleaved:
+            interleaved.append(True)
+            await update_invoice(str(invoice["_id"]), InvoiceUpdate(status="void"))
+        return previous
+
+    async def scenario():
+        await mongo.invoices.insert_one(invoice)
+        await record_change(mongo, "invoices", after=invoice)
+        monkeypatch.setattr(collection_type, "find_one_and_update", find_one_and_update)
+        await update_invoice(str(invoice["_id"]), InvoiceUpdate(status="paid"))
+        return await get_user_stats(mongo, user_id)
+
+    stats = asyncio.run(scenario())
+    assert stat(stats, "invoices.count") == 1
+    assert stat(stats, "invoices.byStatus.void") == 1
+    assert stat(stats, "invoices.byStatus.paid") == 0
+    assert stat(stats, "invoices.byStatus.draft") == 0
+    assert stat(stats, "invoices.totals.void") == 10
@@ -96,50 +96,32 @@ function Home() {
       if (!mongoUserId) return;
 
       try {
-        // Fetch jobs
-        const jobsResponse = await fetch(`${API_URL}/jobs/?user_id=${mongoUserId}`);
-        if (jobsResponse.ok) {
-          const jobs = await jobsResponse.json();
-          const completed = jobs.filter(j => j.status === 'completed').length;
-          const pending = jobs.filter(j => j.status !== 'completed').length;
+        // Counts and totals come precomputed from the user summary
+        const summaryResponse = await fetch(`${API_URL}/users/${mongoUserId}/summary`);
+        if (summaryResponse.ok) {
+          const summary = await summaryResponse.json();
           
           setStats(prev => ({
             ...prev,
-            jobsCount: jobs.length,
-            completedJobs: completed,
-            pendingJobs: pending
+            jobsCount: summary.counts.jobs,
+            completedJobs: summary.jobs.completed,
+            pendingJobs: summary.counts.jobs - summary.jobs.completed,
+            expensesTotal: summary.expenses.total,
+            expensesCount: summary.expenses.count,
+            revenueTotal: summary.revenue.billed
           }));
-          
-          // Get 3 most recent jobs
-          setRecentJobs(jobs.slice(0, 3));
         }
 
-        // Fetch expenses
-        const expensesResponse = await fetch(`${API_URL}/expenses/?user_id=${mongoUserId}`);
-        if (expensesResponse.ok) {
-          const expenses = await expensesResponse.json();
-          const total = expenses.reduce((sum, exp) => sum + (exp.totalAmount || 0), 0);
-          
-          setStats(prev => ({
-            ...prev,
-            expensesTotal: total,
-            expensesCount: expenses.length
-          }));
-          
-          // Get 3 most recent expenses
-          setRecentExpenses(expenses.slice(0, 3));
+        // Get 3 most recent jobs
+        const jobsResponse = await fetch(`${API_URL}/jobs/?user_id=${mongoUserId}&limit=3`);
+        if (jobsResponse.ok) {
+          setRecentJobs(await jobsResponse.json());
         }
 
-        // Fetch invoices
-        const invoicesResponse = await fetch(`${API_URL}/invoices/?user_id=${mongoUserId}`);
-        if (invoicesResponse.ok) {
-          const invoices = await invoicesResponse.json();
-          const total = invoices.reduce((sum, inv) => sum + (inv.total || 0), 0);
-          
-          setStats(prev => ({
-            ...prev,
-            revenueTotal: total
-          }));
+        // Get 3 most recent expenses
+        const expensesResponse = await fetch(`${API_URL}/expenses/?user_id=${mongoUserId}&limit=3`);
+        if (expensesResponse.ok) {
+          setRecentExpenses(await expensesResponse.json());
         }
       } catch (err) {
         console.error('Error fetching dashboard data:', err);